@@ -1,3 +1,31 @@
-from app.agent.vibe_agent import create_vibe_trading_agent, process_chat_message
+from app.agent.vibe_agent import (
+    ChatBusyError,
+    ChatTimeoutError,
+    acquire_chat_slot,
+    close_agent,
+    create_vibe_trading_agent,
+    get_cache_stats,
+    get_vibe_trading_agent,
+    init_agent,
+    process_chat_message,
+    process_chat_message_async,
+    release_chat_slot,
+    session_exists,
+    stream_chat_message,
+)
 
-__all__ = ["create_vibe_trading_agent", "process_chat_message"]
\ No newline at end of file
+__all__ = [
+    "ChatBusyError",
+    "ChatTimeoutError",
+    "acquire_chat_slot",
+    "close_agent",
+    "create_vibe_trading_agent",
+    "get_cache_stats",
+    "get_vibe_trading_agent",
+    "init_agent",
+    "process_chat_message",
+    "process_chat_message_async",
+    "release_chat_slot",
+    "session_exists",
+    "stream_chat_message",
+]
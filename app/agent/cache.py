@@ -0,0 +1,250 @@
+"""Response cache for repeated chat messages.
+
+Most chat traffic is the same handful of opening questions, so answers to
+tool-free messages are cached by normalized message text plus a fingerprint
+of the agent configuration (system prompt, model and tool schemas). Changing
+any of those invalidates every entry automatically.
+
+Two backends are available, selected with ``CHAT_CACHE_BACKEND``:
+
+* ``memory`` (default) - an LRU dict with TTL, private to each worker
+* ``sqlite`` - a table in ``CHAT_CACHE_PATH`` that survives restarts and is
+  shared by every uvicorn worker on the host
+* ``off`` - disable caching
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from app.db.aio import run_read, run_write
+from app.db.connection import BUSY_TIMEOUT, get_connection, transaction
+from app.db.database import DB_PATH
+from app.utils.logging_config import get_logger
+from app.utils.metrics import CACHE_REQUESTS
+
+logger = get_logger(__name__)
+
+CHAT_CACHE_BACKEND = os.environ.get("CHAT_CACHE_BACKEND", "memory").lower()
+CHAT_CACHE_TTL = float(os.environ.get("CHAT_CACHE_TTL", "3600"))
+CHAT_CACHE_SIZE = int(os.environ.get("CHAT_CACHE_SIZE", "1024"))
+CHAT_CACHE_PATH = os.environ.get(
+    "CHAT_CACHE_PATH", os.path.join(os.path.dirname(DB_PATH), "chat_cache.db")
+)
+
+# Messages that may carry an email address are likely to trigger the
+# subscribe_email tool and must always reach the agent
+_EMAIL_HINT = re.compile(r"\S+@\S+")
+_WHITESPACE = re.compile(r"\s+")
+_TRAILING_PUNCTUATION = re.compile(r"[\s?!.]+$")
+
+
+def normalize_message(message: str) -> str:
+    """Fold case, whitespace and trailing punctuation out of a message."""
+    message = _WHITESPACE.sub(" ", message.strip().lower())
+    return _TRAILING_PUNCTUATION.sub("", message)
+
+
+def is_cacheable(message: str) -> bool:
+    """Return False for messages that should always bypass the cache."""
+    return bool(message.strip()) and not _EMAIL_HINT.search(message)
+
+
+def make_key(message: str, fingerprint: str) -> str:
+    """Build the cache key for ``message`` under an agent ``fingerprint``."""
+    data = f"{fingerprint}\0{normalize_message(message)}".encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+def config_fingerprint(*parts: Any) -> str:
+    """Hash the agent configuration that affects replies."""
+    data = json.dumps(parts, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+class ResponseCache:
+    """Base class for cache backends; also counts hits and misses."""
+
+    def __init__(self, max_entries: int = CHAT_CACHE_SIZE, ttl: float = CHAT_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+    async def aget(self, key: str) -> Optional[Dict[str, Any]]:
+        """Look ``key`` up and record a hit or a miss."""
+        value = self.get(key)
+        self._record(value)
+        return value
+
+    async def aset(self, key: str, value: Dict[str, Any]) -> None:
+        self.set(key, value)
+
+    def record_bypass(self) -> None:
+        self.bypassed += 1
+        CACHE_REQUESTS.labels("bypass").inc()
+
+    def _record(self, value: Optional[Dict[str, Any]]) -> None:
+        if value is None:
+            self.misses += 1
+            CACHE_REQUESTS.labels("miss").inc()
+        else:
+            self.hits += 1
+            CACHE_REQUESTS.labels("hit").inc()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters for this worker."""
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class MemoryResponseCache(ResponseCache):
+    """Per-process LRU cache with a TTL and a size cap."""
+
+    def __init__(self, max_entries: int = CHAT_CACHE_SIZE, ttl: float = CHAT_CACHE_TTL):
+        super().__init__(max_entries, ttl)
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteResponseCache(ResponseCache):
+    """LRU cache with a TTL stored in SQLite and shared across workers."""
+
+    SCHEMA_SQL = """
+    CREATE TABLE IF NOT EXISTS chat_cache (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL,
+        expires_at REAL NOT NULL,
+        last_used REAL NOT NULL
+    )
+    """
+    GET_SQL = "SELECT value, expires_at FROM chat_cache WHERE key = ?"
+    TOUCH_SQL = "UPDATE chat_cache SET last_used = ? WHERE key = ?"
+    SET_SQL = (
+        "INSERT OR REPLACE INTO chat_cache (key, value, expires_at, last_used) "
+        "VALUES (?, ?, ?, ?)"
+    )
+    TRIM_SQL = """
+    DELETE FROM chat_cache WHERE expires_at < ? OR key IN (
+        SELECT key FROM chat_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?
+    )
+    """
+
+    # Trimming scans the table, so it runs only every TRIM_EVERY writes
+    TRIM_EVERY = 64
+
+    # Longest a cache hit waits for the write lock to record its use
+    TOUCH_TIMEOUT_MS = 50
+
+    def __init__(self, path: str = CHAT_CACHE_PATH, max_entries: int = CHAT_CACHE_SIZE,
+                 ttl: float = CHAT_CACHE_TTL):
+        super().__init__(max_entries, ttl)
+        self.path = path
+        self._writes = 0
+        with transaction(self.path) as conn:
+            conn.execute(self.SCHEMA_SQL)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        row = get_connection(self.path).execute(self.GET_SQL, (key,)).fetchone()
+        if row is None or row["expires_at"] < time.time():
+            return None
+        self._touch(key)
+        return json.loads(row["value"])
+
+    def _touch(self, key: str) -> None:
+        """Mark ``key`` as recently used, unless that means waiting for a writer."""
+        # Recency only feeds eviction, so a lost update is harmless; a hit
+        # must not wait out the full busy timeout behind another writer
+        conn = get_connection(self.path)
+        conn.execute(f"PRAGMA busy_timeout = {self.TOUCH_TIMEOUT_MS}")
+        try:
+            with transaction(self.path) as conn:
+                conn.execute(self.TOUCH_SQL, (time.time(), key))
+        except sqlite3.OperationalError:
+            pass
+        finally:
+            conn.execute(f"PRAGMA busy_timeout = {int(BUSY_TIMEOUT * 1000)}")
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        now = time.time()
+        with transaction(self.path) as conn:
+            conn.execute(self.SET_SQL, (key, json.dumps(value), now + self.ttl, now))
+            self._writes += 1
+            if self._writes % self.TRIM_EVERY == 0:
+                conn.execute(self.TRIM_SQL, (now, self.max_entries))
+
+    def clear(self) -> None:
+        with transaction(self.path) as conn:
+            conn.execute("DELETE FROM chat_cache")
+
+    async def aget(self, key: str) -> Optional[Dict[str, Any]]:
+        value = await run_read(self.get, key)
+        self._record(value)
+        return value
+
+    async def aset(self, key: str, value: Dict[str, Any]) -> None:
+        await run_write(self.set, key, value)
+
+
+def create_response_cache(backend: str = CHAT_CACHE_BACKEND) -> Optional[ResponseCache]:
+    """
+    Build the response cache selected by ``CHAT_CACHE_BACKEND``
+
+    Returns:
+        Optional[ResponseCache]: The cache, or None when caching is off
+    """
+    if backend in ("off", "none", ""):
+        return None
+    if backend == "sqlite":
+        try:
+            return SQLiteResponseCache()
+        except (OSError, sqlite3.Error) as e:
+            logger.error("Cannot open chat cache at %s, using memory: %s", CHAT_CACHE_PATH, e)
+    elif backend != "memory":
+        logger.warning("Unknown CHAT_CACHE_BACKEND %r, using memory", backend)
+    return MemoryResponseCache()
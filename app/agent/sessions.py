@@ -0,0 +1,248 @@
+"""Server-side chat sessions with bounded, compacted history.
+
+Each session keeps the most recent turns verbatim and folds older turns into
+a short running summary, so the prompt sent to the model stays within
+``CHAT_HISTORY_TOKENS`` however long the conversation gets.
+
+Backends, selected with ``CHAT_SESSION_BACKEND``:
+
+* ``memory`` (default) - an LRU dict with TTL, private to each worker
+* ``sqlite`` - the ``chat_sessions`` table in the subscriber database,
+  shared by every uvicorn worker
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.db.aio import run_read, run_write
+from app.db.connection import get_connection, transaction
+from app.db.database import get_db_path
+from app.utils.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+CHAT_SESSION_BACKEND = os.environ.get("CHAT_SESSION_BACKEND", "memory").lower()
+CHAT_SESSION_TTL = float(os.environ.get("CHAT_SESSION_TTL", "86400"))
+CHAT_SESSION_MAX = int(os.environ.get("CHAT_SESSION_MAX", "10000"))
+CHAT_HISTORY_TOKENS = int(os.environ.get("CHAT_HISTORY_TOKENS", "1500"))
+
+# Share of the history budget reserved for the summary of older turns
+SUMMARY_SHARE = 0.25
+
+# Characters kept from each turn when it is folded into the summary
+SUMMARY_CHARS_PER_TURN = 160
+
+Session = Dict[str, Any]
+
+
+def new_session() -> Session:
+    """Return an empty session."""
+    return {"summary": "", "turns": []}
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (about four characters per token)."""
+    return len(text) // 4 + 1
+
+
+def _summarize_turn(turn: Dict[str, str]) -> str:
+    content = " ".join(turn["content"].split())
+    if len(content) > SUMMARY_CHARS_PER_TURN:
+        content = content[:SUMMARY_CHARS_PER_TURN].rstrip() + "..."
+    speaker = "User" if turn["role"] == "user" else "Assistant"
+    return f"{speaker}: {content}"
+
+
+def compact_session(session: Session, budget: int = CHAT_HISTORY_TOKENS) -> Session:
+    """
+    Trim a session to ``budget`` tokens
+
+    The newest turns are kept verbatim; older ones are folded into the
+    summary, whose oldest lines are dropped once it outgrows its share of
+    the budget.
+
+    Args:
+        session: The session to compact (modified in place)
+        budget: Approximate token budget for summary plus turns
+
+    Returns:
+        Session: The compacted session
+    """
+    summary_budget = int(budget * SUMMARY_SHARE)
+    turns_budget = budget - summary_budget
+
+    kept: List[Dict[str, str]] = []
+    used = 0
+    for turn in reversed(session["turns"]):
+        cost = estimate_tokens(turn["content"])
+        if kept and used + cost > turns_budget:
+            break
+        kept.append(turn)
+        used += cost
+    kept.reverse()
+
+    folded = session["turns"][: len(session["turns"]) - len(kept)]
+    if folded:
+        lines = [line for line in session["summary"].split("\n") if line]
+        lines.extend(_summarize_turn(turn) for turn in folded)
+        while len(lines) > 1 and estimate_tokens("\n".join(lines)) > summary_budget:
+            lines.pop(0)
+        session["summary"] = "\n".join(lines)
+
+    session["turns"] = kept
+    return session
+
+
+def build_agent_input(session: Session, message: str) -> List[Dict[str, str]]:
+    """
+    Build the model input for ``message`` in the context of ``session``
+
+    Returns:
+        List[Dict[str, str]]: Input items for ``Runner.run``
+    """
+    items: List[Dict[str, str]] = []
+    if session["summary"]:
+        items.append({
+            "role": "system",
+            "content": "Summary of the earlier conversation:\n" + session["summary"],
+        })
+    items.extend({"role": turn["role"], "content": turn["content"]} for turn in session["turns"])
+    items.append({"role": "user", "content": message})
+    return items
+
+
+def record_exchange(session: Session, message: str, reply: str) -> Session:
+    """Append a user message and the assistant reply, then compact."""
+    session["turns"].append({"role": "user", "content": message})
+    session["turns"].append({"role": "assistant", "content": reply})
+    return compact_session(session)
+
+
+class SessionStore:
+    """Base class for session backends."""
+
+    def __init__(self, max_sessions: int = CHAT_SESSION_MAX, ttl: float = CHAT_SESSION_TTL):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+
+    def get(self, session_id: str) -> Optional[Session]:
+        raise NotImplementedError
+
+    def set(self, session_id: str, session: Session) -> None:
+        raise NotImplementedError
+
+    def delete(self, session_id: str) -> None:
+        raise NotImplementedError
+
+    async def aget(self, session_id: str) -> Optional[Session]:
+        return self.get(session_id)
+
+    async def aset(self, session_id: str, session: Session) -> None:
+        self.set(session_id, session)
+
+
+class MemorySessionStore(SessionStore):
+    """Per-process LRU of sessions with idle expiry."""
+
+    def __init__(self, max_sessions: int = CHAT_SESSION_MAX, ttl: float = CHAT_SESSION_TTL):
+        super().__init__(max_sessions, ttl)
+        self._sessions: "OrderedDict[str, Tuple[float, Session]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> Optional[Session]:
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            expires_at, session = entry
+            if expires_at < time.monotonic():
+                del self._sessions[session_id]
+                return None
+            self._sessions.move_to_end(session_id)
+            # Callers mutate sessions, so hand out a copy
+            return json.loads(json.dumps(session))
+
+    def set(self, session_id: str, session: Session) -> None:
+        with self._lock:
+            self._sessions[session_id] = (time.monotonic() + self.ttl, session)
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+
+class SQLiteSessionStore(SessionStore):
+    """Sessions stored in the subscriber database, shared across workers."""
+
+    SCHEMA_SQL = """
+    CREATE TABLE IF NOT EXISTS chat_sessions (
+        session_id TEXT PRIMARY KEY,
+        data TEXT NOT NULL,
+        updated_at REAL NOT NULL
+    )
+    """
+    GET_SQL = "SELECT data, updated_at FROM chat_sessions WHERE session_id = ?"
+    SET_SQL = (
+        "INSERT OR REPLACE INTO chat_sessions (session_id, data, updated_at) VALUES (?, ?, ?)"
+    )
+    DELETE_SQL = "DELETE FROM chat_sessions WHERE session_id = ?"
+    PURGE_SQL = """
+    DELETE FROM chat_sessions WHERE updated_at < ? OR session_id IN (
+        SELECT session_id FROM chat_sessions ORDER BY updated_at DESC LIMIT -1 OFFSET ?
+    )
+    """
+
+    # Purging scans the table, so it runs only every PURGE_EVERY writes
+    PURGE_EVERY = 256
+
+    def __init__(self, path: Optional[str] = None, max_sessions: int = CHAT_SESSION_MAX,
+                 ttl: float = CHAT_SESSION_TTL):
+        super().__init__(max_sessions, ttl)
+        self.path = path or get_db_path()
+        self._writes = 0
+        with transaction(self.path) as conn:
+            conn.execute(self.SCHEMA_SQL)
+
+    def get(self, session_id: str) -> Optional[Session]:
+        row = get_connection(self.path).execute(self.GET_SQL, (session_id,)).fetchone()
+        if row is None or row["updated_at"] + self.ttl < time.time():
+            return None
+        return json.loads(row["data"])
+
+    def set(self, session_id: str, session: Session) -> None:
+        now = time.time()
+        with transaction(self.path) as conn:
+            conn.execute(self.SET_SQL, (session_id, json.dumps(session), now))
+            self._writes += 1
+            if self._writes % self.PURGE_EVERY == 0:
+                conn.execute(self.PURGE_SQL, (now - self.ttl, self.max_sessions))
+
+    def delete(self, session_id: str) -> None:
+        with transaction(self.path) as conn:
+            conn.execute(self.DELETE_SQL, (session_id,))
+
+    async def aget(self, session_id: str) -> Optional[Session]:
+        return await run_read(self.get, session_id)
+
+    async def aset(self, session_id: str, session: Session) -> None:
+        await run_write(self.set, session_id, session)
+
+
+def create_session_store(backend: str = CHAT_SESSION_BACKEND) -> SessionStore:
+    """Build the session store selected by ``CHAT_SESSION_BACKEND``."""
+    if backend == "sqlite":
+        try:
+            return SQLiteSessionStore()
+        except (OSError, sqlite3.Error, RuntimeError) as e:
+            logger.error("Cannot open SQLite session store, using memory: %s", e)
+    elif backend != "memory":
+        logger.warning("Unknown CHAT_SESSION_BACKEND %r, using memory", backend)
+    return MemorySessionStore()
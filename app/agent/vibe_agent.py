@@ -1,11 +1,174 @@
-from typing import Dict, Any
-import json
-from agents import Agent, Tool
-from openai import OpenAI
+from typing import AsyncIterator, Dict, Any, Optional, Tuple
+import asyncio
 import os
+import threading
 
-from app.db import add_email, email_exists
-from app.utils import validate_email
+from agents import (
+    Agent,
+    FunctionTool,
+    ModelSettings,
+    RawResponsesStreamEvent,
+    RunItemStreamEvent,
+    Runner,
+    ToolCallItem,
+    ToolCallOutputItem,
+    function_tool,
+    set_default_openai_client,
+)
+from agents.result import RunResultBase
+from openai import AsyncOpenAI
+from openai.types.responses import ResponseTextDeltaEvent
+
+from app.agent.cache import (
+    ResponseCache,
+    config_fingerprint,
+    create_response_cache,
+    is_cacheable,
+    make_key,
+)
+from app.agent.sessions import (
+    Session,
+    SessionStore,
+    build_agent_input,
+    create_session_store,
+    new_session,
+    record_exchange,
+)
+from app.db import add_email_async, email_exists_async
+from app.utils import validate_email_async
+from app.utils.logging_config import get_logger
+from app.utils.metrics import SPAN_LATENCY, TOOL_CALLS, span
+from app.vibe import get_vibe_index
+
+logger = get_logger(__name__)
+
+# Model and client configuration
+OPENAI_MODEL = os.environ.get("OPENAI_MODEL", "gpt-4o-mini")
+OPENAI_BASE_URL = os.environ.get("OPENAI_BASE_URL") or None
+OPENAI_TIMEOUT = float(os.environ.get("OPENAI_TIMEOUT", "30"))
+OPENAI_MAX_RETRIES = int(os.environ.get("OPENAI_MAX_RETRIES", "2"))
+OPENAI_TEMPERATURE = os.environ.get("OPENAI_TEMPERATURE")
+
+# Chat admission control: concurrent agent runs per worker, how long a request
+# may wait for a free slot, and the time budget for one run (seconds)
+CHAT_MAX_CONCURRENCY = int(os.environ.get("CHAT_MAX_CONCURRENCY", "8"))
+CHAT_QUEUE_TIMEOUT = float(os.environ.get("CHAT_QUEUE_TIMEOUT", "0.5"))
+CHAT_TIMEOUT = float(os.environ.get("CHAT_TIMEOUT", "60"))
+
+SUBSCRIBE_TOOL_DESCRIPTION = (
+    "Subscribe a user with their email to receive updates about Vibe Trading launch"
+)
+
+VIBE_INDEX_TOOL_DESCRIPTION = (
+    "Get the current vibe (market sentiment) of a ticker or topic such as BTC: mean sentiment "
+    "from -1 (bearish) to +1 (bullish), number of posts, and momentum (change against the "
+    "previous window) over the last minute, 5 minutes, hour and day"
+)
+
+SYSTEM_PROMPT = """
+    You are the Vibe Trading assistant, designed to inform users about the exciting
+    Vibe Trading project which is currently in development.
+
+    About the Vibe Trading project:
+
+    Problem We Are Solving ("Intuitive Trading"):
+    We focus on the inefficiency and risks of traditional intuitive trading, which is often driven by emotion
+    and cognitive bias. Behavioral finance shows that people don't always make rational decisions in financial
+    markets because of emotions and mental distortions. Key manifestations include:
+    • Emotion-driven irrational choices: Fear, greed, euphoria, and panic leading to suboptimal decisions
+    • Herd behavior: Following the majority rather than conducting independent analysis
+    • Emotional and cognitive biases: Disposition effect, anchoring bias, framing effect, self-attribution,
+      overconfidence, loss aversion, gambler's fallacy, etc.
+    • Need for emotional resilience: Making decisions under stress requires controlling innate emotional
+      reactions—difficult without a clear structure or plan
+
+    Our Solution ("Vibe Trading"):
+    We propose building a platform that uses "vibe coding" to structure and algorithmize subjective market
+    perceptions—such as "atmosphere," "mood," "energy," or "intuition" ("vibe").
+    • We apply the "vibe" concept to market sentiment through analytical tools like sentiment analysis of
+      text data from open sources (social media, news, forums)
+    • This differs from traditional algorithmic trading by attempting to formalize intuitive elements
+    • The goal is to augment and potentially improve trading decisions by combining human-style
+      sentiment signals with data and algorithms
+
+    Our Unique Value Proposition:
+    1. Transparent Public Experiment ("Build in Public")
+    2. Experimental Unpredictability - Working with sentiment ("vibe") which is inherently less structured
+    3. Trend Convergence - Intersection of AI, Trading, Indie Development, and Build in Public
+
+    Your primary goals:
+    1. Welcome users and explain the Vibe Trading concept based on the information above
+    2. Highlight the unique value proposition of combining algorithmic trading with sentiment analysis
+    3. Encourage users to subscribe with their email to receive launch notifications
+    4. Once they provide their email, confirm their subscription
+
+    Important guidance:
+    - Be enthusiastic but professional
+    - Don't make specific promises about launch dates or returns
+    - Focus on collecting emails for the launch notification
+    - If users ask detailed questions about the platform, provide information based on the project
+      hypothesis outlined above
+    - If users ask questions completely unrelated to the project, politely inform them that you can
+      only assist with matters related to Vibe Trading
+    - Always encourage subscription to stay updated
+    - When users ask about the current mood around a ticker or topic, call get_vibe_index and
+      quote its numbers as an early preview of the platform's sentiment signal, never as
+      trading advice; if it has no data, say so
+    """
+
+# The agent and its client are built once per process and shared by every
+# request; both are safe to use concurrently.
+_agent: Optional[Agent] = None
+_client: Optional[AsyncOpenAI] = None
+_init_lock = threading.Lock()
+
+# Cache of tool-free replies, keyed under a fingerprint of the agent config
+_response_cache: Optional[ResponseCache] = None
+_fingerprint = ""
+
+# Conversation history, created on first use
+_session_store: Optional[SessionStore] = None
+
+_chat_slots = asyncio.Semaphore(CHAT_MAX_CONCURRENCY)
+
+
+class ChatBusyError(Exception):
+    """Raised when every chat slot is taken and the request should be shed."""
+
+
+class ChatTimeoutError(Exception):
+    """Raised when an agent run exceeds CHAT_TIMEOUT."""
+
+
+async def acquire_chat_slot() -> None:
+    """
+    Reserve one of the CHAT_MAX_CONCURRENCY agent run slots
+
+    Raises:
+        ChatBusyError: If no slot frees up within CHAT_QUEUE_TIMEOUT
+    """
+    try:
+        await asyncio.wait_for(_chat_slots.acquire(), CHAT_QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise ChatBusyError("All chat slots are busy") from None
+
+
+def release_chat_slot() -> None:
+    """Return a slot taken with :func:`acquire_chat_slot`."""
+    _chat_slots.release()
+
+def create_openai_client() -> AsyncOpenAI:
+    """
+    Create the OpenAI client used by the agent
+
+    Returns:
+        AsyncOpenAI: Client configured from the OPENAI_* environment variables
+    """
+    return AsyncOpenAI(
+        base_url=OPENAI_BASE_URL,
+        timeout=OPENAI_TIMEOUT,
+        max_retries=OPENAI_MAX_RETRIES,
+    )
 
 def create_vibe_trading_agent() -> Agent:
     """
@@ -15,78 +178,73 @@ def create_vibe_trading_agent() -> Agent:
         Agent: Configured OpenAI Agent
     """
     # Define the subscribe email tool
-    subscribe_tool = Tool(
-        name="subscribe_email",
-        description="Subscribe a user with their email to receive updates about Vibe Trading launch",
-        function=subscribe_email,
-        input_schema={
-            "type": "object",
-            "properties": {
-                "email": {
-                    "type": "string",
-                    "description": "The user's email address for subscription"
-                }
-            },
-            "required": ["email"]
-        }
+    subscribe_tool: FunctionTool = function_tool(
+        subscribe_email,
+        name_override="subscribe_email",
+        description_override=SUBSCRIBE_TOOL_DESCRIPTION,
     )
-    
+
+    # Quote the rolling vibe index without recomputing anything
+    vibe_tool: FunctionTool = function_tool(
+        lookup_vibe_index,
+        name_override="get_vibe_index",
+        description_override=VIBE_INDEX_TOOL_DESCRIPTION,
+    )
+
+    model_settings = ModelSettings()
+    if OPENAI_TEMPERATURE:
+        model_settings.temperature = float(OPENAI_TEMPERATURE)
+
     # Create the agent with tools
     agent = Agent(
         name="vibe_trading_agent",
-        system_prompt="""
-        You are the Vibe Trading assistant, designed to inform users about the exciting
-        Vibe Trading project which is currently in development.
-
-        About the Vibe Trading project:
-
-        Problem We Are Solving ("Intuitive Trading"):
-        We focus on the inefficiency and risks of traditional intuitive trading, which is often driven by emotion
-        and cognitive bias. Behavioral finance shows that people don't always make rational decisions in financial
-        markets because of emotions and mental distortions. Key manifestations include:
-        • Emotion-driven irrational choices: Fear, greed, euphoria, and panic leading to suboptimal decisions
-        • Herd behavior: Following the majority rather than conducting independent analysis
-        • Emotional and cognitive biases: Disposition effect, anchoring bias, framing effect, self-attribution,
-          overconfidence, loss aversion, gambler's fallacy, etc.
-        • Need for emotional resilience: Making decisions under stress requires controlling innate emotional
-          reactions—difficult without a clear structure or plan
-
-        Our Solution ("Vibe Trading"):
-        We propose building a platform that uses "vibe coding" to structure and algorithmize subjective market
-        perceptions—such as "atmosphere," "mood," "energy," or "intuition" ("vibe").
-        • We apply the "vibe" concept to market sentiment through analytical tools like sentiment analysis of
-          text data from open sources (social media, news, forums)
-        • This differs from traditional algorithmic trading by attempting to formalize intuitive elements
-        • The goal is to augment and potentially improve trading decisions by combining human-style
-          sentiment signals with data and algorithms
-
-        Our Unique Value Proposition:
-        1. Transparent Public Experiment ("Build in Public")
-        2. Experimental Unpredictability - Working with sentiment ("vibe") which is inherently less structured
-        3. Trend Convergence - Intersection of AI, Trading, Indie Development, and Build in Public
-
-        Your primary goals:
-        1. Welcome users and explain the Vibe Trading concept based on the information above
-        2. Highlight the unique value proposition of combining algorithmic trading with sentiment analysis
-        3. Encourage users to subscribe with their email to receive launch notifications
-        4. Once they provide their email, confirm their subscription
-
-        Important guidance:
-        - Be enthusiastic but professional
-        - Don't make specific promises about launch dates or returns
-        - Focus on collecting emails for the launch notification
-        - If users ask detailed questions about the platform, provide information based on the project
-          hypothesis outlined above
-        - If users ask questions completely unrelated to the project, politely inform them that you can
-          only assist with matters related to Vibe Trading
-        - Always encourage subscription to stay updated
-        """,
-        tools=[subscribe_tool]
+        instructions=SYSTEM_PROMPT,
+        model=OPENAI_MODEL,
+        model_settings=model_settings,
+        tools=[subscribe_tool, vibe_tool]
     )
     
     return agent
 
-def subscribe_email(email: str) -> Dict[str, Any]:
+def init_agent() -> Agent:
+    """
+    Build the shared agent and OpenAI client if they do not exist yet
+
+    Returns:
+        Agent: The process-wide Vibe Trading agent
+    """
+    global _agent, _client, _response_cache, _fingerprint
+
+    with _init_lock:
+        if _agent is None:
+            _client = create_openai_client()
+            set_default_openai_client(_client)
+            agent = create_vibe_trading_agent()
+            _fingerprint = config_fingerprint(
+                agent.instructions,
+                agent.model,
+                agent.model_settings,
+                [(tool.name, tool.description, tool.params_json_schema) for tool in agent.tools],
+            )
+            if _response_cache is None:
+                _response_cache = create_response_cache()
+            _agent = agent
+            logger.info("Vibe Trading agent ready (model %s)", OPENAI_MODEL)
+    return _agent
+
+def get_vibe_trading_agent() -> Agent:
+    """Return the shared agent, building it on first use."""
+    return _agent or init_agent()
+
+async def close_agent() -> None:
+    """Close the shared OpenAI client and drop the cached agent."""
+    global _agent, _client
+
+    client, _client, _agent = _client, None, None
+    if client is not None:
+        await client.close()
+
+async def subscribe_email(email: str) -> Dict[str, Any]:
     """
     Process an email subscription for the Vibe Trading platform
     
@@ -97,7 +255,7 @@ def subscribe_email(email: str) -> Dict[str, Any]:
         Dict[str, Any]: Result information with success status and message
     """
     # Validate email format
-    is_valid, error_msg = validate_email(email)
+    is_valid, error_msg = await validate_email_async(email)
     
     if not is_valid:
         return {
@@ -106,14 +264,14 @@ def subscribe_email(email: str) -> Dict[str, Any]:
         }
     
     # Check if email already exists
-    if email_exists(email):
+    if await email_exists_async(email):
         return {
             "success": True,
             "message": "You're already subscribed! We'll notify you when Vibe Trading launches."
         }
     
     # Add email to the database
-    if add_email(email):
+    if await add_email_async(email, source="chat"):
         return {
             "success": True,
             "message": "Thank you for subscribing! We'll notify you when Vibe Trading launches."
@@ -124,38 +282,274 @@ def subscribe_email(email: str) -> Dict[str, Any]:
             "message": "Failed to subscribe. Please try again later."
         }
         
-def process_chat_message(message: str) -> Dict[str, Any]:
+async def lookup_vibe_index(symbol: str) -> Dict[str, Any]:
     """
-    Process a user message through the Vibe Trading agent
-    
+    Look up the current vibe of a ticker or topic
+
+    Args:
+        symbol: Ticker or topic, such as BTC or $ETH
+
+    Returns:
+        Dict[str, Any]: The index windows, or a message when there is no data
+    """
+    vibe = get_vibe_index(symbol)
+    if vibe is None:
+        return {
+            "success": False,
+            "message": f"No vibe data for {symbol} yet."
+        }
+    return {"success": True, **vibe}
+
+def format_run_result(result: RunResultBase) -> Dict[str, Any]:
+    """
+    Convert an agent run into the response returned by the chat API
+
+    Args:
+        result: The finished agent run
+
+    Returns:
+        Dict[str, Any]: The reply text and the names of the tools it used
+    """
+    tools_used = [
+        item.raw_item.name
+        for item in result.new_items
+        if isinstance(item, ToolCallItem) and hasattr(item.raw_item, "name")
+    ]
+    for tool in tools_used:
+        TOOL_CALLS.labels(tool).inc()
+    return {
+        "message": str(result.final_output),
+        "tools_used": tools_used
+    }
+
+def process_chat_message(message: str, session_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Blocking wrapper around :func:`process_chat_message_async`
+
+    For scripts and tools without an event loop; it cannot be called from
+    inside a running loop.
+
     Args:
         message: The user's message
-    
+        session_id: Optional conversation id
+
     Returns:
         Dict[str, Any]: The agent's response
     """
+    return asyncio.run(process_chat_message_async(message, session_id))
+
+def get_cache_stats() -> Dict[str, Any]:
+    """Return the response cache hit/miss counters for this worker."""
+    if _response_cache is None:
+        return {"backend": None}
+    return _response_cache.stats()
+
+
+async def _lookup_cached_reply(message: str) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+    """
+    Look a message up in the response cache
+
+    Returns:
+        Tuple: The cache key (None if the message must bypass the cache) and
+        the cached reply (None on a miss)
+    """
+    get_vibe_trading_agent()
+    if _response_cache is None:
+        return None, None
+    if not is_cacheable(message):
+        _response_cache.record_bypass()
+        return None, None
+
+    key = make_key(message, _fingerprint)
     try:
-        # Check if OpenAI API key is set
-        if not os.environ.get("OPENAI_API_KEY"):
+        return key, await _response_cache.aget(key)
+    except Exception as e:
+        logger.warning("Chat cache lookup failed: %s", e)
+        return key, None
+
+
+async def _store_reply(key: Optional[str], response: Dict[str, Any]) -> None:
+    """Cache a reply unless it used a tool (those have side effects)."""
+    if key is None or _response_cache is None or response["tools_used"]:
+        return
+    try:
+        await _response_cache.aset(key, response)
+    except Exception as e:
+        logger.warning("Chat cache store failed: %s", e)
+
+
+async def _load_session(session_id: Optional[str]) -> Session:
+    """Return the stored session for ``session_id`` or a fresh one."""
+    if not session_id:
+        return new_session()
+    try:
+        return await _get_session_store().aget(session_id) or new_session()
+    except Exception as e:
+        logger.warning("Could not load chat session %s: %s", session_id, e)
+        return new_session()
+
+
+async def session_exists(session_id: str) -> bool:
+    """Return whether ``session_id`` names a live stored chat session."""
+    try:
+        return await _get_session_store().aget(session_id) is not None
+    except Exception as e:
+        logger.warning("Could not look up chat session %s: %s", session_id, e)
+        return False
+
+
+async def _save_exchange(session_id: Optional[str], session: Session,
+                         message: str, reply: str) -> None:
+    """Record a finished exchange in the session, compacting old turns."""
+    if not session_id:
+        return
+    try:
+        await _get_session_store().aset(session_id, record_exchange(session, message, reply))
+    except Exception as e:
+        logger.warning("Could not save chat session %s: %s", session_id, e)
+
+
+def _get_session_store() -> SessionStore:
+    global _session_store
+    if _session_store is None:
+        _session_store = create_session_store()
+    return _session_store
+
+
+async def process_chat_message_async(message: str, session_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Process a user message through the Vibe Trading agent without blocking
+
+    With a ``session_id`` the message is answered in the context of the
+    earlier turns of that session, trimmed to CHAT_HISTORY_TOKENS. Repeated
+    tool-free opening messages are answered from the response cache. At most
+    CHAT_MAX_CONCURRENCY runs are in flight per worker; a request that cannot
+    get a slot within CHAT_QUEUE_TIMEOUT is rejected right away.
+
+    Args:
+        message: The user's message
+        session_id: Optional conversation id
+
+    Returns:
+        Dict[str, Any]: The agent's response
+
+    Raises:
+        ChatBusyError: If all chat slots are busy
+        ChatTimeoutError: If the agent does not answer within CHAT_TIMEOUT
+    """
+    # Check if OpenAI API key is set
+    if not os.environ.get("OPENAI_API_KEY"):
+        return {
+            "message": "Error: OPENAI_API_KEY is not set in environment variables.",
+            "tools_used": []
+        }
+
+    session = await _load_session(session_id)
+    has_history = bool(session["turns"] or session["summary"])
+
+    # Replies that depend on earlier turns are never cached
+    key, cached = (None, None) if has_history else await _lookup_cached_reply(message)
+    if cached is not None:
+        response = dict(cached)
+    else:
+        await acquire_chat_slot()
+        try:
+            agent = get_vibe_trading_agent()
+            agent_input = build_agent_input(session, message) if has_history else message
+            with span("agent.model_call"):
+                result = await asyncio.wait_for(Runner.run(agent, agent_input), CHAT_TIMEOUT)
+            response = format_run_result(result)
+            await _store_reply(key, response)
+        except asyncio.TimeoutError:
+            raise ChatTimeoutError(f"No answer within {CHAT_TIMEOUT:g}s") from None
+        except Exception as e:
+            logger.error("Chat processing failed: %s", e, exc_info=True)
+            # Return error message as a valid response
             return {
-                "message": "Error: OPENAI_API_KEY is not set in environment variables.",
+                "message": f"I'm sorry, I encountered an error: {str(e)}",
                 "tools_used": []
             }
-            
-        # Create the agent
-        agent = create_vibe_trading_agent()
-        
-        # Get a response from the agent
-        result = agent.run(message)
-        
-        # Format the response for the API
-        return {
-            "message": result.content if hasattr(result, "content") else str(result),
-            "tools_used": [tool.name for tool in result.tool_uses] if hasattr(result, "tool_uses") and result.tool_uses else []
-        }
+        finally:
+            release_chat_slot()
+
+    await _save_exchange(session_id, session, message, response["message"])
+    if session_id:
+        response["session_id"] = session_id
+    return response
+
+
+async def stream_chat_message(message: str, session_id: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Stream a user message through the Vibe Trading agent
+
+    The caller must hold a chat slot (see :func:`acquire_chat_slot`) while
+    consuming the stream.
+
+    Args:
+        message: The user's message
+        session_id: Optional conversation id
+
+    Yields:
+        Dict[str, Any]: ``token`` events with text deltas, ``tool`` events
+        when a tool is called or returns, then a single ``done`` event with
+        the same summary as :func:`process_chat_message_async` or an
+        ``error`` event
+    """
+    if not os.environ.get("OPENAI_API_KEY"):
+        yield {"type": "error", "message": "Error: OPENAI_API_KEY is not set in environment variables."}
+        return
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + CHAT_TIMEOUT
+    result = None
+    try:
+        session = await _load_session(session_id)
+        has_history = bool(session["turns"] or session["summary"])
+
+        key, cached = (None, None) if has_history else await _lookup_cached_reply(message)
+        if cached is not None:
+            response = dict(cached)
+            yield {"type": "token", "delta": response["message"]}
+        else:
+            agent_input = build_agent_input(session, message) if has_history else message
+            started = loop.time()
+            result = Runner.run_streamed(get_vibe_trading_agent(), agent_input)
+            events = result.stream_events()
+            try:
+                while True:
+                    # Not wait_for: it runs each step in a task of its own,
+                    # which is left behind when the client goes away. The
+                    # deadline covers waiting on the model only, never the
+                    # yields, so it cannot fire inside the consumer
+                    async with asyncio.timeout_at(deadline):
+                        event = await anext(events, None)
+                    if event is None:
+                        break
+
+                    if isinstance(event, RawResponsesStreamEvent):
+                        if isinstance(event.data, ResponseTextDeltaEvent) and event.data.delta:
+                            yield {"type": "token", "delta": event.data.delta}
+                    elif isinstance(event, RunItemStreamEvent):
+                        if isinstance(event.item, ToolCallItem):
+                            yield {"type": "tool", "name": getattr(event.item.raw_item, "name", None), "status": "called"}
+                        elif isinstance(event.item, ToolCallOutputItem):
+                            yield {"type": "tool", "status": "done", "output": event.item.output}
+            finally:
+                await events.aclose()
+
+            SPAN_LATENCY.labels("agent.model_call").observe(loop.time() - started)
+            response = format_run_result(result)
+            await _store_reply(key, response)
+
+        await _save_exchange(session_id, session, message, response["message"])
+        if session_id:
+            response["session_id"] = session_id
+        yield {"type": "done", **response}
+    except asyncio.TimeoutError:
+        yield {"type": "error", "message": f"No answer within {CHAT_TIMEOUT:g}s"}
     except Exception as e:
-        # Return error message as a valid response
-        return {
-            "message": f"I'm sorry, I encountered an error: {str(e)}",
-            "tools_used": []
-        }
\ No newline at end of file
+        logger.error("Chat streaming failed: %s", e, exc_info=True)
+        yield {"type": "error", "message": f"I'm sorry, I encountered an error: {str(e)}"}
+    finally:
+        if result is not None and not result.is_complete:
+            result.cancel()
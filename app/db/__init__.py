@@ -1,3 +1,56 @@
-from app.db.database import init_db, add_email, email_exists, get_all_emails
+from app.db.database import (
+    init_db,
+    add_email,
+    add_emails,
+    count_emails,
+    email_exists,
+    get_all_emails,
+    get_db_path,
+    get_emails_page,
+    get_repository,
+)
+from app.db.stats import get_subscriber_stats, rebuild_stats
+from app.db.repository import SQLiteRepository, ShardedRepository, SubscriberRepository
+from app.db.connection import close_connections
+from app.db.aio import (
+    add_email_async,
+    count_emails_async,
+    email_exists_async,
+    get_all_emails_async,
+    get_emails_page_async,
+    get_subscriber_stats_async,
+    insert_email_async,
+    iter_email_pages,
+    shutdown_executors,
+    start_write_behind,
+    stop_write_behind,
+)
 
-__all__ = ["init_db", "add_email", "email_exists", "get_all_emails"]
\ No newline at end of file
+__all__ = [
+    "init_db",
+    "add_email",
+    "add_emails",
+    "count_emails",
+    "email_exists",
+    "get_all_emails",
+    "get_db_path",
+    "get_emails_page",
+    "get_repository",
+    "get_subscriber_stats",
+    "rebuild_stats",
+    "SubscriberRepository",
+    "SQLiteRepository",
+    "ShardedRepository",
+    "close_connections",
+    "add_email_async",
+    "count_emails_async",
+    "email_exists_async",
+    "get_all_emails_async",
+    "get_emails_page_async",
+    "get_subscriber_stats_async",
+    "insert_email_async",
+    "iter_email_pages",
+    "shutdown_executors",
+    "start_write_behind",
+    "stop_write_behind",
+]
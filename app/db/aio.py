@@ -0,0 +1,288 @@
+"""Awaitable wrappers around the blocking database functions.
+
+SQLite calls can block for the whole busy timeout while another process holds
+the write lock, so the FastAPI handlers must never run them on the event
+loop. Writes run on a dedicated writer pool with one thread per file that
+can commit independently (a single thread unless subscribers are sharded;
+SQLite allows one writer per file anyway) and reads run on a small separate
+pool, so a stuck write never delays readers or any other request.
+
+With ``DB_WRITE_BEHIND`` enabled, subscriptions are additionally queued and a
+single writer coroutine flushes them in batches, so a burst of signups costs
+a handful of transactions instead of one fsync per address.
+"""
+
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from app.db import membership
+from app.db.connection import close_connections
+from app.db.database import (
+    Subscription,
+    add_emails,
+    count_emails,
+    email_exists,
+    get_all_emails,
+    get_emails_page,
+    get_repository,
+)
+from app.db.stats import get_subscriber_stats
+from app.utils.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+
+READER_THREADS = int(os.environ.get("DB_READER_THREADS", "2"))
+
+# Defaults to the repository's write concurrency (its shard count)
+WRITER_THREADS = int(os.environ.get("DB_WRITER_THREADS") or 0)
+
+# Write-behind batching of subscription inserts
+WRITE_BEHIND = os.environ.get("DB_WRITE_BEHIND", "").lower() in ("1", "true", "yes")
+BATCH_SIZE = int(os.environ.get("DB_BATCH_SIZE", "200"))
+BATCH_INTERVAL = float(os.environ.get("DB_BATCH_INTERVAL", "0.05"))
+QUEUE_SIZE = int(os.environ.get("DB_QUEUE_SIZE", "10000"))
+
+_writer: Optional[ThreadPoolExecutor] = None
+_readers: Optional[ThreadPoolExecutor] = None
+
+_queue: Optional["asyncio.Queue[Optional[Tuple[Subscription, asyncio.Future]]]"] = None
+_flusher: Optional[asyncio.Task] = None
+
+
+def _get_writer() -> ThreadPoolExecutor:
+    global _writer
+    if _writer is None:
+        threads = WRITER_THREADS or get_repository().write_concurrency
+        _writer = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="db-writer")
+    return _writer
+
+
+def _get_readers() -> ThreadPoolExecutor:
+    global _readers
+    if _readers is None:
+        _readers = ThreadPoolExecutor(max_workers=READER_THREADS, thread_name_prefix="db-reader")
+    return _readers
+
+
+async def run_write(func: Callable[..., T], *args: Any) -> T:
+    """Run a blocking write ``func(*args)`` on the database writer pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_writer(), functools.partial(func, *args))
+
+
+async def run_read(func: Callable[..., T], *args: Any) -> T:
+    """Run a blocking read ``func(*args)`` on the database reader pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_readers(), functools.partial(func, *args))
+
+
+async def insert_email_async(email: str, source: Optional[str] = None,
+                             referrer: Optional[str] = None) -> bool:
+    """
+    Store an email, batching it with concurrent inserts when write-behind is on
+
+    Args:
+        email: The email address to store
+        source: Where the signup came from (e.g. "web", "chat")
+        referrer: Referring page or campaign, if known
+
+    Returns:
+        bool: True if the address is new, False if it was already subscribed
+
+    Raises:
+        sqlite3.Error: If the address could not be written
+    """
+    subscription = (email, source, referrer)
+    queue, flusher = _queue, _flusher
+    if queue is None or flusher is None:
+        return (await run_write(add_emails, [subscription]))[0]
+
+    future = asyncio.get_running_loop().create_future()
+    await queue.put((subscription, future))
+    if flusher.done():
+        # The writer stopped while this insert waited for room in a full
+        # queue; nothing reads the queue any more, so write it directly
+        return (await run_write(add_emails, [subscription]))[0]
+    return await future
+
+
+async def add_email_async(email: str, source: Optional[str] = None,
+                          referrer: Optional[str] = None) -> bool:
+    """Awaitable version of :func:`app.db.database.add_email`."""
+    try:
+        await insert_email_async(email, source, referrer)
+        return True
+    except Exception as e:
+        logger.error("Error adding email %s: %s", email, e, exc_info=True)
+        return False
+
+
+async def email_exists_async(email: str) -> bool:
+    """Awaitable version of :func:`app.db.database.email_exists`."""
+    return await run_read(email_exists, email)
+
+
+async def get_all_emails_async() -> List[dict]:
+    """Awaitable version of :func:`app.db.database.get_all_emails`."""
+    return await run_read(get_all_emails)
+
+
+async def get_emails_page_async(after_id: Optional[int] = None, limit: int = 1000) -> List[dict]:
+    """Awaitable version of :func:`app.db.database.get_emails_page`."""
+    return await run_read(get_emails_page, after_id, limit)
+
+
+async def count_emails_async() -> int:
+    """Awaitable version of :func:`app.db.database.count_emails`."""
+    return await run_read(count_emails)
+
+
+async def get_subscriber_stats_async(days: int = 30, top: int = 10) -> Dict[str, Any]:
+    """Awaitable version of :func:`app.db.stats.get_subscriber_stats`."""
+    return await run_read(get_subscriber_stats, days, top)
+
+
+async def iter_email_pages(page_size: int = 1000) -> AsyncIterator[List[dict]]:
+    """
+    Walk every subscriber, newest first, one keyset page at a time
+
+    Only one page is held in memory at once, however large the table is.
+    Pages are fetched on the reader pool, so each query runs on a thread
+    that owns its connection.
+
+    Yields:
+        List[dict]: Consecutive pages of at most ``page_size`` rows
+    """
+    after_id = None
+    while True:
+        page = await get_emails_page_async(after_id, page_size)
+        if not page:
+            return
+        yield page
+        if len(page) < page_size:
+            return
+        after_id = page[-1]["id"]
+
+
+def _take_queued(queue: asyncio.Queue) -> List[Tuple[Subscription, asyncio.Future]]:
+    """Take up to ``BATCH_SIZE`` inserts already in ``queue``, skipping sentinels."""
+    batch = []
+    while len(batch) < BATCH_SIZE:
+        try:
+            item = queue.get_nowait()
+        except asyncio.QueueEmpty:
+            break
+        if item is not None:
+            batch.append(item)
+    return batch
+
+
+async def _write_batch(batch: List[Tuple[Subscription, asyncio.Future]]) -> None:
+    """Write ``batch`` in one transaction and resolve each insert's future."""
+    try:
+        results = await run_write(add_emails, [subscription for subscription, _ in batch])
+    except Exception as e:
+        logger.error("Error writing batch of %d emails: %s", len(batch), e, exc_info=True)
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(e)
+        return
+
+    logger.debug("Wrote batch of %d emails", len(batch))
+    for (_, future), is_new in zip(batch, results):
+        if not future.done():
+            future.set_result(is_new)
+
+
+async def _flush_batches(queue: asyncio.Queue) -> None:
+    """Collect queued inserts into batches and write each in one transaction.
+
+    After the ``None`` sentinel the queue is drained until it stays empty:
+    inserts that were blocked on a full queue can land behind the sentinel,
+    and each one taken out of the queue lets another blocked insert in.
+    """
+    loop = asyncio.get_running_loop()
+    stopping = False
+
+    while True:
+        if stopping:
+            batch = _take_queued(queue)
+            if not batch:
+                # Let inserts woken by the last batch's gets reach the queue
+                await asyncio.sleep(0)
+                batch = _take_queued(queue)
+                if not batch:
+                    return
+            await _write_batch(batch)
+            continue
+
+        item = await queue.get()
+        if item is None:
+            stopping = True
+            continue
+        batch = [item]
+
+        # Keep collecting until the batch is full or the interval has passed
+        deadline = loop.time() + BATCH_INTERVAL
+        while len(batch) < BATCH_SIZE:
+            try:
+                item = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+            if item is None:
+                stopping = True
+                break
+            batch.append(item)
+
+        await _write_batch(batch)
+
+
+async def start_write_behind() -> None:
+    """Start the batching writer if ``DB_WRITE_BEHIND`` is enabled."""
+    global _queue, _flusher
+
+    if not WRITE_BEHIND or _flusher is not None:
+        return
+    _queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+    _flusher = asyncio.create_task(_flush_batches(_queue))
+    logger.info("Write-behind enabled (batch size %d, interval %.3fs)", BATCH_SIZE, BATCH_INTERVAL)
+
+
+async def stop_write_behind() -> None:
+    """Flush every queued insert and stop the batching writer."""
+    global _queue, _flusher
+
+    if _flusher is None or _queue is None:
+        return
+    queue, flusher = _queue, _flusher
+    # New inserts bypass the queue from here on
+    _queue = _flusher = None
+
+    # Inserts still blocked on a full queue may land behind the sentinel;
+    # the writer drains those too, and any that arrive after it has exited
+    # write themselves (see insert_email_async)
+    await queue.put(None)
+    await flusher
+
+
+def shutdown_executors() -> None:
+    """Wait for queued database work to finish and close all connections."""
+    global _writer, _readers
+
+    for executor in (_writer, _readers):
+        if executor is not None:
+            executor.shutdown(wait=True)
+    _writer = _readers = None
+    close_connections()
+    membership.reset()
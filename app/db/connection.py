@@ -0,0 +1,141 @@
+"""Long-lived SQLite connections shared by the database layer.
+
+Opening a connection, negotiating the journal mode and warming the page
+cache costs far more than the single-row statements the service runs, so
+every thread keeps one connection per database file for the lifetime of the
+process instead of connecting on each call.
+"""
+
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List
+
+from app.utils.logging_config import get_logger
+from app.utils.metrics import DB_LOCK_WAIT
+from app.utils.validators import normalize_email
+
+logger = get_logger(__name__)
+
+# Seconds to wait for another writer to release the database lock
+BUSY_TIMEOUT = float(os.environ.get("DB_BUSY_TIMEOUT", "10.0"))
+
+# Number of prepared statements sqlite3 keeps per connection
+CACHED_STATEMENTS = int(os.environ.get("DB_CACHED_STATEMENTS", "256"))
+
+# Page cache size in KiB (negative values are KiB for PRAGMA cache_size)
+CACHE_SIZE_KB = int(os.environ.get("DB_CACHE_SIZE_KB", "8192"))
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    f"PRAGMA cache_size=-{CACHE_SIZE_KB}",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA foreign_keys=ON",
+)
+
+_local = threading.local()
+_registry_lock = threading.Lock()
+_registry: List[sqlite3.Connection] = []
+
+# Bumped by close_connections() so every thread drops its stale handles
+_generation = 0
+
+
+def _connect(db_path: str) -> sqlite3.Connection:
+    """Open and tune a new connection to ``db_path``."""
+    db_dir = os.path.dirname(db_path)
+    if db_dir:
+        os.makedirs(db_dir, exist_ok=True)
+
+    # check_same_thread is disabled only so close_connections() can close
+    # every thread's handle at shutdown; each handle is used by its owner.
+    conn = sqlite3.connect(
+        db_path,
+        timeout=BUSY_TIMEOUT,
+        cached_statements=CACHED_STATEMENTS,
+        check_same_thread=False,
+    )
+    conn.row_factory = sqlite3.Row
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    # Lets migrations and merges normalize addresses exactly like the app does
+    conn.create_function("normalize_email", 1, normalize_email, deterministic=True)
+
+    with _registry_lock:
+        _registry.append(conn)
+    logger.debug("Opened SQLite connection to %s", db_path)
+    return conn
+
+
+def _thread_connections() -> Dict[str, sqlite3.Connection]:
+    """Return the path -> connection map owned by the current thread."""
+    # Connections must never be shared with a forked child process, so the
+    # map is keyed by pid as well as by the close_connections() generation.
+    owner = (os.getpid(), _generation)
+    if getattr(_local, "owner", None) != owner:
+        _local.owner = owner
+        _local.connections = {}
+    return _local.connections
+
+
+def get_connection(db_path: str) -> sqlite3.Connection:
+    """
+    Return this thread's long-lived connection to ``db_path``
+
+    Args:
+        db_path: Path of the SQLite database file
+
+    Returns:
+        sqlite3.Connection: A tuned connection with ``sqlite3.Row`` rows
+    """
+    connections = _thread_connections()
+    conn = connections.get(db_path)
+    if conn is None:
+        conn = connections[db_path] = _connect(db_path)
+    return conn
+
+
+@contextmanager
+def transaction(db_path: str, immediate: bool = False,
+                database: str = "subscribers") -> Iterator[sqlite3.Connection]:
+    """
+    Run a block inside a single transaction on this thread's connection
+
+    Args:
+        db_path: Path of the SQLite database file
+        immediate: Take the write lock up front (``BEGIN IMMEDIATE``)
+        database: ``database`` label of the lock wait metric
+
+    Yields:
+        sqlite3.Connection: The connection to run statements on
+    """
+    conn = get_connection(db_path)
+    if immediate and not conn.in_transaction:
+        # Blocks (up to busy_timeout) while another connection holds the lock
+        with DB_LOCK_WAIT.labels(database).time():
+            conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    else:
+        conn.commit()
+
+
+def close_connections() -> None:
+    """Close every connection opened by this process."""
+    global _generation
+
+    with _registry_lock:
+        connections = list(_registry)
+        _registry.clear()
+        _generation += 1
+
+    for conn in connections:
+        try:
+            conn.close()
+        except sqlite3.Error as exc:
+            logger.warning("Error closing SQLite connection: %s", exc)
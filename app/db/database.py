@@ -1,10 +1,18 @@
 import sqlite3
 import os
-from typing import List, Optional
-import logging
-import traceback
-
-from app.utils import send_telegram_message
+from typing import Iterable, List, Optional, Set, Tuple, Union
+
+from app.db import membership
+from app.db.migrations import migrate
+from app.db.repository import (
+    SQLiteRepository,
+    ShardedRepository,
+    SubscriberRepository,
+    shard_paths,
+)
+from app.utils.metrics import timed
+from app.utils.telegram import notify_new_subscriber
+from app.utils.validators import normalize_email
 from app.utils.logging_config import get_logger
 
 # Use shared logging configuration from the main application
@@ -13,7 +21,7 @@ logger = get_logger(__name__)
 # Use absolute path to ensure database is created in the right location
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-# Try multiple potential database locations to ensure we can find a writable one
+# Fallback locations probed only when DB_PATH cannot be opened at startup
 POTENTIAL_PATHS = [
     os.path.join(BASE_DIR, "data", "emails.db"),  # Original location
     os.path.join(BASE_DIR, "app", "emails.db"),   # App directory (should be writable)
@@ -21,204 +29,196 @@ POTENTIAL_PATHS = [
     os.path.expanduser("~/emails.db")             # User's home directory
 ]
 
-# Set the default database path to the first location, but will try others if needed
+# Set the default database path to the first location
 DEFAULT_DB_PATH = POTENTIAL_PATHS[0]
 DB_PATH = os.environ.get("DB_PATH", DEFAULT_DB_PATH)
 
-# Log all potential paths for debugging
-for path in POTENTIAL_PATHS:
-    print(f"Potential database path: {os.path.abspath(path)}")
+# Subscriber storage backend: "sqlite" (one file) or "sharded" (DB_SHARDS files
+# named after DB_PATH); sessions and caches always stay in the DB_PATH file
+DB_BACKEND = os.environ.get("DB_BACKEND", "sqlite").lower()
+DB_SHARDS = int(os.environ.get("DB_SHARDS", "4"))
+
+# An address to store, optionally with where the signup came from
+Subscription = Union[str, Tuple[str, Optional[str], Optional[str]]]
+
+# Database files whose schema has already been checked by this process
+_schema_ready: Set[str] = set()
+
+# The main database file, chosen at startup
+_active_path: Optional[str] = None
+
+# Where subscribers are stored, built from the main file at startup
+_repository: Optional[SubscriberRepository] = None
+
+
+def _ensure_schema(db_path: str) -> None:
+    """Migrate ``db_path`` to the current schema once per process."""
+    if db_path in _schema_ready:
+        return
+    migrate(db_path)
+    _schema_ready.add(db_path)
+
+
+def create_repository(db_path: str, backend: str = DB_BACKEND,
+                      shards: int = DB_SHARDS) -> SubscriberRepository:
+    """
+    Build the subscriber repository for ``backend`` next to ``db_path``
+
+    Args:
+        db_path: The main database file
+        backend: "sqlite" or "sharded"
+        shards: Number of shard files for the sharded backend
+
+    Returns:
+        SubscriberRepository: A repository whose files are all migrated
+
+    Raises:
+        ValueError: If ``backend`` is unknown
+    """
+    if backend == "sqlite":
+        repository: SubscriberRepository = SQLiteRepository(db_path)
+    elif backend == "sharded":
+        repository = ShardedRepository(shard_paths(db_path, max(1, shards)))
+    else:
+        raise ValueError(f"Unknown DB_BACKEND {backend!r} (expected 'sqlite' or 'sharded')")
+
+    for path in repository.paths:
+        _ensure_schema(path)
+    return repository
+
+
+def resolve_db_path() -> str:
+    """
+    Choose the database file used for the lifetime of the process
+
+    ``DB_PATH`` is used when it can be opened; the other POTENTIAL_PATHS are
+    probed only if that fails. The subscriber repository is created there too.
+
+    Returns:
+        str: The path of the database every call will use
+    """
+    global _active_path, _repository
+
+    candidates = [DB_PATH] + [path for path in POTENTIAL_PATHS if path != DB_PATH]
+    for candidate in candidates:
+        try:
+            _ensure_schema(candidate)
+            repository = create_repository(candidate)
+        except (OSError, sqlite3.Error) as e:
+            logger.warning("Cannot use database at %s: %s", candidate, e)
+            continue
+
+        if candidate != DB_PATH:
+            logger.error("DB_PATH %s is unusable, falling back to %s", DB_PATH, candidate)
+        _active_path, _repository = candidate, repository
+        try:
+            membership.load(repository.paths)
+        except sqlite3.Error as e:
+            logger.error("Could not load membership index: %s", e)
+        logger.info("Using database at: %s", os.path.abspath(candidate))
+        if len(repository.paths) > 1:
+            logger.info("Subscribers sharded over %d files", len(repository.paths))
+        return candidate
+
+    raise RuntimeError("Could not open any database location")
+
+
+def get_db_path() -> str:
+    """Return the active database path, resolving it on first use."""
+    return _active_path or resolve_db_path()
+
+
+def get_repository() -> SubscriberRepository:
+    """Return the subscriber repository, creating it on first use."""
+    if _repository is None:
+        resolve_db_path()
+    return _repository
 
-logger.info(f"Using database at: {DB_PATH}")
 
 def init_db():
     """Initialize the SQLite database with the required tables"""
-    logger.debug(f"Initializing database at: {DB_PATH}")
-    print(f"Initializing database at: {DB_PATH}")
-    
+    logger.debug("Initializing database at: %s", DB_PATH)
+
     try:
-        # Ensure the database directory exists
-        os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-        
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        # Create emails table if it doesn't exist
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS emails (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            email TEXT UNIQUE NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
-        
-        conn.commit()
-        conn.close()
+        resolve_db_path()
         logger.debug("Database initialization complete")
     except Exception as e:
-        logger.error(f"Error initializing database: {e}", exc_info=True)
-        print(f"ERROR initializing database: {e}")
+        logger.error("Error initializing database: %s", e, exc_info=True)
 
-def add_email(email: str) -> bool:
+@timed("db.add_email")
+def add_email(email: str, source: Optional[str] = None, referrer: Optional[str] = None) -> bool:
     """
     Add a new email to the database
 
+    Addresses are deduplicated on their normalized form, so ``Foo@x.com`` and
+    ``foo@x.com`` are the same subscriber.
+
     Args:
         email: The email address to store
+        source: Where the signup came from (e.g. "web", "chat")
+        referrer: Referring page or campaign, if known
 
     Returns:
-        bool: True if successfully added, False if email already exists
+        bool: True if successfully added or already stored, False on error
     """
-    # Try each potential database path until we find one that works
-    for potential_db_path in POTENTIAL_PATHS:
-        try:
-            print(f"Attempting to use database at: {potential_db_path}")
-            result = _add_email_to_path(email, potential_db_path)
-            if result:
-                print(f"Successfully added email to database at: {potential_db_path}")
-                return True
-        except Exception as e:
-            print(f"Failed to add email to {potential_db_path}: {e}")
-            continue
+    # Make sure the email is stripped of whitespace
+    email = email.strip()
 
-    # If we get here, none of the paths worked
-    print("CRITICAL ERROR: Could not write to any database location")
-    return False
+    key = normalize_email(email)
+    try:
+        inserted = get_repository().add_emails([(email, key, source, referrer)])[0]
+    except Exception as e:
+        logger.error("Error adding email %s: %s", email, e, exc_info=True)
+        return False
+    membership.add_many([key])
 
-def _add_email_to_path(email: str, db_path: str) -> bool:
+    if inserted:
+        _notify_new_subscriber(email)
+    else:
+        logger.debug("Email %s already exists in database", email)
+
+    # An address that is already stored also counts as a success
+    return True
+
+@timed("db.add_emails")
+def add_emails(subscriptions: Iterable[Subscription], notify: bool = True) -> List[bool]:
     """
-    Helper function to add an email to a specific database path
+    Add a batch of emails in a single transaction (one per shard when sharded)
+
+    Args:
+        subscriptions: Email addresses, or ``(email, source, referrer)``
+            tuples
+        notify: Send a Telegram notification for each new subscriber (bulk
+            imports turn this off)
+
+    Returns:
+        List[bool]: For each address, True if it was newly added and False if
+        it was already stored (or repeated earlier in the batch)
+
+    Raises:
+        sqlite3.Error: If the batch could not be written
     """
-    try:
-        # Make sure the email is stripped of whitespace
+    rows = []
+    for entry in subscriptions:
+        email, source, referrer = (entry, None, None) if isinstance(entry, str) else entry
         email = email.strip()
-        logger.debug(f"====== EMAIL SUBMISSION ATTEMPT ======")
-        logger.debug(f"Attempting to add email: {email}")
-
-        # Print to ensure logs appear even if logger is misconfigured
-        print(f"DATABASE OPERATION: Attempting to add email: {email}")
-
-        # Log the actual database file path being used
-        logger.debug(f"Using database at absolute path: {os.path.abspath(db_path)}")
-        print(f"DATABASE PATH: {os.path.abspath(db_path)}")
-
-        # Check if DB file exists
-        if os.path.exists(db_path):
-            db_size = os.path.getsize(db_path)
-            logger.debug(f"Database file exists, size: {db_size} bytes")
-            print(f"Database file exists, size: {db_size} bytes")
-        else:
-            logger.warning(f"Database file does not exist at: {db_path}")
-            print(f"WARNING: Database file does not exist at: {db_path}")
-
-        # Ensure the database directory exists
-        db_dir = os.path.dirname(db_path)
-        if db_dir:  # Only create directory if there's a directory part (not just a filename)
-            os.makedirs(db_dir, exist_ok=True)
-            logger.debug(f"Ensured database directory exists: {db_dir}")
-
-            # Check if directory is writable
-            if os.access(db_dir, os.W_OK):
-                logger.debug(f"Directory {db_dir} is writable")
-            else:
-                logger.error(f"Directory {db_dir} is NOT writable!")
-                print(f"ERROR: Directory {db_dir} is NOT writable!")
-                raise IOError(f"Directory {db_dir} is not writable")
-
-        # Connect to the database with timeout and detailed logging
-        conn = None
-        inserted = False
-        try:
-            logger.debug(f"Connecting to database at {db_path}...")
-            conn = sqlite3.connect(db_path, timeout=10.0)
-            logger.debug("Database connection established")
-            cursor = conn.cursor()
-
-            # Test if the table exists
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='emails'")
-            if not cursor.fetchone():
-                logger.debug("Table 'emails' does not exist, creating it...")
-                print(f"Creating emails table in {db_path}")
-
-                # Create the table
-                cursor.execute('''
-                CREATE TABLE IF NOT EXISTS emails (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    email TEXT UNIQUE NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-                ''')
-                conn.commit()
-                logger.debug("Table creation completed")
-
-            # Log database state
-            cursor.execute("SELECT COUNT(*) FROM emails")
-            count = cursor.fetchone()[0]
-            logger.debug(f"Current email count before insert: {count}")
-            print(f"Current email count in {db_path}: {count}")
-
-            # Check if email already exists
-            cursor.execute("SELECT 1 FROM emails WHERE email = ?", (email,))
-            if cursor.fetchone():
-                logger.debug(f"Email {email} already exists in database")
-                print(f"Email {email} already exists in database")
-                conn.close()
-                return True  # Return True even if it already exists
-
-            # Insert the email
-            logger.debug(f"Executing INSERT for email: {email}")
-            cursor.execute("INSERT INTO emails (email) VALUES (?)", (email,))
-            conn.commit()
-            inserted = True
-            logger.info(f"Email {email} saved to database at {db_path}")
-            logger.debug("INSERT committed successfully")
-            print(f"NEW EMAIL ADDED TO {db_path}: {email}")
-
-            # Verify the insert
-            cursor.execute("SELECT COUNT(*) FROM emails")
-            new_count = cursor.fetchone()[0]
-            logger.debug(f"Email count after insert: {new_count}")
-            print(f"New email count: {new_count}")
-
-            # Check that our specific email was actually inserted
-            cursor.execute("SELECT * FROM emails WHERE email = ?", (email,))
-            result = cursor.fetchone()
-            if result:
-                logger.debug(f"Verified email is in database: {result}")
-                print(f"Verified email is now in database: {email}")
-            else:
-                logger.error(f"Email not found in database after insert!")
-                print(f"ERROR: Email not found after insert!")
-                raise Exception("Email not found after insert, likely database write issue")
-
-            conn.close()
-            logger.debug(f"Successfully added email: {email}")
-            logger.debug(f"====== EMAIL SUBMISSION COMPLETE ======")
-            if inserted:
-                try:
-                    send_telegram_message(f"New vibe subscriber: {email}")
-                except Exception as e:
-                    logger.error(f"Telegram notification failed: {e}")
-            return True
-
-        except sqlite3.Error as sql_error:
-            logger.error(f"SQLite error with {db_path}: {sql_error}", exc_info=True)
-            print(f"SQLite ERROR with {db_path}: {sql_error}")
-            if conn:
-                conn.close()
-            raise sql_error
-            
-    except sqlite3.IntegrityError as e:
-        logger.warning(f"IntegrityError adding email {email}: {e}")
-        print(f"INTEGRITY ERROR: {e}")
-        # Email already exists - return True since we consider this a "success"
-        return True
-    except Exception as e:
-        logger.error(f"Error adding email {email}: {e}", exc_info=True)
-        print(f"EXCEPTION: {e}")
-        print(traceback.format_exc())
-        return False
+        rows.append((email, normalize_email(email), source, referrer))
+
+    inserted = get_repository().add_emails(rows)
+    membership.add_many(row[1] for row in rows)
+
+    if notify:
+        for row, is_new in zip(rows, inserted):
+            if is_new:
+                _notify_new_subscriber(row[0])
+    return inserted
 
+def _notify_new_subscriber(email: str) -> None:
+    """Log a newly stored subscriber and queue a Telegram notification."""
+    logger.info("Email %s saved to database", email)
+    notify_new_subscriber(email)
+
+@timed("db.email_exists")
 def email_exists(email: str) -> bool:
     """
     Check if an email already exists in the database
@@ -229,68 +229,50 @@ def email_exists(email: str) -> bool:
     Returns:
         bool: True if email exists, False otherwise
     """
-    # Check all potential database paths
-    for db_path in POTENTIAL_PATHS:
-        try:
-            if os.path.exists(db_path):
-                conn = sqlite3.connect(db_path)
-                cursor = conn.cursor()
-
-                # Check if the table exists first
-                cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='emails'")
-                if not cursor.fetchone():
-                    conn.close()
-                    continue  # Table doesn't exist, try next database
-
-                cursor.execute("SELECT 1 FROM emails WHERE email = ?", (email,))
-                result = cursor.fetchone() is not None
-
-                conn.close()
-                if result:
-                    return True
-            else:
-                logger.debug(f"Database file {db_path} does not exist, skipping email existence check")
-        except Exception as e:
-            logger.error(f"Error checking if email exists in {db_path}: {e}", exc_info=True)
-            print(f"Error checking if email exists in {db_path}: {e}")
-
-    # If we get here, email was not found in any database
-    return False
+    key = normalize_email(email)
+
+    # Answered from memory unless the index is off or unsure
+    known = membership.contains(key)
+    if known is not None:
+        return known
 
+    try:
+        return get_repository().email_exists(key)
+    except Exception as e:
+        logger.error("Error checking if email exists: %s", e, exc_info=True)
+        return False
+
+@timed("db.get_all_emails")
 def get_all_emails() -> List[dict]:
     """
-    Retrieve all stored email addresses from all possible database locations
+    Retrieve all stored email addresses
 
     Returns:
         List[dict]: A list of dictionaries with email information
     """
-    all_emails = []
+    return get_repository().get_all_emails()
 
-    # Try to get emails from all database paths
-    for db_path in POTENTIAL_PATHS:
-        try:
-            if os.path.exists(db_path):
-                conn = sqlite3.connect(db_path)
-                conn.row_factory = sqlite3.Row
-                cursor = conn.cursor()
-
-                # Check if the table exists first
-                cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='emails'")
-                if not cursor.fetchone():
-                    conn.close()
-                    continue  # Table doesn't exist, try next database
-
-                cursor.execute("SELECT id, email, created_at, ? as source FROM emails ORDER BY created_at DESC",
-                              (os.path.basename(db_path),))
-
-                # Convert rows to dictionaries
-                db_emails = [dict(row) for row in cursor.fetchall()]
-                all_emails.extend(db_emails)
-
-                conn.close()
-                print(f"Found {len(db_emails)} emails in database: {db_path}")
-        except Exception as e:
-            logger.error(f"Error retrieving emails from {db_path}: {e}", exc_info=True)
-            print(f"Error retrieving emails from {db_path}: {e}")
-
-    return all_emails
\ No newline at end of file
+
+@timed("db.get_emails_page")
+def get_emails_page(after_id: Optional[int] = None, limit: int = 1000) -> List[dict]:
+    """
+    Retrieve one page of subscribers, newest first
+
+    Keyset pagination: pass the ``id`` of the last row of the previous page
+    as ``after_id`` to get the next one. Each page is an index range scan, so
+    the cost does not grow with the page number.
+
+    Args:
+        after_id: Only return rows with a smaller id (None for the first page)
+        limit: Maximum number of rows to return
+
+    Returns:
+        List[dict]: Rows with ``id``, ``email``, ``created_at``, ``source``
+        and ``referrer``
+    """
+    return get_repository().get_emails_page(after_id, limit)
+
+@timed("db.count_emails")
+def count_emails() -> int:
+    """Return the number of stored subscribers."""
+    return get_repository().count_emails()
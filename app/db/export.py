@@ -0,0 +1,30 @@
+"""Subscriber export formats shared by the admin API and ``check_db.py``."""
+
+import csv
+import io
+import json
+from typing import List
+
+CSV_COLUMNS = ("id", "email", "created_at", "source", "referrer")
+
+
+def format_txt(rows: List[dict]) -> str:
+    return "".join(f"{row['email']}\n" for row in rows)
+
+
+def format_csv(rows: List[dict]) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(tuple(row[column] for column in CSV_COLUMNS) for row in rows)
+    return buffer.getvalue()
+
+
+def format_ndjson(rows: List[dict]) -> str:
+    return "".join(json.dumps(row) + "\n" for row in rows)
+
+
+# Export format -> (media type, header line, page formatter)
+EXPORT_FORMATS = {
+    "txt": ("text/plain; charset=utf-8", "", format_txt),
+    "csv": ("text/csv; charset=utf-8", ",".join(CSV_COLUMNS) + "\r\n", format_csv),
+    "ndjson": ("application/x-ndjson", "", format_ndjson),
+}
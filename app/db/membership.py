@@ -0,0 +1,274 @@
+"""In-process index of subscribed addresses for I/O-free duplicate checks.
+
+The index holds every normalized address (or, above
+``MEMBERSHIP_BLOOM_THRESHOLD`` addresses, a Bloom filter of them). It is
+loaded once at startup from every subscriber file (one, or one per shard)
+and updated on every local insert. Inserts made by other uvicorn workers or
+tools are picked up cheaply: ``PRAGMA data_version`` on the index's own
+connection to each file changes whenever any other connection commits, and
+only then are that file's rows newer than its last seen id read.
+
+Lookups never wait. They read the current index without a lock. At most
+every ``MEMBERSHIP_SYNC_INTERVAL`` seconds, one of them also runs the
+incremental sync. If another thread holds the lock (a sync or a local
+insert), the lookup answers from the index as it is. Until the next sync,
+an insert by another process may be reported as absent. Callers insert
+with ``INSERT OR IGNORE`` either way. The periodic full reload runs on a
+background thread with its own connections. The new index replaces the
+old one in a single assignment, and rows committed while it was being
+built are then caught up by the incremental sync.
+"""
+
+import hashlib
+import math
+import os
+import sqlite3
+import threading
+import time
+from typing import Iterable, List, Optional, Set, Tuple, Union
+
+from app.utils.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+MEMBERSHIP_INDEX = os.environ.get("MEMBERSHIP_INDEX", "true").lower() in ("1", "true", "yes")
+BLOOM_THRESHOLD = int(os.environ.get("MEMBERSHIP_BLOOM_THRESHOLD", "5000000"))
+BLOOM_ERROR_RATE = float(os.environ.get("MEMBERSHIP_BLOOM_ERROR_RATE", "0.001"))
+
+# Deletes are not visible to the incremental sync, so reload fully this often
+RELOAD_INTERVAL = float(os.environ.get("MEMBERSHIP_RELOAD_INTERVAL", "3600"))
+
+# Seconds between checks for rows committed by other processes
+SYNC_INTERVAL = float(os.environ.get("MEMBERSHIP_SYNC_INTERVAL", "0.1"))
+
+LOAD_CHUNK = 50000
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings (no false negatives)."""
+
+    def __init__(self, capacity: int, error_rate: float = BLOOM_ERROR_RATE):
+        self.capacity = max(capacity, 1)
+        self.num_bits = max(8, int(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / self.capacity * math.log(2)))
+        self._bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, key: str) -> None:
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    def __len__(self) -> int:
+        return self.count
+
+
+class _Source:
+    """The index's own connection to one subscriber file and its sync position."""
+
+    def __init__(self, db_path: str):
+        self.path = db_path
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.max_id = 0
+        self.data_version = -1
+
+    def read_rows(self, after_id: int):
+        """Yield ``(id, email_normalized)`` rows newer than ``after_id``."""
+        while True:
+            rows = self.conn.execute(
+                "SELECT id, email_normalized FROM emails WHERE id > ? ORDER BY id LIMIT ?",
+                (after_id, LOAD_CHUNK),
+            ).fetchall()
+            yield from rows
+            if len(rows) < LOAD_CHUNK:
+                return
+            after_id = rows[-1][0]
+
+
+# Guards _sources' connections and sync positions and every change to _keys
+# (Bloom filter bits are updated read-modify-write); lookups do not take it
+_lock = threading.Lock()
+_sources: List[_Source] = []
+_keys: Optional[Union[Set[str], BloomFilter]] = None
+_loaded_at = 0.0
+_synced_at = 0.0
+_reloading = False
+# Bumped by load() and reset() so a reload started before them is discarded
+_generation = 0
+
+
+def _build(db_paths: List[str]) -> Tuple[Union[Set[str], BloomFilter], List[int], int]:
+    """
+    Read every subscriber into a new index, on connections of its own
+
+    Returns:
+        Tuple: The index, the highest row id it covers in each file, and
+        the number of subscribers
+    """
+    snapshots = []
+    try:
+        for path in db_paths:
+            conn = sqlite3.connect(path)
+            snapshots.append([conn, 0, 0])
+            # One read transaction, so the rows match the counted snapshot
+            conn.execute("BEGIN")
+            snapshots[-1][1:] = conn.execute(
+                "SELECT COUNT(*), COALESCE(MAX(id), 0) FROM emails"
+            ).fetchone()
+
+        count = sum(rows for _, rows, _ in snapshots)
+        keys: Union[Set[str], BloomFilter]
+        keys = BloomFilter(count * 2) if count >= BLOOM_THRESHOLD else set()
+        for conn, _, max_id in snapshots:
+            after_id = 0
+            while True:
+                rows = conn.execute(
+                    "SELECT id, email_normalized FROM emails WHERE id > ? AND id <= ? "
+                    "ORDER BY id LIMIT ?",
+                    (after_id, max_id, LOAD_CHUNK),
+                ).fetchall()
+                for _, key in rows:
+                    keys.add(key)
+                if len(rows) < LOAD_CHUNK:
+                    break
+                after_id = rows[-1][0]
+    finally:
+        for conn, _, _ in snapshots:
+            conn.close()
+    return keys, [max_id for _, _, max_id in snapshots], count
+
+
+def _install(keys: Union[Set[str], BloomFilter], max_ids: List[int], count: int) -> None:
+    """Make ``keys`` the index; caller holds ``_lock``."""
+    global _keys, _loaded_at
+
+    for source, max_id in zip(_sources, max_ids):
+        source.max_id = max_id
+        # Force a sync: rows committed after the snapshot are not in ``keys``
+        source.data_version = -1
+    _keys, _loaded_at = keys, time.monotonic()
+    logger.info("Loaded %d subscribers into the membership index (%s)",
+                count, type(keys).__name__)
+
+
+def _reload_in_background(db_paths: List[str], generation: int) -> None:
+    """Rebuild the index off the request path and swap it in."""
+    global _reloading
+
+    try:
+        built = _build(db_paths)
+        with _lock:
+            if generation == _generation:
+                _install(*built)
+    except sqlite3.Error as e:
+        logger.warning("Membership index reload failed: %s", e)
+    finally:
+        _reloading = False
+
+
+def _sync() -> None:
+    """Pull rows committed by other connections since the last check; caller holds ``_lock``."""
+    for source in _sources:
+        version = source.conn.execute("PRAGMA data_version").fetchone()[0]
+        if version == source.data_version:
+            continue
+        source.data_version = version
+        for row_id, key in source.read_rows(source.max_id):
+            _keys.add(key)
+            source.max_id = max(source.max_id, row_id)
+
+
+def _maybe_refresh() -> None:
+    """Start a due reload and run a due sync, without ever waiting for the lock."""
+    global _synced_at, _reloading
+
+    now = time.monotonic()
+    if now - _synced_at < SYNC_INTERVAL or not _lock.acquire(blocking=False):
+        return
+    try:
+        _synced_at = now
+        if now - _loaded_at > RELOAD_INTERVAL and not _reloading:
+            _reloading = True
+            threading.Thread(
+                target=_reload_in_background,
+                args=([source.path for source in _sources], _generation),
+                name="membership-reload",
+                daemon=True,
+            ).start()
+        _sync()
+    finally:
+        _lock.release()
+
+
+def _close() -> None:
+    """Close every source connection; caller holds ``_lock``."""
+    for source in _sources:
+        source.conn.close()
+    _sources.clear()
+
+
+def load(db_paths: Iterable[str]) -> None:
+    """Build the index over ``db_paths`` (no-op when MEMBERSHIP_INDEX is off)."""
+    global _generation
+
+    if not MEMBERSHIP_INDEX:
+        return
+    db_paths = list(db_paths)
+    with _lock:
+        _generation += 1
+        _close()
+        _sources.extend(_Source(path) for path in db_paths)
+        _install(*_build(db_paths))
+
+
+def contains(key: str) -> Optional[bool]:
+    """
+    Answer a membership question for a normalized address
+
+    Returns:
+        Optional[bool]: True or False when the index knows, None when the
+        caller must ask the database (index not loaded, or a possible
+        Bloom filter false positive)
+    """
+    if _keys is None:
+        return None
+    try:
+        _maybe_refresh()
+    except sqlite3.Error as e:
+        logger.warning("Membership index sync failed: %s", e)
+        return None
+    keys = _keys
+    if keys is None:
+        return None
+    if key not in keys:
+        return False
+    return True if isinstance(keys, set) else None
+
+
+def add_many(keys: Iterable[str]) -> None:
+    """Record addresses this process has just inserted."""
+    with _lock:
+        if _keys is None:
+            return
+        for key in keys:
+            _keys.add(key)
+
+
+def reset() -> None:
+    """Drop the index and close its connections."""
+    global _keys, _generation
+
+    with _lock:
+        _generation += 1
+        _close()
+        _keys = None
@@ -0,0 +1,113 @@
+"""One-shot tool that folds stray ``emails.db`` files into ``DB_PATH``.
+
+Older releases wrote to whichever of ``POTENTIAL_PATHS`` happened to be
+writable, so subscribers may be spread over several files. Run this once per
+deployment to merge them into the canonical database::
+
+    python -m app.db.merge [--dry-run] [--archive] [extra.db ...]
+"""
+
+import argparse
+import os
+import sqlite3
+import time
+from typing import Dict, Iterable, List
+
+from app.db.connection import get_connection, transaction
+from app.db.database import DB_BACKEND, DB_PATH, POTENTIAL_PATHS, _ensure_schema
+from app.db.stats import rebuild_stats
+from app.utils.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+MERGE_SQL = """
+INSERT OR IGNORE INTO main.emails (email, email_normalized, created_at)
+SELECT email, normalize_email(email), created_at FROM stray.emails ORDER BY id
+"""
+
+
+def find_stray_databases(target: str = DB_PATH) -> List[str]:
+    """Return the existing POTENTIAL_PATHS files other than ``target``."""
+    target = os.path.abspath(target)
+    strays = []
+    for path in POTENTIAL_PATHS:
+        path = os.path.abspath(path)
+        if path != target and path not in strays and os.path.exists(path):
+            strays.append(path)
+    return strays
+
+
+def merge_databases(sources: Iterable[str], target: str = DB_PATH,
+                    dry_run: bool = False, archive: bool = False) -> Dict[str, int]:
+    """
+    Copy every subscriber from ``sources`` into ``target``
+
+    Addresses already present in ``target`` are kept as they are, so running
+    the merge twice is harmless.
+
+    Args:
+        sources: Database files to fold in
+        target: The canonical database file
+        dry_run: Count what would be merged without writing anything
+        archive: Rename each merged source to ``<name>.merged-<timestamp>``
+
+    Returns:
+        Dict[str, int]: Number of new addresses taken from each source
+    """
+    _ensure_schema(target)
+    merged: Dict[str, int] = {}
+
+    for source in sources:
+        conn = get_connection(target)
+        try:
+            conn.execute("ATTACH DATABASE ? AS stray", (source,))
+            try:
+                with transaction(target, immediate=True):
+                    before = conn.total_changes
+                    conn.execute(MERGE_SQL)
+                    merged[source] = conn.total_changes - before
+                    if dry_run:
+                        conn.rollback()
+            finally:
+                conn.execute("DETACH DATABASE stray")
+        except sqlite3.Error as e:
+            logger.error("Could not merge %s: %s", source, e)
+            continue
+
+        if merged[source] and not dry_run:
+            # The merge inserts behind the repository, so recount the stats
+            rebuild_stats(target)
+        logger.info("Merged %d new emails from %s", merged[source], source)
+        if archive and not dry_run:
+            archived = f"{source}.merged-{int(time.time())}"
+            os.replace(source, archived)
+            logger.info("Archived %s as %s", source, archived)
+
+    return merged
+
+
+def main() -> None:
+    """Merge stray databases into DB_PATH from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("sources", nargs="*", help="extra database files to merge")
+    parser.add_argument("--dry-run", action="store_true", help="only report counts")
+    parser.add_argument("--archive", action="store_true",
+                        help="rename merged files so they are not merged again")
+    args = parser.parse_args()
+
+    if DB_BACKEND != "sqlite":
+        # Stray files predate sharding; the merge writes into the DB_PATH file only
+        parser.error(f"merging needs DB_BACKEND=sqlite (currently {DB_BACKEND})")
+
+    sources = find_stray_databases() + [os.path.abspath(path) for path in args.sources]
+    if not sources:
+        print(f"No stray databases found; {DB_PATH} is the only copy")
+        return
+
+    merged = merge_databases(sources, dry_run=args.dry_run, archive=args.archive)
+    for source, count in merged.items():
+        print(f"{source}: {count} new emails{' (dry run)' if args.dry_run else ''}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""Versioned schema migrations for the subscriber database.
+
+The schema version is stored in ``PRAGMA user_version``. :func:`migrate`
+applies every pending step in order; each step is safe to re-run and takes
+the write lock only for short transactions, so it can run against a live,
+populated database while other workers keep serving requests.
+
+Versions:
+
+1. ``emails`` table (id, email, created_at)
+2. ``email_normalized`` column with a unique index (case-insensitive
+   dedup), an index on ``created_at`` and ``source``/``referrer`` columns
+3. ``subscriber_totals``, ``subscriber_daily``, ``subscriber_domains`` and
+   ``subscriber_sources`` summary tables, with triggers for deletes and
+   re-normalized keys (see :mod:`app.db.stats`)
+"""
+
+import sqlite3
+from typing import Callable, List, Tuple
+
+from app.db.connection import get_connection, transaction
+from app.utils.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Rows updated per transaction while backfilling a new column
+BACKFILL_CHUNK = 5000
+
+V1_SCHEMA_SQL = '''
+CREATE TABLE IF NOT EXISTS emails (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    email TEXT UNIQUE NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+)
+'''
+
+V2_DUPLICATES_SQL = '''
+CREATE TABLE IF NOT EXISTS emails_duplicates (
+    id INTEGER PRIMARY KEY,
+    email TEXT NOT NULL,
+    email_normalized TEXT,
+    created_at TIMESTAMP,
+    source TEXT,
+    referrer TEXT,
+    duplicate_of INTEGER NOT NULL,
+    moved_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+)
+'''
+
+# Every row whose normalized address already belongs to an older row
+V2_FIND_DUPLICATES_SQL = '''
+SELECT e.id, keeper.id AS duplicate_of
+FROM emails AS e
+JOIN (
+    SELECT email_normalized, MIN(id) AS id FROM emails
+    GROUP BY email_normalized HAVING COUNT(*) > 1
+) AS keeper ON keeper.email_normalized = e.email_normalized
+WHERE e.id != keeper.id
+'''
+
+# Summary tables for /api/admin/stats, one row per day / domain / source
+V3_STATS_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS subscriber_totals (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        subscribers INTEGER NOT NULL
+    )""",
+    "CREATE TABLE IF NOT EXISTS subscriber_daily (day TEXT PRIMARY KEY, signups INTEGER NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS subscriber_domains (domain TEXT PRIMARY KEY, signups INTEGER NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS subscriber_sources (source TEXT PRIMARY KEY, signups INTEGER NOT NULL)",
+    # Top-N reads walk these instead of sorting every domain or source
+    "CREATE INDEX IF NOT EXISTS idx_subscriber_domains_signups ON subscriber_domains (signups)",
+    "CREATE INDEX IF NOT EXISTS idx_subscriber_sources_signups ON subscriber_sources (signups)",
+    # Inserts are counted per batch by app.db.repository.record_signups,
+    # which is far cheaper for bulk imports than a per-row trigger; deletes
+    # and re-normalizations are rare and covered here for every writer
+    """CREATE TRIGGER IF NOT EXISTS emails_stats_delete AFTER DELETE ON emails BEGIN
+        UPDATE subscriber_totals SET subscribers = subscribers - 1 WHERE id = 1;
+        UPDATE subscriber_daily SET signups = signups - 1
+            WHERE day = date(COALESCE(OLD.created_at, CURRENT_TIMESTAMP));
+        UPDATE subscriber_domains SET signups = signups - 1
+            WHERE domain = substr(OLD.email_normalized, instr(OLD.email_normalized, '@') + 1);
+        UPDATE subscriber_sources SET signups = signups - 1 WHERE source = COALESCE(OLD.source, '');
+    END""",
+    # dedupe re-normalizes keys, which can change the domain (e.g. IDNA)
+    """CREATE TRIGGER IF NOT EXISTS emails_stats_update AFTER UPDATE OF email_normalized ON emails
+    BEGIN
+        UPDATE subscriber_domains SET signups = signups - 1
+            WHERE domain = substr(OLD.email_normalized, instr(OLD.email_normalized, '@') + 1);
+        INSERT INTO subscriber_domains (domain, signups)
+            VALUES (substr(NEW.email_normalized, instr(NEW.email_normalized, '@') + 1), 1)
+            ON CONFLICT (domain) DO UPDATE SET signups = signups + 1;
+    END""",
+)
+
+# Recompute the summary tables from ``emails``; run in one transaction
+V3_REBUILD_STATS = (
+    "DELETE FROM subscriber_totals",
+    "DELETE FROM subscriber_daily",
+    "DELETE FROM subscriber_domains",
+    "DELETE FROM subscriber_sources",
+    "INSERT INTO subscriber_totals (id, subscribers) SELECT 1, COUNT(*) FROM emails",
+    "INSERT INTO subscriber_daily (day, signups) "
+    "SELECT date(COALESCE(created_at, CURRENT_TIMESTAMP)), COUNT(*) FROM emails GROUP BY 1",
+    "INSERT INTO subscriber_domains (domain, signups) "
+    "SELECT substr(email_normalized, instr(email_normalized, '@') + 1), COUNT(*) "
+    "FROM emails GROUP BY 1",
+    "INSERT INTO subscriber_sources (source, signups) "
+    "SELECT COALESCE(source, ''), COUNT(*) FROM emails GROUP BY 1",
+)
+
+
+def get_schema_version(db_path: str) -> int:
+    """Return the schema version recorded in ``db_path``."""
+    return get_connection(db_path).execute("PRAGMA user_version").fetchone()[0]
+
+
+def _columns(conn: sqlite3.Connection, table: str) -> List[str]:
+    return [row["name"] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def _migrate_v1(db_path: str) -> None:
+    with transaction(db_path, immediate=True) as conn:
+        conn.execute(V1_SCHEMA_SQL)
+
+
+def _migrate_v2(db_path: str) -> None:
+    # 1. New columns: ALTER TABLE ADD COLUMN only rewrites the schema row
+    with transaction(db_path, immediate=True) as conn:
+        existing = _columns(conn, "emails")
+        for column in ("email_normalized", "source", "referrer"):
+            if column not in existing:
+                conn.execute(f"ALTER TABLE emails ADD COLUMN {column} TEXT")
+
+    # 2. Backfill in short transactions so live writers are never stalled
+    while True:
+        with transaction(db_path, immediate=True) as conn:
+            updated = conn.execute(
+                "UPDATE emails SET email_normalized = normalize_email(email) "
+                "WHERE id IN (SELECT id FROM emails WHERE email_normalized IS NULL LIMIT ?)",
+                (BACKFILL_CHUNK,),
+            ).rowcount
+        if updated < BACKFILL_CHUNK:
+            break
+
+    # 3. Finish rows written meanwhile, set aside case-variant duplicates
+    #    (keeping the oldest row) and build the indexes
+    with transaction(db_path, immediate=True) as conn:
+        conn.execute(
+            "UPDATE emails SET email_normalized = normalize_email(email) "
+            "WHERE email_normalized IS NULL"
+        )
+        duplicates = conn.execute(V2_FIND_DUPLICATES_SQL).fetchall()
+        if duplicates:
+            conn.execute(V2_DUPLICATES_SQL)
+            conn.executemany(
+                "INSERT INTO emails_duplicates "
+                "(id, email, email_normalized, created_at, source, referrer, duplicate_of) "
+                "SELECT id, email, email_normalized, created_at, source, referrer, ? "
+                "FROM emails WHERE id = ?",
+                [(row["duplicate_of"], row["id"]) for row in duplicates],
+            )
+            conn.executemany("DELETE FROM emails WHERE id = ?", [(row["id"],) for row in duplicates])
+            logger.warning("Moved %d case-variant duplicate emails to emails_duplicates", len(duplicates))
+
+        conn.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_emails_normalized ON emails (email_normalized)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_emails_created_at ON emails (created_at)")
+
+
+def _migrate_v3(db_path: str) -> None:
+    # Tables, triggers and the initial fill share one transaction, so no
+    # insert can slip in between and be counted twice or not at all. The
+    # fill is one pass over ``emails`` (about a second per million rows).
+    with transaction(db_path, immediate=True) as conn:
+        for statement in V3_STATS_SCHEMA + V3_REBUILD_STATS:
+            conn.execute(statement)
+
+
+MIGRATIONS: List[Tuple[int, Callable[[str], None]]] = [
+    (1, _migrate_v1),
+    (2, _migrate_v2),
+    (3, _migrate_v3),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def migrate(db_path: str) -> int:
+    """
+    Bring ``db_path`` up to the latest schema version
+
+    Concurrent callers (e.g. several workers starting at once) are safe: the
+    version is re-checked under the write lock before each step is recorded.
+
+    Args:
+        db_path: Path of the SQLite database file
+
+    Returns:
+        int: The schema version after migrating
+    """
+    for version, step in MIGRATIONS:
+        if get_schema_version(db_path) >= version:
+            continue
+
+        logger.info("Migrating %s to schema version %d", db_path, version)
+        step(db_path)
+        with transaction(db_path, immediate=True) as conn:
+            current = conn.execute("PRAGMA user_version").fetchone()[0]
+            if current < version:
+                # PRAGMA does not accept bound parameters; version is an int
+                conn.execute(f"PRAGMA user_version = {int(version)}")
+
+    return get_schema_version(db_path)
@@ -0,0 +1,233 @@
+"""Storage backends for subscribers behind one repository interface.
+
+The free functions in :mod:`app.db.database` validate, normalize, notify and
+time each call, then delegate the SQL to the active
+:class:`SubscriberRepository`. Two backends exist:
+
+* :class:`SQLiteRepository` - every subscriber in one SQLite file (default)
+* :class:`ShardedRepository` - subscribers spread over N SQLite files by a
+  hash of the normalized address, so N writers can commit at once instead of
+  queueing on one file's write lock
+
+Sharded row ids stay unique and keep the newest-first keyset order: a row's
+global id is ``local_id * N + shard``. Listings and counts scatter to every
+shard and merge the results. A batch that spans shards is committed shard by
+shard, so it is atomic per shard only.
+
+The shard count is part of the file names (``emails.0-of-4.db``), so
+starting with a different ``DB_SHARDS`` never reads half of an old layout.
+"""
+
+import hashlib
+import heapq
+import json
+import os
+import sqlite3
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from app.db.connection import get_connection, transaction
+
+# Statements are module constants so sqlite3's per-connection statement cache
+# always sees the same SQL text and reuses the prepared statement.
+INSERT_EMAIL_SQL = (
+    "INSERT OR IGNORE INTO emails (email, email_normalized, source, referrer) "
+    "VALUES (?, ?, ?, ?)"
+)
+EMAIL_EXISTS_SQL = "SELECT 1 FROM emails WHERE email_normalized = ?"
+EXISTING_EMAILS_SQL = (
+    "SELECT email_normalized FROM emails "
+    "WHERE email_normalized IN (SELECT value FROM json_each(?))"
+)
+SELECT_EMAILS_SQL = (
+    "SELECT id, email, created_at, source, referrer FROM emails ORDER BY created_at DESC"
+)
+SELECT_PAGE_SQL = (
+    "SELECT id, email, created_at, source, referrer FROM emails "
+    "WHERE id < ? ORDER BY id DESC LIMIT ?"
+)
+COUNT_EMAILS_SQL = "SELECT COUNT(*) FROM emails"
+
+# Summary tables behind /api/admin/stats (schema version 3)
+ADD_TOTAL_SQL = (
+    "INSERT INTO subscriber_totals (id, subscribers) VALUES (1, ?) "
+    "ON CONFLICT (id) DO UPDATE SET subscribers = subscribers + excluded.subscribers"
+)
+ADD_DAILY_SQL = (
+    "INSERT INTO subscriber_daily (day, signups) VALUES (COALESCE(?, date('now')), ?) "
+    "ON CONFLICT (day) DO UPDATE SET signups = signups + excluded.signups"
+)
+ADD_DOMAIN_SQL = (
+    "INSERT INTO subscriber_domains (domain, signups) VALUES (?, ?) "
+    "ON CONFLICT (domain) DO UPDATE SET signups = signups + excluded.signups"
+)
+ADD_SOURCE_SQL = (
+    "INSERT INTO subscriber_sources (source, signups) VALUES (?, ?) "
+    "ON CONFLICT (source) DO UPDATE SET signups = signups + excluded.signups"
+)
+
+# Larger than any rowid, used as the keyset cursor for the first page
+FIRST_PAGE = 2 ** 63 - 1
+
+# A normalized row ready to store: (email, email_normalized, source, referrer)
+Row = Tuple[str, str, Optional[str], Optional[str]]
+
+
+def record_signups(conn: sqlite3.Connection, rows: Sequence[Row], day: Optional[str] = None) -> None:
+    """
+    Count newly inserted ``rows`` in the summary tables, in the caller's transaction
+
+    One upsert per distinct day, domain and source rather than per row, so
+    a 10,000-row import touches a few hundred summary rows.
+
+    Args:
+        conn: Connection with the inserting transaction open
+        rows: The rows that were actually inserted
+        day: Signup date (``YYYY-MM-DD``) if not today (UTC)
+    """
+    if not rows:
+        return
+    domains = Counter(row[1].partition("@")[2] for row in rows)
+    sources = Counter(row[2] or "" for row in rows)
+    conn.execute(ADD_TOTAL_SQL, (len(rows),))
+    conn.execute(ADD_DAILY_SQL, (day, len(rows)))
+    conn.executemany(ADD_DOMAIN_SQL, domains.items())
+    conn.executemany(ADD_SOURCE_SQL, sources.items())
+
+
+class SubscriberRepository:
+    """Base class for subscriber storage; addresses arrive already normalized."""
+
+    #: Database files holding subscribers, for migrations and the membership index
+    paths: List[str]
+
+    #: Writes that can commit at the same time without waiting on each other
+    write_concurrency: int = 1
+
+    def add_emails(self, rows: Sequence[Row]) -> List[bool]:
+        """
+        Store ``rows``, skipping addresses that are already stored
+
+        Returns:
+            List[bool]: For each row, True if it was newly added and False if
+            it was already stored (or repeated earlier in ``rows``)
+        """
+        raise NotImplementedError
+
+    def email_exists(self, key: str) -> bool:
+        """Return whether the normalized address ``key`` is stored."""
+        raise NotImplementedError
+
+    def get_all_emails(self) -> List[dict]:
+        """Return every subscriber, newest signup first."""
+        raise NotImplementedError
+
+    def get_emails_page(self, after_id: Optional[int], limit: int) -> List[dict]:
+        """Return up to ``limit`` subscribers with an id below ``after_id``, highest first."""
+        raise NotImplementedError
+
+    def count_emails(self) -> int:
+        """Return the number of stored subscribers."""
+        raise NotImplementedError
+
+
+class SQLiteRepository(SubscriberRepository):
+    """All subscribers in a single SQLite file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.paths = [path]
+
+    def add_emails(self, rows: Sequence[Row]) -> List[bool]:
+        keys = [row[1] for row in rows]
+        with transaction(self.path, immediate=True) as conn:
+            # The write lock is held from here, so the existence check and the
+            # insert see the same state even with several worker processes.
+            existing = {row[0] for row in conn.execute(EXISTING_EMAILS_SQL, (json.dumps(keys),))}
+
+            inserted = []
+            for key in keys:
+                inserted.append(key not in existing)
+                existing.add(key)
+
+            new_rows = [row for row, is_new in zip(rows, inserted) if is_new]
+            conn.executemany(INSERT_EMAIL_SQL, new_rows)
+            record_signups(conn, new_rows)
+        return inserted
+
+    def email_exists(self, key: str) -> bool:
+        return get_connection(self.path).execute(EMAIL_EXISTS_SQL, (key,)).fetchone() is not None
+
+    def get_all_emails(self) -> List[dict]:
+        return [dict(row) for row in get_connection(self.path).execute(SELECT_EMAILS_SQL)]
+
+    def get_emails_page(self, after_id: Optional[int], limit: int) -> List[dict]:
+        cursor = get_connection(self.path).execute(
+            SELECT_PAGE_SQL, (FIRST_PAGE if after_id is None else after_id, limit)
+        )
+        return [dict(row) for row in cursor]
+
+    def count_emails(self) -> int:
+        return get_connection(self.path).execute(COUNT_EMAILS_SQL).fetchone()[0]
+
+
+def shard_paths(path: str, shards: int) -> List[str]:
+    """Return the shard file names derived from ``path`` (``emails.0-of-4.db``, ...)."""
+    root, ext = os.path.splitext(path)
+    return [f"{root}.{shard}-of-{shards}{ext or '.db'}" for shard in range(shards)]
+
+
+def shard_of(key: str, shards: int) -> int:
+    """Return the shard holding the normalized address ``key``."""
+    # Not hash(): it is salted per process, so workers would disagree
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") % shards
+
+
+class ShardedRepository(SubscriberRepository):
+    """Subscribers spread over several SQLite files by address hash."""
+
+    def __init__(self, paths: Sequence[str]):
+        self.paths = list(paths)
+        self.shards = [SQLiteRepository(path) for path in self.paths]
+        self.write_concurrency = len(self.shards)
+
+    def _global(self, rows: List[dict], shard: int) -> List[dict]:
+        """Replace each row's local id with its global id, in place."""
+        for row in rows:
+            row["id"] = row["id"] * len(self.shards) + shard
+        return rows
+
+    def add_emails(self, rows: Sequence[Row]) -> List[bool]:
+        by_shard: Dict[int, List[int]] = {}
+        for index, row in enumerate(rows):
+            by_shard.setdefault(shard_of(row[1], len(self.shards)), []).append(index)
+
+        inserted = [False] * len(rows)
+        for shard, indexes in by_shard.items():
+            results = self.shards[shard].add_emails([rows[index] for index in indexes])
+            for index, is_new in zip(indexes, results):
+                inserted[index] = is_new
+        return inserted
+
+    def email_exists(self, key: str) -> bool:
+        return self.shards[shard_of(key, len(self.shards))].email_exists(key)
+
+    def get_all_emails(self) -> List[dict]:
+        # Each shard is already sorted newest first, so a k-way merge suffices
+        listings = [self._global(shard.get_all_emails(), index)
+                    for index, shard in enumerate(self.shards)]
+        return list(heapq.merge(*listings, key=lambda row: row["created_at"] or "", reverse=True))
+
+    def get_emails_page(self, after_id: Optional[int], limit: int) -> List[dict]:
+        count = len(self.shards)
+        pages = []
+        for index, shard in enumerate(self.shards):
+            # Smallest local id whose global id is not below after_id
+            local_after = None if after_id is None else max(0, -(-(after_id - index) // count))
+            pages.append(self._global(shard.get_emails_page(local_after, limit), index))
+        merged = heapq.merge(*pages, key=lambda row: row["id"], reverse=True)
+        return [row for _, row in zip(range(limit), merged)]
+
+    def count_emails(self) -> int:
+        return sum(shard.count_emails() for shard in self.shards)
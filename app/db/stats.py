@@ -0,0 +1,118 @@
+"""Subscriber analytics read from incrementally maintained summary tables.
+
+Schema version 3 adds one row per day, domain and source plus a running
+total. The repository updates them in the same transaction as every insert
+(:func:`app.db.repository.record_signups`, once per batch), and triggers on
+``emails`` handle deletes and re-normalized keys. Answering "how many
+signups today / by domain / by source" is then a handful of index lookups,
+however many subscribers there are.
+
+With the sharded backend each shard keeps its own summary tables and the
+answers are summed. Top domains and sources are exact per shard; across
+shards, the candidates are each shard's top entries, re-counted everywhere.
+
+Days are UTC, like ``emails.created_at``. :func:`rebuild_stats` recomputes
+the tables from scratch. It is a recovery tool (``check_db.py
+rebuild-stats``), needed only after rows were inserted behind the
+repository's back.
+"""
+
+import json
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Tuple
+
+from app.db.connection import get_connection, transaction
+from app.db.database import get_repository
+from app.db.migrations import V3_REBUILD_STATS
+from app.utils.metrics import timed
+
+# Periods summed for the "new" counters, in days
+NEW_PERIODS = {"today": 1, "7d": 7, "30d": 30}
+
+# Shown for subscribers stored without a source
+NO_SOURCE = "(none)"
+
+
+def rebuild_stats(db_path: str) -> int:
+    """
+    Recompute the summary tables of ``db_path`` from the ``emails`` table
+
+    Holds the write lock for one pass over the table.
+
+    Args:
+        db_path: Path of a subscriber database file
+
+    Returns:
+        int: The number of subscribers counted
+    """
+    with transaction(db_path, immediate=True) as conn:
+        for statement in V3_REBUILD_STATS:
+            conn.execute(statement)
+        return conn.execute("SELECT subscribers FROM subscriber_totals").fetchone()[0]
+
+
+def _top(paths: List[str], table: str, column: str, top: int) -> List[Tuple[str, int]]:
+    """Return the ``top`` (key, signups) pairs of ``table`` summed over ``paths``."""
+    # Walks the signups index backwards and stops after ``top`` rows
+    leaders = [
+        get_connection(path).execute(
+            f"SELECT {column}, signups FROM {table} WHERE signups > 0 "
+            "ORDER BY signups DESC LIMIT ?", (top,)
+        ).fetchall()
+        for path in paths
+    ]
+    if len(paths) == 1:
+        return [tuple(row) for row in leaders[0]]
+
+    candidates = json.dumps(sorted({row[0] for rows in leaders for row in rows}))
+    totals: Counter = Counter()
+    for path in paths:
+        totals.update(dict(get_connection(path).execute(
+            f"SELECT {column}, signups FROM {table} "
+            f"WHERE {column} IN (SELECT value FROM json_each(?))", (candidates,)
+        ).fetchall()))
+    return totals.most_common(top)
+
+
+@timed("db.get_subscriber_stats")
+def get_subscriber_stats(days: int = 30, top: int = 10) -> Dict[str, object]:
+    """
+    Return signup totals, a daily series and the top domains and sources
+
+    Args:
+        days: Length of the daily series, ending today (UTC)
+        top: Number of domains and sources to return
+
+    Returns:
+        Dict[str, object]: ``total``, ``new`` (signups ``today``, in the
+        last ``7d`` and ``30d``), ``daily`` (``day``/``signups``, oldest
+        first, days without signups included), ``top_domains`` and
+        ``top_sources``
+    """
+    paths = get_repository().paths
+    today = datetime.now(timezone.utc).date()
+    window = max(days, max(NEW_PERIODS.values()))
+    since = (today - timedelta(days=window - 1)).isoformat()
+
+    total = 0
+    per_day: Counter = Counter()
+    for path in paths:
+        conn = get_connection(path)
+        row = conn.execute("SELECT subscribers FROM subscriber_totals").fetchone()
+        total += row[0] if row else 0
+        per_day.update(dict(conn.execute(
+            "SELECT day, signups FROM subscriber_daily WHERE day >= ?", (since,)
+        ).fetchall()))
+
+    series = [(today - timedelta(days=offset)).isoformat() for offset in range(window - 1, -1, -1)]
+    return {
+        "total": total,
+        "new": {name: sum(per_day[day] for day in series[-length:])
+                for name, length in NEW_PERIODS.items()},
+        "daily": [{"day": day, "signups": per_day[day]} for day in series[-days:]],
+        "top_domains": [{"domain": domain, "signups": signups}
+                        for domain, signups in _top(paths, "subscriber_domains", "domain", top)],
+        "top_sources": [{"source": source or NO_SOURCE, "signups": signups}
+                        for source, signups in _top(paths, "subscriber_sources", "source", top)],
+    }
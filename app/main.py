@@ -2,40 +2,116 @@
 
 from __future__ import annotations
 
+import asyncio
 import base64
 import json
-import logging
 import os
+import re
+import secrets
 import traceback
-from typing import Any, Dict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
 
 from dotenv import load_dotenv
-from fastapi import FastAPI, Request, Response
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, PlainTextResponse
 
-from app.agent import process_chat_message
-from app.db import add_email, get_all_emails, init_db
-from app.utils import validate_email
-from app.utils.logging_config import setup_fastapi_logger, get_logger
+# Settings (including LOG_LEVEL and LOG_FORMAT) are read at import time,
+# so .env must be loaded before the app modules
+load_dotenv()
 
+from fastapi import FastAPI, Request, Response  # noqa: E402
+from fastapi.middleware.cors import CORSMiddleware  # noqa: E402
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse  # noqa: E402
+
+from app.agent import (  # noqa: E402
+    ChatBusyError,
+    ChatTimeoutError,
+    acquire_chat_slot,
+    close_agent,
+    get_cache_stats,
+    init_agent,
+    process_chat_message_async,
+    release_chat_slot,
+    session_exists,
+    stream_chat_message,
+)
+from app.db import (  # noqa: E402
+    count_emails_async,
+    get_emails_page_async,
+    get_subscriber_stats_async,
+    init_db,
+    insert_email_async,
+    iter_email_pages,
+    shutdown_executors,
+    start_write_behind,
+    stop_write_behind,
+)
+from app.db.export import EXPORT_FORMATS  # noqa: E402
+from app.utils import start_dispatcher, stop_dispatcher, validate_email_async  # noqa: E402
+from app.utils.logging_config import setup_fastapi_logger, get_logger  # noqa: E402
+from app.utils.metrics import MetricsMiddleware, mark_worker_dead, render_metrics  # noqa: E402
+from app.utils.ratelimit import check_rate_limit, client_ip, retry_after_header  # noqa: E402
+from app.vibe import get_vibe_store, normalize_symbol  # noqa: E402
 
-# Configure detailed logging for FastAPI and the application
-setup_fastapi_logger(logging.DEBUG)
-logger = get_logger(__name__)
 
-# Load environment variables
-load_dotenv()
+# Configure logging for FastAPI and the application (LOG_LEVEL, LOG_FORMAT)
+setup_fastapi_logger()
+logger = get_logger(__name__)
 
 # Admin credentials
 ADMIN_USERNAME = os.environ.get("ADMIN_USERNAME", "admin")
 ADMIN_PASSWORD = os.environ.get("ADMIN_PASSWORD", "admin")
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """Build shared clients and writers on startup and release them on shutdown.
+
+    Runs once per worker process. Shutdown starts only after uvicorn has let
+    in-flight requests finish (see ``SHUTDOWN_TIMEOUT`` in app.server), so
+    queued writes and notifications are flushed last.
+    """
+
+    # Migrations and the membership index load block, so keep them off the loop
+    await asyncio.to_thread(init_db)
+    try:
+        init_agent()
+    except Exception as exc:
+        # Chat requests report the problem; subscriptions keep working
+        logger.error("Could not initialize the chat agent: %s", exc)
+    start_dispatcher()
+    await start_write_behind()
+    yield
+    await stop_write_behind()
+    shutdown_executors()
+    # Blocks for at most a few seconds while queued notifications go out
+    await asyncio.to_thread(stop_dispatcher)
+    await close_agent()
+    mark_worker_dead()
+
+
+# Admin subscriber listing page sizes
+DEFAULT_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 10000
+EXPORT_PAGE_SIZE = 5000
+
+# Admin stats: days in the daily series and domains/sources listed
+DEFAULT_STATS_DAYS = 30
+MAX_STATS_DAYS = 366
+DEFAULT_STATS_TOP = 10
+MAX_STATS_TOP = 100
+
+# Longest source/referrer value stored with a subscription
+MAX_ATTRIBUTION_LENGTH = 255
+
+# Chat session ids are minted here (secrets.token_urlsafe(16), 22 chars);
+# clients may only send back ids of that shape
+SESSION_ID_PATTERN = re.compile(r"[A-Za-z0-9_-]{22,128}")
+
 # Initialize FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
-# Initialize database
-init_db()
+# Per-route latency and in-flight counts, exposed at /metrics
+app.add_middleware(MetricsMiddleware, routes=app.router.routes)
 
 # Configure CORS for all routes
 app.add_middleware(
@@ -56,12 +132,40 @@ async def parse_json_body(request: Request) -> Dict[str, Any]:
         return {}
 
 
+async def get_session_id(body: Dict[str, Any]) -> Optional[str]:
+    """Return the client's chat session id, a new one, or None if it is not valid.
+
+    Ids are only ever minted by the server, so a client cannot pick (or
+    guess) another user's session. An id that is malformed, or that names no
+    live session (never issued, or expired), is rejected rather than adopted.
+    """
+
+    session_id = body.get("session_id")
+    if session_id is None or session_id == "":
+        return secrets.token_urlsafe(16)
+    if not isinstance(session_id, str) or not SESSION_ID_PATTERN.fullmatch(session_id):
+        return None
+    if not await session_exists(session_id):
+        return None
+    return session_id
+
+
+def _invalid_session_response() -> JSONResponse:
+    """Response returned for a session id the server did not issue or has expired."""
+
+    return JSONResponse(
+        status_code=400,
+        content={
+            "success": False,
+            "message": "Unknown or expired session_id. Omit it to start a new conversation.",
+        },
+    )
+
+
 def check_admin_auth(request: Request) -> bool:
     """Check if request has valid admin authentication."""
 
     auth_header = request.headers.get("Authorization") or ""
-    logger.info(f"Checking admin auth with header: {auth_header[:15]}...")
-
     if not auth_header.startswith("Basic "):
         logger.warning("Authorization header missing or not Basic auth")
         return False
@@ -73,16 +177,31 @@ def check_admin_auth(request: Request) -> bool:
 
         is_valid = username == ADMIN_USERNAME and password == ADMIN_PASSWORD
         if is_valid:
-            logger.info(f"Admin auth successful for user: {username}")
+            logger.debug("Admin auth successful for user: %s", username)
         else:
-            logger.warning(f"Admin auth failed for user: {username}")
+            logger.warning("Admin auth failed for user: %s", username)
 
         return is_valid
     except Exception as exc:  # pragma: no cover - best effort
-        logger.error(f"Auth error: {exc}")
+        logger.error("Auth error: %s", exc)
         return False
 
 
+async def rate_limit(request: Request, route: str, session_id: Optional[str] = None) -> Optional[JSONResponse]:
+    """Charge the request to its rate limit budgets; return a 429 if exhausted."""
+
+    ip = client_ip(request.client.host if request.client else None,
+                   request.headers.get("x-forwarded-for"))
+    wait = await check_rate_limit(route, ip, session_id)
+    if not wait:
+        return None
+    return JSONResponse(
+        status_code=429,
+        content={"success": False, "message": "Too many requests. Please slow down."},
+        headers={"Retry-After": retry_after_header(wait)},
+    )
+
+
 @app.options("/{full_path:path}")
 async def options_handler(full_path: str) -> Response:  # pragma: no cover - simple
     """Handle OPTIONS requests for any endpoint."""
@@ -103,43 +222,162 @@ async def chat(request: Request) -> JSONResponse:
             content={"success": False, "message": "Message is required"},
         )
 
-    response = process_chat_message(message)
+    session_id = await get_session_id(body)
+    if session_id is None:
+        # Still charged to the client address, so ids cannot be probed freely
+        return await rate_limit(request, "chat") or _invalid_session_response()
+    limited = await rate_limit(request, "chat", session_id)
+    if limited is not None:
+        return limited
+
+    try:
+        response = await process_chat_message_async(message, session_id)
+    except ChatBusyError:
+        return _busy_response()
+    except ChatTimeoutError:
+        logger.warning("Chat request timed out")
+        return JSONResponse(
+            status_code=504,
+            content={"success": False, "message": "The assistant took too long to answer. Please try again."},
+        )
+
     return JSONResponse(status_code=200, content=response)
 
 
+def _busy_response() -> JSONResponse:
+    """Response returned when every chat slot is taken."""
+
+    return JSONResponse(
+        status_code=503,
+        content={"success": False, "message": "The assistant is busy. Please try again shortly."},
+        headers={"Retry-After": "1"},
+    )
+
+
+@app.post("/api/chat/stream")
+async def chat_stream(request: Request) -> Response:
+    """Stream a chat reply as Server-Sent Events.
+
+    Emits ``token`` events with text deltas and ``tool`` events as the agent
+    calls tools, then one ``done`` event carrying the same ``message`` and
+    ``tools_used`` summary as ``/api/chat`` (or an ``error`` event).
+    """
+
+    body = await parse_json_body(request)
+    message = body.get("message", "")
+
+    if not message:
+        return JSONResponse(
+            status_code=400,
+            content={"success": False, "message": "Message is required"},
+        )
+
+    session_id = await get_session_id(body)
+    if session_id is None:
+        # Still charged to the client address, so ids cannot be probed freely
+        return await rate_limit(request, "chat") or _invalid_session_response()
+    limited = await rate_limit(request, "chat", session_id)
+    if limited is not None:
+        return limited
+
+    try:
+        await acquire_chat_slot()
+    except ChatBusyError:
+        return _busy_response()
+
+    async def events() -> AsyncIterator[str]:
+        try:
+            async for event in stream_chat_message(message, session_id):
+                data = json.dumps(event, default=str)
+                yield f"event: {event['type']}\ndata: {data}\n\n"
+        finally:
+            release_chat_slot()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.post("/api/subscribe")
 async def subscribe(request: Request) -> JSONResponse:
     """Subscribe an email to the Vibe Trading launch list."""
 
+    limited = await rate_limit(request, "subscribe")
+    if limited is not None:
+        return limited
+
     body = await parse_json_body(request)
     email = body.get("email", "")
 
-    is_valid, error_msg = validate_email(email)
+    is_valid, error_msg = await validate_email_async(email)
     if not is_valid:
         return JSONResponse(
             status_code=400,
             content={"success": False, "message": error_msg},
         )
 
-    if add_email(email):
+    source = str(body.get("source") or "web")[:MAX_ATTRIBUTION_LENGTH]
+    referrer = body.get("referrer") or request.headers.get("referer")
+    referrer = str(referrer)[:MAX_ATTRIBUTION_LENGTH] if referrer else None
+
+    try:
+        is_new = await insert_email_async(email, source, referrer)
+    except Exception as exc:
+        logger.error("Failed to add email %s: %s", email, exc)
         return JSONResponse(
-            status_code=200,
-            content={
-                "success": True,
-                "message": "Thank you for subscribing! We'll notify you when Vibe Trading launches.",
-            },
+            status_code=500,
+            content={"success": False, "message": "Failed to subscribe. Please try again later."},
         )
 
-    logger.error("Failed to add email: %s", email)
-    return JSONResponse(
-        status_code=500,
-        content={"success": False, "message": "Failed to subscribe. Please try again later."},
+    message = (
+        "Thank you for subscribing! We'll notify you when Vibe Trading launches."
+        if is_new
+        else "You're already subscribed! We'll notify you when Vibe Trading launches."
     )
+    return JSONResponse(status_code=200, content={"success": True, "message": message})
+
+
+@app.get("/api/vibe/{symbol}")
+async def vibe_index(symbol: str) -> JSONResponse:
+    """Get the current sentiment, post volume and momentum of a ticker or topic.
+
+    Read from the rolling vibe index that the ingestion pipeline fills
+    (``python -m app.pipeline ... --store``). Each window (1m, 5m, 1h, 1d) is
+    a constant-time lookup in memory-mapped ring buffers.
+    """
+
+    normalized = normalize_symbol(symbol)
+    if normalized is None:
+        return JSONResponse(
+            status_code=400,
+            content={"success": False, "message": "Invalid symbol"},
+        )
+
+    try:
+        vibe = get_vibe_store().get(normalized)
+    except Exception as exc:  # pragma: no cover - best effort
+        logger.error("Error in vibe_index: %s", exc, exc_info=True)
+        return JSONResponse(
+            status_code=500,
+            content={"success": False, "message": f"Error retrieving vibe: {exc}"},
+        )
+    if vibe is None:
+        return JSONResponse(
+            status_code=404,
+            content={"success": False, "message": f"No vibe data for {normalized}"},
+        )
+    return JSONResponse(status_code=200, content=vibe)
 
 
 @app.get("/api/admin/subscribers")
 async def get_subscribers(request: Request) -> JSONResponse:
-    """Get all subscribed email addresses (admin only)."""
+    """Get one page of subscribed email addresses, newest first (admin only).
+
+    Query parameters: ``limit`` (default 1000, at most 10000) and
+    ``after_id``, the ``next_after_id`` of the previous page.
+    """
 
     if not check_admin_auth(request):
         return JSONResponse(
@@ -149,8 +387,23 @@ async def get_subscribers(request: Request) -> JSONResponse:
         )
 
     try:
-        emails = get_all_emails()
-        response_data = {"total": len(emails), "subscribers": emails}
+        after_id = request.query_params.get("after_id")
+        after_id = int(after_id) if after_id else None
+        limit = int(request.query_params.get("limit") or DEFAULT_PAGE_SIZE)
+    except ValueError:
+        return JSONResponse(
+            status_code=400,
+            content={"success": False, "message": "after_id and limit must be integers"},
+        )
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    try:
+        emails = await get_emails_page_async(after_id, limit)
+        response_data = {
+            "total": await count_emails_async(),
+            "subscribers": emails,
+            "next_after_id": emails[-1]["id"] if len(emails) == limit else None,
+        }
         return JSONResponse(status_code=200, content=response_data)
     except Exception as exc:  # pragma: no cover - best effort
         error_details = traceback.format_exc()
@@ -166,9 +419,16 @@ async def get_subscribers(request: Request) -> JSONResponse:
         )
 
 
-@app.get("/api/admin/subscribers.txt")
-async def get_subscribers_plain(request: Request) -> PlainTextResponse:
-    """Get all subscribed email addresses as plain text (admin only)."""
+@app.get("/api/admin/subscribers.{export_format}")
+async def export_subscribers(export_format: str, request: Request) -> Response:
+    """Stream every subscribed email address as txt, csv or ndjson (admin only).
+
+    Rows are read and written one page at a time, so memory use stays flat
+    however many subscribers there are.
+    """
+
+    if export_format not in EXPORT_FORMATS:
+        return JSONResponse(status_code=404, content={"success": False, "message": "Not Found"})
 
     if not check_admin_auth(request):
         return PlainTextResponse(
@@ -177,18 +437,77 @@ async def get_subscribers_plain(request: Request) -> PlainTextResponse:
             headers={"WWW-Authenticate": 'Basic realm="Admin Area"'},
         )
 
+    media_type, header, format_page = EXPORT_FORMATS[export_format]
+
+    async def rows() -> AsyncIterator[str]:
+        if header:
+            yield header
+        try:
+            async for page in iter_email_pages(EXPORT_PAGE_SIZE):
+                yield format_page(page)
+        except Exception as exc:  # pragma: no cover - best effort
+            # The status line is already sent; the truncated body is all we can do
+            logger.error("Error streaming subscribers: %s", exc, exc_info=True)
+
+    return StreamingResponse(
+        rows(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'inline; filename="subscribers.{export_format}"'},
+    )
+
+
+@app.get("/api/admin/stats")
+async def subscriber_stats(request: Request) -> JSONResponse:
+    """Get signup totals, daily counts and top domains and sources (admin only).
+
+    Query parameters: ``days`` (length of the daily series, default 30, at
+    most 366) and ``top`` (domains and sources listed, default 10, at most
+    100). Served from summary tables kept current on every insert, so the
+    cost does not depend on the number of subscribers.
+    """
+
+    if not check_admin_auth(request):
+        return JSONResponse(
+            status_code=401,
+            content={"success": False, "message": "Unauthorized"},
+            headers={"WWW-Authenticate": 'Basic realm="Admin Area"'},
+        )
+
     try:
-        emails = get_all_emails()
-        email_list = "\n".join([email.get("email", "") for email in emails])
-        return PlainTextResponse(status_code=200, content=email_list)
+        days = int(request.query_params.get("days") or DEFAULT_STATS_DAYS)
+        top = int(request.query_params.get("top") or DEFAULT_STATS_TOP)
+    except ValueError:
+        return JSONResponse(
+            status_code=400,
+            content={"success": False, "message": "days and top must be integers"},
+        )
+    days = max(1, min(days, MAX_STATS_DAYS))
+    top = max(1, min(top, MAX_STATS_TOP))
+
+    try:
+        return JSONResponse(status_code=200, content=await get_subscriber_stats_async(days, top))
     except Exception as exc:  # pragma: no cover - best effort
-        logger.error("Error retrieving subscribers: %s", exc)
-        return PlainTextResponse(
+        logger.error("Error in subscriber_stats: %s", exc, exc_info=True)
+        return JSONResponse(
             status_code=500,
-            content=f"Error retrieving subscribers: {exc}",
+            content={"success": False, "message": f"Error retrieving stats: {exc}"},
         )
 
 
+@app.get("/api/admin/chat-cache")
+async def chat_cache_stats(request: Request) -> JSONResponse:
+    """Get chat response cache hit/miss counters for this worker (admin only)."""
+
+    if not check_admin_auth(request):
+        return JSONResponse(
+            status_code=401,
+            content={"success": False, "message": "Unauthorized"},
+            headers={"WWW-Authenticate": 'Basic realm="Admin Area"'},
+        )
+
+    return JSONResponse(status_code=200, content=get_cache_stats())
+
+
 @app.get("/health")
 async def health() -> JSONResponse:
     """Health check endpoint."""
@@ -203,6 +522,15 @@ async def api_health() -> JSONResponse:
     return JSONResponse(status_code=200, content={"status": "ok"})
 
 
+@app.get("/metrics")
+async def metrics() -> Response:
+    """Prometheus metrics for this worker, or all workers in multiprocess mode."""
+
+    # Aggregating the multiprocess directory reads one file per worker
+    body, content_type = await asyncio.to_thread(render_metrics)
+    return Response(content=body, media_type=content_type)
+
+
 @app.api_route("/{full_path:path}", methods=["GET", "POST"])
 async def not_found(full_path: str) -> JSONResponse:
     """Handle 404 for any undefined route."""
@@ -212,11 +540,7 @@ async def not_found(full_path: str) -> JSONResponse:
 
 
 if __name__ == "__main__":  # pragma: no cover - manual run
-    import uvicorn
-
-    host = os.environ.get("HOST", "0.0.0.0")
-    port = int(os.environ.get("PORT", "8000"))
+    from app.server import main
 
-    logger.info(f"Starting server on {host}:{port} with FastAPI")
-    uvicorn.run("app.main:app", host=host, port=port, log_level="info")
+    main()
 
@@ -0,0 +1,21 @@
+from app.pipeline.pipeline import Pipeline, load_checkpoint, save_checkpoint
+from app.pipeline.sinks import JsonlSink, MultiSink, ScoredBatch, Sink, VibeStoreSink
+from app.pipeline.sources import Post, parse_timestamp, read_posts
+from app.pipeline.stages import RecentHashes, normalize_posts, normalize_text
+
+__all__ = [
+    "JsonlSink",
+    "MultiSink",
+    "Pipeline",
+    "Post",
+    "RecentHashes",
+    "ScoredBatch",
+    "Sink",
+    "VibeStoreSink",
+    "load_checkpoint",
+    "normalize_posts",
+    "normalize_text",
+    "parse_timestamp",
+    "read_posts",
+    "save_checkpoint",
+]
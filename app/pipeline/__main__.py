@@ -0,0 +1,72 @@
+"""Score a dump of posts: ``python -m app.pipeline input.jsonl.gz scores.jsonl``.
+
+Pass ``--checkpoint`` to make the run resumable: run the same command again
+after an interruption and it continues from the last checkpoint. Pass
+``--store`` to add the scored posts to the vibe index served by
+``/api/vibe/{symbol}`` (with or without an output file).
+"""
+
+import argparse
+import asyncio
+import sys
+from typing import List
+
+from app.pipeline.pipeline import (
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_DEDUPE_CAPACITY,
+    DEFAULT_QUEUE_SIZE,
+    Pipeline,
+)
+from app.pipeline.sinks import JsonlSink, MultiSink, Sink, VibeStoreSink
+from app.pipeline.sources import FORMATS
+from app.utils.logging_config import setup_fastapi_logger
+from app.vibe import shutdown_pool
+from app.vibe.store import VibeStore
+
+
+def main() -> None:
+    """Run the ingestion pipeline from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("source", help="jsonl, csv or txt file, optionally .gz")
+    parser.add_argument("output", nargs="?",
+                        help="jsonl file for scored posts (appended; .gz to compress)")
+    parser.add_argument("--store", action="store_true",
+                        help="add scored posts to the vibe index at VIBE_STORE_PATH")
+    parser.add_argument("--format", choices=FORMATS)
+    parser.add_argument("--checkpoint", help="file to resume from and save progress to")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE)
+    parser.add_argument("--dedupe-capacity", type=int, default=DEFAULT_DEDUPE_CAPACITY)
+    parser.add_argument("--normalize-workers", type=int, default=1)
+    parser.add_argument("--score-workers", type=int, default=1)
+    parser.add_argument("--processes", type=int, help="scoring processes (default: VIBE_PROCESSES)")
+    args = parser.parse_args()
+    if not args.output and not args.store:
+        parser.error("give an output file, --store, or both")
+
+    setup_fastapi_logger()
+    sinks: List[Sink] = []
+    if args.output:
+        sinks.append(JsonlSink(args.output))
+    if args.store:
+        sinks.append(VibeStoreSink(VibeStore(writable=True)))
+    sink = sinks[0] if len(sinks) == 1 else MultiSink(sinks)
+    pipeline = Pipeline(
+        args.source, sink, fmt=args.format, checkpoint=args.checkpoint,
+        chunk_size=args.chunk_size, batch_size=args.batch_size, queue_size=args.queue_size,
+        dedupe_capacity=args.dedupe_capacity, normalize_workers=args.normalize_workers,
+        score_workers=args.score_workers, processes=args.processes,
+    )
+    try:
+        counts = asyncio.run(pipeline.run())
+    finally:
+        sink.close()
+        shutdown_pool()
+    print(f"{counts['scored']} posts scored, {counts['duplicate']} duplicates, "
+          f"{counts['empty']} empty (of {counts['read']} read)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+"""Asyncio ingestion pipeline: read -> dedupe -> normalize -> batch -> score -> sink.
+
+Each stage is a coroutine (or a pool of them) connected to the next by a
+bounded ``asyncio.Queue``. A full queue blocks the stage feeding it, so a
+slow scorer or sink slows the reader down instead of letting posts pile up
+in memory. At most ``queue_size`` items wait between two stages and each
+item is one chunk or batch, so memory use is constant whatever the size of
+the input.
+
+- **read**: a dedicated thread pulls ``chunk_size`` posts at a time from
+  :func:`app.pipeline.sources.read_posts`. A live feed can instead be any
+  async iterable of post lists.
+- **dedupe**: :class:`app.pipeline.stages.RecentHashes`, on the loop (a
+  hash and a set lookup per post).
+- **normalize**: ``normalize_workers`` tasks, each cleaning chunks on a
+  thread.
+- **batch**: puts chunks back in read order and joins whole chunks into
+  batches of at least ``batch_size`` posts. A partial batch is sent after
+  ``batch_interval`` seconds without new posts, so live feeds do not wait
+  for a full batch.
+- **score**: ``score_workers`` batches in flight through
+  :func:`app.vibe.score_texts_async`. With ``processes`` above 1 they run
+  on the vibe process pool, so keep ``score_workers`` at least that high.
+- **sink**: writes batches in order on a thread.
+
+Every ``checkpoint_interval`` seconds (and at the end), the sink is flushed
+and the read offset of the last written batch is saved to the checkpoint
+file. This happens atomically. A new run with the same checkpoint file
+resumes from that offset. Posts between the checkpoint and a crash are
+scored and written again. The dedupe window is not saved.
+"""
+
+import asyncio
+import heapq
+import itertools
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import AsyncIterable, Dict, Iterator, List, NamedTuple, Optional, Union
+
+from app.pipeline.sinks import ScoredBatch, Sink
+from app.pipeline.sources import Post, read_posts
+from app.pipeline.stages import RecentHashes, normalize_posts
+from app.utils.logging_config import get_logger
+from app.vibe import score_texts_async
+
+logger = get_logger(__name__)
+
+# Posts read per chunk; chunks are the unit passed between early stages
+DEFAULT_CHUNK_SIZE = 1000
+
+# Posts per scoring call (whole chunks are added until it is reached)
+DEFAULT_BATCH_SIZE = 5000
+
+# Chunks or batches waiting between two stages
+DEFAULT_QUEUE_SIZE = 4
+
+# Distinct texts remembered for dedupe (64-bit hashes, two generations)
+DEFAULT_DEDUPE_CAPACITY = 1_000_000
+
+# Seconds between checkpoints and progress log lines
+CHECKPOINT_INTERVAL = 5.0
+
+# Seconds a partial batch waits for more posts
+BATCH_INTERVAL = 1.0
+
+
+class Chunk(NamedTuple):
+    """Consecutive posts of the source, with the offset just past the last."""
+
+    sequence: int
+    posts: List[Post]
+    offset: int
+
+
+def load_checkpoint(path: str, source: str) -> int:
+    """
+    Return the offset saved in checkpoint file ``path``, or 0 if there is none
+
+    Args:
+        path: Checkpoint file
+        source: Input file the checkpoint must belong to
+
+    Returns:
+        int: Offset to resume ``source`` from
+
+    Raises:
+        ValueError: If the checkpoint belongs to another input
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        return 0
+    if state.get("source") != os.path.abspath(source):
+        raise ValueError(f"Checkpoint {path} belongs to {state.get('source')}, not {source}")
+    return int(state["offset"])
+
+
+def save_checkpoint(path: str, source: str, offset: int, counts: Dict[str, int]) -> None:
+    """Atomically replace checkpoint file ``path``."""
+    state = {
+        "source": os.path.abspath(source),
+        "offset": offset,
+        "counts": counts,
+        "saved_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+    temporary = f"{path}.tmp"
+    with open(temporary, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, path)
+
+
+def _take(posts: Iterator[Post], count: int) -> List[Post]:
+    return list(itertools.islice(posts, count))
+
+
+class _InOrder:
+    """Releases items tagged with consecutive sequence numbers in order."""
+
+    def __init__(self):
+        self._next = 0
+        self._waiting: List = []
+
+    def push(self, item) -> List:
+        heapq.heappush(self._waiting, (item.sequence, item))
+        ready = []
+        while self._waiting and self._waiting[0][0] == self._next:
+            ready.append(heapq.heappop(self._waiting)[1])
+            self._next += 1
+        return ready
+
+
+class Pipeline:
+    """Streams posts from a file or feed through dedupe, scoring and a sink."""
+
+    def __init__(self, source: Union[str, AsyncIterable[List[Post]]], sink: Sink,
+                 fmt: Optional[str] = None, checkpoint: Optional[str] = None,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE, batch_size: int = DEFAULT_BATCH_SIZE,
+                 queue_size: int = DEFAULT_QUEUE_SIZE,
+                 dedupe_capacity: int = DEFAULT_DEDUPE_CAPACITY,
+                 normalize_workers: int = 1, score_workers: int = 1,
+                 processes: Optional[int] = None,
+                 checkpoint_interval: float = CHECKPOINT_INTERVAL,
+                 batch_interval: float = BATCH_INTERVAL):
+        """
+        Configure a pipeline run
+
+        Args:
+            source: JSONL/CSV/text file (optionally ``.gz``), or an async
+                iterable of post lists for live feeds
+            sink: Receives the scored batches in order
+            fmt: File format (default: from the extension)
+            checkpoint: File to resume from and save progress to (files only)
+            chunk_size: Posts read at a time
+            batch_size: Minimum posts per scoring call
+            queue_size: Items waiting between two stages
+            dedupe_capacity: Recent distinct texts remembered for dedupe
+            normalize_workers: Chunks normalized concurrently
+            score_workers: Batches scored concurrently
+            processes: Scoring processes (default ``VIBE_PROCESSES``)
+            checkpoint_interval: Seconds between checkpoints
+            batch_interval: Seconds a partial batch waits for more posts
+        """
+        if checkpoint and not isinstance(source, str):
+            raise ValueError("Checkpoints need a file source")
+        self.source = source
+        self.sink = sink
+        self.fmt = fmt
+        self.checkpoint = checkpoint
+        self.chunk_size = chunk_size
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.dedupe = RecentHashes(dedupe_capacity)
+        self.normalize_workers = max(1, normalize_workers)
+        self.score_workers = max(1, score_workers)
+        self.processes = processes
+        self.checkpoint_interval = checkpoint_interval
+        self.batch_interval = batch_interval
+        self.counts = {"read": 0, "duplicate": 0, "empty": 0, "scored": 0, "batches": 0}
+        self.offset = 0
+
+    def _queue(self) -> asyncio.Queue:
+        return asyncio.Queue(maxsize=self.queue_size)
+
+    async def _read(self, out: asyncio.Queue) -> None:
+        if not isinstance(self.source, str):
+            sequence = 0
+            async for posts in self.source:
+                self.counts["read"] += len(posts)
+                await out.put(Chunk(sequence, posts, 0))
+                sequence += 1
+            return
+
+        # One thread, so the generator is only ever resumed (and closed) there
+        reader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pipeline-read")
+        posts = read_posts(self.source, self.fmt, self.offset)
+        loop = asyncio.get_running_loop()
+        try:
+            for sequence in itertools.count():
+                chunk = await loop.run_in_executor(reader, _take, posts, self.chunk_size)
+                if not chunk:
+                    return
+                self.counts["read"] += len(chunk)
+                await out.put(Chunk(sequence, chunk, chunk[-1].offset))
+        finally:
+            reader.submit(posts.close)
+            reader.shutdown(wait=False)
+
+    async def _dedupe(self, source: asyncio.Queue, out: asyncio.Queue) -> None:
+        while (chunk := await source.get()) is not None:
+            unique = self.dedupe.filter(chunk.posts)
+            self.counts["duplicate"] += len(chunk.posts) - len(unique)
+            await out.put(chunk._replace(posts=unique))
+
+    async def _normalize(self, chunk: Chunk) -> Chunk:
+        posts = await asyncio.to_thread(normalize_posts, chunk.posts) if chunk.posts else []
+        self.counts["empty"] += len(chunk.posts) - len(posts)
+        return chunk._replace(posts=posts)
+
+    async def _batch(self, source: asyncio.Queue, out: asyncio.Queue) -> None:
+        loop = asyncio.get_running_loop()
+        order = _InOrder()
+        pending: List[Post] = []
+        offset = self.offset
+        sequence = 0
+        deadline = None
+        done = False
+
+        while not done:
+            try:
+                # Not wait_for: on 3.11 it can swallow the pipeline's cancellation
+                async with asyncio.timeout_at(deadline):
+                    chunk = await source.get()
+            except TimeoutError:
+                chunk = None
+            else:
+                done = chunk is None
+                if chunk is not None:
+                    for ready in order.push(chunk):
+                        pending.extend(ready.posts)
+                        offset = ready.offset
+                    if deadline is None and pending:
+                        deadline = loop.time() + self.batch_interval
+                    if len(pending) < self.batch_size:
+                        continue
+            # Full, timed out or finished: send what is there, even if it is
+            # only an offset to checkpoint
+            if pending or done:
+                await out.put(Chunk(sequence, pending, offset))
+                sequence += 1
+                pending = []
+            deadline = None
+
+    async def _score(self, chunk: Chunk) -> ScoredBatch:
+        texts = [post.text for post in chunk.posts]
+        scores = await score_texts_async(texts, self.processes)
+        return ScoredBatch(chunk.sequence, chunk.posts, scores, chunk.offset)
+
+    async def _sink(self, source: asyncio.Queue) -> None:
+        loop = asyncio.get_running_loop()
+        order = _InOrder()
+        started = last_checkpoint = loop.time()
+
+        while (scored := await source.get()) is not None:
+            for batch in order.push(scored):
+                await asyncio.to_thread(self.sink.write, batch)
+                self.counts["scored"] += len(batch.posts)
+                self.counts["batches"] += 1
+                self.offset = batch.offset
+
+            if loop.time() - last_checkpoint >= self.checkpoint_interval:
+                last_checkpoint = loop.time()
+                await asyncio.to_thread(self._save)
+                elapsed = last_checkpoint - started
+                logger.info("Pipeline: %s (%.0f posts/s)",
+                            ", ".join(f"{name} {value}" for name, value in self.counts.items()),
+                            self.counts["read"] / elapsed if elapsed else 0.0)
+        await asyncio.to_thread(self._save)
+
+    def _save(self) -> None:
+        self.sink.flush()
+        if self.checkpoint:
+            save_checkpoint(self.checkpoint, self.source, self.offset, dict(self.counts))
+
+    async def _workers(self, count: int, work, source: asyncio.Queue, out: asyncio.Queue) -> None:
+        async def worker() -> None:
+            while (item := await source.get()) is not None:
+                await out.put(await work(item))
+            # Let the other workers of the stage see the end too
+            await source.put(None)
+
+        await asyncio.gather(*(worker() for _ in range(count)))
+
+    async def _stage(self, stage, out: Optional[asyncio.Queue]) -> None:
+        await stage
+        if out is not None:
+            await out.put(None)
+
+    async def run(self) -> Dict[str, int]:
+        """
+        Process the whole source (or the feed until it ends)
+
+        Returns:
+            Dict[str, int]: Posts ``read``, dropped as ``duplicate`` or
+            ``empty``, ``scored``, and ``batches`` written
+        """
+        if self.checkpoint:
+            self.offset = load_checkpoint(self.checkpoint, self.source)
+            if self.offset:
+                logger.info("Resuming %s from offset %d", self.source, self.offset)
+
+        read, unique, normalized, batches, scored = (self._queue() for _ in range(5))
+        tasks = [asyncio.create_task(coroutine) for coroutine in (
+            self._stage(self._read(read), read),
+            self._stage(self._dedupe(read, unique), unique),
+            self._stage(self._workers(self.normalize_workers, self._normalize, unique, normalized),
+                        normalized),
+            self._stage(self._batch(normalized, batches), batches),
+            self._stage(self._workers(self.score_workers, self._score, batches, scored), scored),
+            self._stage(self._sink(scored), None),
+        )]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        return dict(self.counts)
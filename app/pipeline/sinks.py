@@ -0,0 +1,123 @@
+"""Destinations for scored batches.
+
+A sink receives batches in source order, on a worker thread, one at a time.
+Before the pipeline saves a checkpoint it calls :meth:`Sink.flush`. After
+``flush`` returns, everything written so far must survive a crash, because
+the checkpoint means those posts will not be read again. Posts written
+after the last checkpoint are written again on resume (at-least-once
+delivery).
+"""
+
+import gzip
+import json
+import os
+import time
+from typing import IO, List, NamedTuple, Optional, Sequence
+
+from app.pipeline.sources import Post
+from app.vibe import VibeScores
+from app.vibe.store import VibeStore
+
+
+class ScoredBatch(NamedTuple):
+    """Posts and their scores, aligned."""
+
+    #: Position of the batch in the stream, from 0
+    sequence: int
+    posts: List[Post]
+    scores: VibeScores
+    #: Source offset just past the batch's last post
+    offset: int
+
+
+class Sink:
+    """Base class for pipeline outputs."""
+
+    def write(self, batch: ScoredBatch) -> None:
+        raise NotImplementedError
+
+    def flush(self) -> None:
+        """Make everything written so far durable."""
+
+    def close(self) -> None:
+        """Flush and release resources."""
+        self.flush()
+
+
+class JsonlSink(Sink):
+    """Appends one JSON object per scored post to a file (gzipped for ``.gz``)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        # Appending to a gzip file adds a member; readers see one stream
+        self._out: Optional[IO[bytes]] = (gzip.open(path, "ab") if path.endswith(".gz")
+                                          else open(path, "ab"))
+
+    def write(self, batch: ScoredBatch) -> None:
+        if not batch.posts:
+            return
+        scores, hits = batch.scores.scores.tolist(), batch.scores.hits.tolist()
+        lines = [
+            json.dumps({"text": post.text, "symbol": post.symbol, "timestamp": post.timestamp,
+                        "score": round(score, 4), "hits": hit}, ensure_ascii=False)
+            for post, score, hit in zip(batch.posts, scores, hits)
+        ]
+        self._out.write(("\n".join(lines) + "\n").encode("utf-8"))
+
+    def flush(self) -> None:
+        if self._out is not None:
+            self._out.flush()
+            os.fsync(self._out.fileno())
+
+    def close(self) -> None:
+        if self._out is not None:
+            self.flush()
+            self._out.close()
+            self._out = None
+
+
+class VibeStoreSink(Sink):
+    """Adds scored posts to the rolling vibe index.
+
+    Posts without a symbol are skipped. Posts without a timestamp count as
+    written now.
+    """
+
+    def __init__(self, store: VibeStore):
+        self.store = store
+
+    def write(self, batch: ScoredBatch) -> None:
+        now = time.time()
+        keep = [i for i, post in enumerate(batch.posts) if post.symbol]
+        if not keep:
+            return
+        self.store.add(
+            [batch.posts[i].symbol for i in keep],
+            [now if batch.posts[i].timestamp is None else batch.posts[i].timestamp for i in keep],
+            batch.scores.scores[keep],
+        )
+
+    def flush(self) -> None:
+        self.store.flush()
+
+    def close(self) -> None:
+        self.store.close()
+
+
+class MultiSink(Sink):
+    """Writes every batch to several sinks, in order."""
+
+    def __init__(self, sinks: Sequence[Sink]):
+        self.sinks = list(sinks)
+
+    def write(self, batch: ScoredBatch) -> None:
+        for sink in self.sinks:
+            sink.write(batch)
+
+    def flush(self) -> None:
+        for sink in self.sinks:
+            sink.flush()
+
+    def close(self) -> None:
+        for sink in self.sinks:
+            sink.close()
@@ -0,0 +1,172 @@
+"""Streaming readers for dumps of posts and headlines.
+
+``read_posts`` yields one :class:`Post` per record of a JSONL, CSV or
+plain-text file, optionally gzipped. Files are read line by line, so memory
+use does not depend on the file size. Every post carries the byte offset
+just past its record. A checkpoint stores that offset, and passing it back
+as ``start`` resumes right after the record. For ``.gz`` files the offset
+counts decompressed bytes. Resuming has to decompress up to it again, but
+it does not parse the skipped records.
+
+Records name their fields in any of the common ways (``text``, ``title``,
+``headline``, ...). A record without text still yields a post, with empty
+text, so that offsets advance over it. Later stages drop such posts.
+"""
+
+import csv
+import gzip
+import json
+import os
+from datetime import datetime, timezone
+from typing import IO, Any, Dict, Iterator, List, NamedTuple, Optional
+
+FORMATS = ("csv", "jsonl", "txt")
+
+# Record fields tried in order for each attribute
+TEXT_FIELDS = ("text", "title", "headline", "body", "content", "message")
+SYMBOL_FIELDS = ("symbol", "ticker", "topic")
+TIME_FIELDS = ("timestamp", "created_at", "time", "date", "published_at")
+
+# Epoch values above this are in milliseconds
+MAX_EPOCH_SECONDS = 10 ** 11
+
+
+class Post(NamedTuple):
+    """One record of a source."""
+
+    #: Byte offset just past the record, to resume from
+    offset: int
+    text: str
+    #: Ticker or topic named by the record, if any
+    symbol: Optional[str] = None
+    #: Unix time, if the record had a parseable one
+    timestamp: Optional[float] = None
+
+
+def detect_format(path: str, fmt: Optional[str] = None) -> str:
+    """Return ``fmt`` or the format implied by the file extension."""
+    if fmt:
+        return fmt
+    name = path[:-3] if path.endswith(".gz") else path
+    extension = os.path.splitext(name)[1].lower().lstrip(".")
+    if extension in ("ndjson", "json"):
+        return "jsonl"
+    return extension if extension in FORMATS else "txt"
+
+
+def open_binary(path: str) -> IO[bytes]:
+    """Open ``path`` for reading bytes, transparently decompressing ``.gz``."""
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def parse_timestamp(value: Any) -> Optional[float]:
+    """
+    Convert epoch seconds or milliseconds, or an ISO 8601 string, to Unix time
+
+    Args:
+        value: Field value from a record
+
+    Returns:
+        Optional[float]: Unix time, or None if ``value`` is not a time
+    """
+    if value is None or value == "" or isinstance(value, bool):
+        return None
+    if isinstance(value, str):
+        try:
+            value = float(value)
+        except ValueError:
+            try:
+                moment = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+            except ValueError:
+                return None
+            if moment.tzinfo is None:
+                moment = moment.replace(tzinfo=timezone.utc)
+            return moment.timestamp()
+    if not isinstance(value, (int, float)):
+        return None
+    return value / 1000.0 if value > MAX_EPOCH_SECONDS else float(value)
+
+
+def _field(record: Dict[str, Any], names) -> Any:
+    for name in names:
+        value = record.get(name)
+        if value not in (None, ""):
+            return value
+    return None
+
+
+def _post(offset: int, record: Dict[str, Any]) -> Post:
+    text = _field(record, TEXT_FIELDS)
+    symbol = _field(record, SYMBOL_FIELDS)
+    return Post(offset, str(text) if text is not None else "",
+                str(symbol) if symbol is not None else None,
+                parse_timestamp(_field(record, TIME_FIELDS)))
+
+
+def _lines(stream: IO[bytes], start: int, position: List[int]) -> Iterator[str]:
+    """Yield decoded lines from ``start``, keeping ``position[0]`` just past the last."""
+    stream.seek(start)
+    position[0] = start
+    for line in stream:
+        position[0] += len(line)
+        yield line.decode("utf-8", errors="replace")
+
+
+def read_jsonl(stream: IO[bytes], start: int = 0) -> Iterator[Post]:
+    """Yield posts from JSON objects (or bare strings), one per line."""
+    position = [start]
+    for line in _lines(stream, start, position):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield Post(position[0], "")
+            continue
+        if isinstance(record, dict):
+            yield _post(position[0], record)
+        else:
+            yield Post(position[0], record if isinstance(record, str) else "")
+
+
+def read_csv(stream: IO[bytes], start: int = 0) -> Iterator[Post]:
+    """Yield posts from CSV with a header row; resuming re-reads the header."""
+    position = [0]
+    header = next(csv.reader(_lines(stream, 0, position)), None)
+    if header is None:
+        return
+    names = [name.strip().lower() for name in header]
+    # Quoted fields may span lines; the reader pulls exactly the lines of
+    # one row, so the position is past the row when it is yielded
+    for cells in csv.reader(_lines(stream, max(start, position[0]), position)):
+        yield _post(position[0], dict(zip(names, cells)))
+
+
+def read_txt(stream: IO[bytes], start: int = 0) -> Iterator[Post]:
+    """Yield one post per non-empty line."""
+    position = [start]
+    for line in _lines(stream, start, position):
+        yield Post(position[0], line.strip())
+
+
+READERS = {"csv": read_csv, "jsonl": read_jsonl, "txt": read_txt}
+
+
+def read_posts(path: str, fmt: Optional[str] = None, start: int = 0) -> Iterator[Post]:
+    """
+    Stream the posts of a file
+
+    Args:
+        path: JSONL, CSV or text file, optionally ``.gz``
+        fmt: ``jsonl``, ``csv`` or ``txt`` (default: from the extension)
+        start: Offset to resume from (a :attr:`Post.offset`)
+
+    Returns:
+        Iterator[Post]: Posts in file order; the file is closed when the
+        iterator is exhausted or closed
+    """
+    reader = READERS[detect_format(path, fmt)]
+    with open_binary(path) as stream:
+        yield from reader(stream, start)
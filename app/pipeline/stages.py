@@ -0,0 +1,95 @@
+"""Per-post transformations of the ingestion pipeline.
+
+Both stages work on lists of posts (the pipeline moves posts in chunks):
+
+- :class:`RecentHashes` drops reposts. It keeps 64-bit hashes of recently
+  seen texts in two generations of at most ``capacity / 2`` each. When the
+  newer one fills, the older one is discarded. Memory stays bounded
+  however long the stream is. A repost is caught when its original is
+  among the last ``capacity / 2`` to ``capacity`` distinct texts, which is
+  what matters for feeds, where copies arrive close together.
+- :func:`normalize_posts` cleans texts for scoring. It unescapes HTML
+  entities, removes URLs, collapses whitespace and truncates very long
+  texts. It also takes a post's symbol from its first cashtag when the
+  record did not name one. Posts left without text are dropped.
+"""
+
+import html
+import re
+from typing import List, Set
+
+from app.pipeline.sources import Post
+from app.vibe.store import normalize_symbol
+
+# Texts are cut to this many characters before scoring
+MAX_TEXT_CHARS = 4000
+
+URL_PATTERN = re.compile(r"https?://\S+|www\.\S+")
+CASHTAG_PATTERN = re.compile(r"\$([A-Za-z][A-Za-z0-9.]{0,9})\b")
+
+
+def text_key(text: str) -> int:
+    """Return the dedupe hash of a text, ignoring case and spacing."""
+    # The built-in string hash is 64 bits and fast; it changes between
+    # processes, which is fine because the dedupe window is not saved
+    return hash(" ".join(text.casefold().split()))
+
+
+class RecentHashes:
+    """Bounded-memory set of recently seen text hashes."""
+
+    def __init__(self, capacity: int):
+        self.generation_size = max(1, capacity // 2)
+        self._current: Set[int] = set()
+        self._previous: Set[int] = set()
+
+    def add(self, key: int) -> bool:
+        """Record ``key``; return False if it was seen recently."""
+        if key in self._current or key in self._previous:
+            return False
+        if len(self._current) >= self.generation_size:
+            self._previous, self._current = self._current, set()
+        self._current.add(key)
+        return True
+
+    def filter(self, posts: List[Post]) -> List[Post]:
+        """Return the posts whose text was not seen recently, in order."""
+        return [post for post in posts if self.add(text_key(post.text))]
+
+    def __len__(self) -> int:
+        return len(self._current) + len(self._previous)
+
+
+def normalize_text(text: str) -> str:
+    """Return ``text`` unescaped, without URLs, single-spaced and truncated."""
+    if "&" in text:
+        text = html.unescape(text)
+    if "://" in text or "www." in text:
+        text = URL_PATTERN.sub(" ", text)
+    return " ".join(text[:MAX_TEXT_CHARS].split())
+
+
+def normalize_posts(posts: List[Post]) -> List[Post]:
+    """
+    Clean the texts of a chunk and fill in missing symbols from cashtags
+
+    Args:
+        posts: Posts as read
+
+    Returns:
+        List[Post]: Posts with non-empty, normalized text; symbols as
+        :func:`app.vibe.store.normalize_symbol` returns them
+    """
+    normalized = []
+    for post in posts:
+        text = normalize_text(post.text)
+        if not text:
+            continue
+        symbol = post.symbol
+        if symbol is None and "$" in text:
+            match = CASHTAG_PATTERN.search(text)
+            symbol = match.group(1) if match else None
+        if symbol is not None:
+            symbol = normalize_symbol(symbol)
+        normalized.append(Post(post.offset, text, symbol, post.timestamp))
+    return normalized
@@ -0,0 +1,100 @@
+"""Production entry point: ``python -m app.server``.
+
+Runs the FastAPI app under uvicorn with several worker processes. Settings:
+
+* ``HOST`` / ``PORT`` - bind address (default ``0.0.0.0:8000``)
+* ``WEB_CONCURRENCY`` - worker processes (default: one per CPU core)
+* ``SERVER_LOOP`` - ``uvloop`` or ``asyncio`` (default: uvloop if installed)
+* ``SERVER_HTTP`` - ``httptools`` or ``h11`` (default: httptools if installed)
+* ``SHUTDOWN_TIMEOUT`` - seconds in-flight requests get to finish on
+  SIGTERM (default: ``CHAT_TIMEOUT`` plus 5, so running chats complete)
+* ``ACCESS_LOG`` - log every request (default ``true``)
+
+On SIGTERM each worker stops accepting connections, lets in-flight requests
+(including streaming chats) finish within ``SHUTDOWN_TIMEOUT``, then runs the
+app's lifespan shutdown, which flushes queued writes and notifications.
+"""
+
+import importlib.util
+import os
+import tempfile
+
+import uvicorn
+from dotenv import load_dotenv
+
+# Settings are read at import time, and workers inherit this environment
+load_dotenv()
+
+from app.utils.logging_config import get_logger, setup_fastapi_logger  # noqa: E402
+
+logger = get_logger(__name__)
+
+
+def _pick(setting: str, preferred: str, fallback: str) -> str:
+    """Use ``setting`` if set, else ``preferred`` when importable, else ``fallback``."""
+    value = os.environ.get(setting)
+    if value:
+        return value
+    return preferred if importlib.util.find_spec(preferred) is not None else fallback
+
+
+def _prepare_metrics_dir(workers: int) -> None:
+    """Give multi-worker runs an empty shared directory for Prometheus samples."""
+    directory = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if not directory:
+        if workers == 1:
+            return
+        directory = tempfile.mkdtemp(prefix="vibe-metrics-")
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = directory
+
+    # Samples left by a previous run would be added to this one's. Only
+    # sample files are removed: a mistyped path must not wipe a directory
+    os.makedirs(directory, exist_ok=True)
+    entries = os.listdir(directory)
+    foreign = [name for name in entries
+               if not name.endswith(".db") or not os.path.isfile(os.path.join(directory, name))]
+    if foreign:
+        raise SystemExit(
+            f"PROMETHEUS_MULTIPROC_DIR={directory} contains files other than metric "
+            f"samples ({', '.join(sorted(foreign)[:5])}); point it at an empty directory"
+        )
+    for name in entries:
+        os.remove(os.path.join(directory, name))
+
+
+def main() -> None:
+    """Start uvicorn with the configured workers, event loop and HTTP parser."""
+    setup_fastapi_logger()
+
+    host = os.environ.get("HOST", "0.0.0.0")
+    port = int(os.environ.get("PORT", "8000"))
+    workers = int(os.environ.get("WEB_CONCURRENCY") or os.cpu_count() or 1)
+    loop = _pick("SERVER_LOOP", "uvloop", "asyncio")
+    http = _pick("SERVER_HTTP", "httptools", "h11")
+    chat_timeout = float(os.environ.get("CHAT_TIMEOUT", "60"))
+    shutdown_timeout = float(os.environ.get("SHUTDOWN_TIMEOUT", str(chat_timeout + 5)))
+    access_log = os.environ.get("ACCESS_LOG", "true").lower() in ("1", "true", "yes")
+
+    _prepare_metrics_dir(workers)
+
+    logger.info("Starting %d worker(s) on %s:%d (loop %s, http %s)", workers, host, port, loop, http)
+    uvicorn.run(
+        "app.main:app",
+        host=host,
+        port=port,
+        workers=workers,
+        loop=loop,
+        http=http,
+        timeout_graceful_shutdown=int(shutdown_timeout),
+        access_log=access_log,
+        # The app's own logging setup (queued, LOG_LEVEL/LOG_FORMAT) handles
+        # uvicorn's loggers too
+        log_config=None,
+        # Client addresses behind proxies are resolved by the rate limiter
+        # (RATE_LIMIT_PROXY_HOPS), not by rewriting the ASGI scope
+        proxy_headers=False,
+    )
+
+
+if __name__ == "__main__":
+    main()
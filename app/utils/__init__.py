@@ -1,5 +1,23 @@
-from app.utils.validators import validate_email
-from app.utils.telegram import send_telegram_message
+from app.utils.validators import (
+    normalize_email,
+    validate_email,
+    validate_email_async,
+    validate_emails,
+)
+from app.utils.telegram import (
+    notify,
+    notify_new_subscriber,
+    send_telegram_message,
+    start_dispatcher,
+    stop_dispatcher,
+)
 from app.utils.logging_config import setup_fastapi_logger, get_logger
 
-__all__ = ["validate_email", "setup_fastapi_logger", "get_logger"]
+__all__ = [
+    "validate_email",
+    "validate_email_async",
+    "validate_emails",
+    "normalize_email",
+    "setup_fastapi_logger",
+    "get_logger",
+]
@@ -0,0 +1,93 @@
+"""Local stand-in for the Telegram Bot API, for tests and benchmarks.
+
+Usage::
+
+    from app.utils import telegram
+    from app.utils.fake_telegram import FakeTelegramServer
+
+    with FakeTelegramServer(rate_limit_first=1) as fake:
+        telegram.API_URL = fake.url
+        telegram.BOT_TOKEN, telegram.CHAT_ID = "token", "chat"
+        ...
+        print(fake.messages)
+"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+from urllib.parse import parse_qs
+
+
+class FakeTelegramServer:
+    """Threaded HTTP server that records ``sendMessage`` calls.
+
+    Args:
+        rate_limit_first: Answer this many requests with 429 before accepting
+        retry_after: ``retry_after`` value sent with those 429 responses
+        delay: Seconds to sleep before answering, to simulate a slow API
+    """
+
+    def __init__(self, rate_limit_first: int = 0, retry_after: float = 0.01, delay: float = 0.0):
+        self.messages: List[dict] = []
+        self.requests = 0
+        self.rate_limit_first = rate_limit_first
+        self.retry_after = retry_after
+        self.delay = delay
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _make_handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self) -> None:  # noqa: N802 - http.server API
+                length = int(self.headers.get("Content-Length", 0))
+                fields = parse_qs(self.rfile.read(length).decode("utf-8"))
+                if fake.delay:
+                    threading.Event().wait(fake.delay)
+
+                with fake._lock:
+                    fake.requests += 1
+                    limited = fake.requests <= fake.rate_limit_first
+                    if not limited:
+                        fake.messages.append({key: values[0] for key, values in fields.items()})
+
+                if limited:
+                    status = 429
+                    body = {"ok": False, "error_code": 429,
+                            "parameters": {"retry_after": fake.retry_after}}
+                else:
+                    status, body = 200, {"ok": True, "result": {}}
+
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format: str, *args) -> None:
+                pass
+
+        return Handler
+
+    def start(self) -> "FakeTelegramServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeTelegramServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
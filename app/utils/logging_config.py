@@ -1,21 +1,116 @@
+"""Application logging setup.
+
+Handlers never run on the request path: log calls only put the record on a
+queue, and a background :class:`~logging.handlers.QueueListener` thread
+formats and writes it. Configure with:
+
+* ``LOG_LEVEL`` - ``DEBUG``, ``INFO`` (default), ``WARNING``, ...
+* ``LOG_FORMAT`` - ``text`` (default) or ``json``, one object per line
+* ``LOG_ASYNC`` - set to ``false`` to write synchronously (e.g. when debugging)
+"""
+
+import atexit
+import json
 import logging
+import os
+import queue
 import sys
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional, Union
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "text").lower()
+LOG_ASYNC = os.environ.get("LOG_ASYNC", "true").lower() in ("1", "true", "yes")
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Attributes every LogRecord has; anything else was passed with ``extra=``
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+_listener: Optional[QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as single-line JSON objects, including ``extra`` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """QueueHandler that leaves formatting to the listener thread.
 
+    The stock ``prepare`` formats the message on the calling thread; the
+    queue here never leaves the process, so the record can travel as is.
+    """
 
-def setup_fastapi_logger(level: int = logging.INFO) -> logging.Logger:
-    """Configure and return a logger for the application and FastAPI."""
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def _resolve_level(level: Union[int, str, None]) -> int:
+    if level is None:
+        level = LOG_LEVEL
+    if isinstance(level, str):
+        resolved = logging.getLevelName(level.upper())
+        return resolved if isinstance(resolved, int) else logging.INFO
+    return level
+
+
+def stop_logging() -> None:
+    """Flush queued records and stop the background listener."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def setup_fastapi_logger(level: Union[int, str, None] = None,
+                         fmt: Optional[str] = None) -> logging.Logger:
+    """
+    Configure and return the root logger for the application and FastAPI
+
+    Args:
+        level: Log level name or number (defaults to ``LOG_LEVEL``)
+        fmt: ``text`` or ``json`` (defaults to ``LOG_FORMAT``)
+
+    Returns:
+        logging.Logger: The configured root logger
+    """
+    global _listener
+
+    level = _resolve_level(level)
     logger = logging.getLogger()
     logger.setLevel(level)
 
     # Clear existing handlers to avoid duplicate logs when reloading
+    stop_logging()
     logger.handlers.clear()
 
     handler = logging.StreamHandler(sys.stdout)
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    )
-    handler.setFormatter(formatter)
-    logger.addHandler(handler)
+    if (fmt or LOG_FORMAT) == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+    if LOG_ASYNC:
+        records: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+        logger.addHandler(_DeferredQueueHandler(records))
+        _listener = QueueListener(records, handler, respect_handler_level=True)
+        _listener.start()
+    else:
+        logger.addHandler(handler)
 
     # Ensure FastAPI/Uvicorn uses the same configuration
     uvicorn_logger = logging.getLogger("uvicorn")
@@ -28,3 +123,6 @@ def setup_fastapi_logger(level: int = logging.INFO) -> logging.Logger:
 def get_logger(name: str) -> logging.Logger:
     """Return a module-level logger using the global configuration."""
     return logging.getLogger(name)
+
+
+atexit.register(stop_logging)
@@ -0,0 +1,152 @@
+"""Prometheus metrics for the API, the agent, the database and Telegram.
+
+Every uvicorn worker is its own process, so with several workers set
+``PROMETHEUS_MULTIPROC_DIR`` to an empty directory shared by all of them
+(wiped before the server starts). Each worker then writes its samples there
+and ``/metrics`` aggregates the whole directory, whichever worker answers.
+
+Metrics (all prefixed ``vibe_``):
+
+* ``http_request_duration_seconds{method,route,status}`` - request latency,
+  measured until the last body chunk is sent (so SSE streams count in full)
+* ``http_requests_in_progress{method,route}`` - in-flight requests
+* ``span_duration_seconds{span}`` - inner operations: ``agent.model_call``,
+  ``db.<function>``, ``telegram.send``
+* ``db_lock_wait_seconds`` - time spent waiting for the SQLite write lock
+* ``agent_tool_calls_total{tool}`` - tools the agent called
+* ``chat_cache_requests_total{result}`` - response cache ``hit``, ``miss`` and
+  ``bypass`` (hit ratio: ``hit / (hit + miss)``)
+* ``rate_limited_total{route}`` - requests refused by the rate limiter
+"""
+
+import functools
+import os
+import time
+from typing import Any, Callable, Iterable, Tuple, TypeVar
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from starlette.routing import BaseRoute, Match
+
+MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+
+# Chat requests take seconds, database calls microseconds
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+REQUEST_LATENCY = Histogram(
+    "vibe_http_request_duration_seconds", "HTTP request latency",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS,
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "vibe_http_requests_in_progress", "HTTP requests being served",
+    ["method", "route"], multiprocess_mode="livesum",
+)
+SPAN_LATENCY = Histogram(
+    "vibe_span_duration_seconds", "Latency of inner operations",
+    ["span"], buckets=LATENCY_BUCKETS,
+)
+DB_LOCK_WAIT = Histogram(
+    "vibe_db_lock_wait_seconds", "Time spent waiting for the SQLite write lock",
+    ["database"], buckets=LATENCY_BUCKETS,
+)
+TOOL_CALLS = Counter("vibe_agent_tool_calls_total", "Tool calls made by the agent", ["tool"])
+CACHE_REQUESTS = Counter(
+    "vibe_chat_cache_requests_total", "Chat response cache lookups", ["result"],
+)
+RATE_LIMITED = Counter("vibe_rate_limited_total", "Requests refused by the rate limiter", ["route"])
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+def span(name: str):
+    """Context manager recording the duration of the enclosed block as ``name``."""
+    return SPAN_LATENCY.labels(name).time()
+
+
+def timed(name: str) -> Callable[[F], F]:
+    """Decorator recording every call of the function as span ``name``."""
+    def decorator(func: F) -> F:
+        histogram = SPAN_LATENCY.labels(name)
+
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """Return the metrics exposition and its content type."""
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+def mark_worker_dead() -> None:
+    """Drop this worker's live gauges from the shared directory on shutdown."""
+    if MULTIPROC_DIR:
+        multiprocess.mark_process_dead(os.getpid())
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording per-route latency and in-flight requests.
+
+    Routes are labelled by their template (``/api/admin/subscribers.{export_format}``),
+    never by the raw path, so label cardinality stays bounded.
+
+    Args:
+        app: The wrapped ASGI application
+        routes: The application's routes, used to find the route template
+    """
+
+    def __init__(self, app: Callable, routes: Iterable[BaseRoute]):
+        self.app = app
+        self.routes = routes
+
+    def _route(self, scope: dict) -> str:
+        for route in self.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return getattr(route, "path", "unknown")
+        return "unmatched"
+
+    async def __call__(self, scope: dict, receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = self._route(scope)
+        status = 500
+
+        async def send_with_status(message: dict) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        in_progress = REQUESTS_IN_PROGRESS.labels(method, route)
+        in_progress.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            REQUEST_LATENCY.labels(method, route, str(status)).observe(time.perf_counter() - start)
+            in_progress.dec()
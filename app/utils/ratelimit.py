@@ -0,0 +1,285 @@
+"""Token-bucket rate limiting for the public endpoints.
+
+Each budget is a bucket of ``capacity`` tokens refilled evenly over
+``period`` seconds; a request takes one token and is refused with
+``Retry-After`` when the bucket is empty. Budgets are configured per route
+as ``"<capacity>/<period seconds>"``:
+
+* ``RATE_LIMIT_CHAT`` (default ``10/60``) - per chat session
+* ``RATE_LIMIT_CHAT_IP`` (default ``30/60``) - per client IP, all sessions
+* ``RATE_LIMIT_SUBSCRIBE`` (default ``5/60``) - per client IP
+
+A request is charged to all of its buckets or, if any of them is empty, to
+none. A chat session over its budget therefore does not drain the shared
+budget of its address.
+
+Backends, selected with ``RATE_LIMIT_BACKEND``:
+
+* ``memory`` (default) - buckets private to each uvicorn worker, so the
+  effective limit is multiplied by the number of workers
+* ``sqlite`` - buckets in ``RATE_LIMIT_PATH``, shared by every worker
+
+Behind reverse proxies set ``RATE_LIMIT_PROXY_HOPS`` to the number of proxies
+that append to ``X-Forwarded-For``, so clients are told apart by their own
+address rather than the proxy's.
+"""
+
+import asyncio
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from app.db.connection import transaction
+from app.db.database import DB_PATH
+from app.utils.logging_config import get_logger
+from app.utils.metrics import RATE_LIMITED
+
+logger = get_logger(__name__)
+
+RATE_LIMIT_ENABLED = os.environ.get("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+RATE_LIMIT_BACKEND = os.environ.get("RATE_LIMIT_BACKEND", "memory").lower()
+RATE_LIMIT_PATH = os.environ.get(
+    "RATE_LIMIT_PATH", os.path.join(os.path.dirname(DB_PATH), "rate_limits.db")
+)
+PROXY_HOPS = int(os.environ.get("RATE_LIMIT_PROXY_HOPS", "0"))
+
+# Buckets kept by the memory backend; the least recently used go first
+MAX_BUCKETS = 100000
+
+
+class Budget(NamedTuple):
+    """Bucket size and the seconds it takes to refill completely."""
+
+    capacity: float
+    period: float
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / self.period
+
+
+def parse_budget(spec: str) -> Budget:
+    """Parse ``"<capacity>/<period seconds>"``, e.g. ``"10/60"``."""
+    capacity, _, period = spec.partition("/")
+    budget = Budget(float(capacity), float(period or 1))
+    if budget.capacity <= 0 or budget.period <= 0:
+        raise ValueError(f"Invalid rate limit budget: {spec!r}")
+    return budget
+
+
+# Route -> key kind -> budget
+ROUTE_BUDGETS: Dict[str, Dict[str, Budget]] = {
+    "chat": {
+        "ip": parse_budget(os.environ.get("RATE_LIMIT_CHAT_IP", "30/60")),
+        "session": parse_budget(os.environ.get("RATE_LIMIT_CHAT", "10/60")),
+    },
+    "subscribe": {
+        "ip": parse_budget(os.environ.get("RATE_LIMIT_SUBSCRIBE", "5/60")),
+    },
+}
+
+
+def _refill(tokens: float, updated_at: float, budget: Budget, now: float) -> float:
+    return min(budget.capacity, tokens + (now - updated_at) * budget.rate)
+
+
+def _charge(levels: List[float], budgets: Sequence[Budget]) -> Tuple[List[float], float]:
+    """
+    Take one token from every bucket, or from none of them
+
+    Args:
+        levels: Refilled token counts, one per bucket
+        budgets: The buckets' budgets
+
+    Returns:
+        Tuple: The new token counts and 0, or the unchanged counts and the
+        seconds until every bucket has a token
+    """
+    wait = max((1 - tokens) / budget.rate if tokens < 1 else 0.0
+               for tokens, budget in zip(levels, budgets))
+    if wait:
+        return levels, wait
+    return [tokens - 1 for tokens in levels], 0.0
+
+
+class RateLimiter:
+    """Base class for bucket backends."""
+
+    def take_all(self, buckets: Sequence[Tuple[str, Budget]], now: Optional[float] = None) -> float:
+        """
+        Take one token from each bucket, only if every one of them has one
+
+        A request refused by one bucket (say, its session's) is not charged
+        to the others (its address's), so rejected requests do not use up
+        the budget of other clients behind the same address.
+
+        Args:
+            buckets: ``(key, budget)`` pairs, keys such as
+                ``"subscribe:ip:203.0.113.7"``
+            now: Current time in seconds (defaults to ``time.time()``)
+
+        Returns:
+            float: 0 if the request may proceed, otherwise the seconds until
+            every bucket has a token
+        """
+        raise NotImplementedError
+
+    def take(self, key: str, budget: Budget, now: Optional[float] = None) -> float:
+        """Take one token from the bucket ``key``; see :meth:`take_all`."""
+        return self.take_all([(key, budget)], now)
+
+    async def atake_all(self, buckets: Sequence[Tuple[str, Budget]]) -> float:
+        return self.take_all(buckets)
+
+
+class MemoryRateLimiter(RateLimiter):
+    """Per-process buckets in an LRU dict."""
+
+    def __init__(self, max_buckets: int = MAX_BUCKETS):
+        self.max_buckets = max_buckets
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take_all(self, buckets: Sequence[Tuple[str, Budget]], now: Optional[float] = None) -> float:
+        now = time.time() if now is None else now
+        budgets = [budget for _, budget in buckets]
+        with self._lock:
+            levels = []
+            for key, budget in buckets:
+                tokens, updated_at = self._buckets.get(key, (budget.capacity, now))
+                levels.append(_refill(tokens, updated_at, budget, now))
+            levels, wait = _charge(levels, budgets)
+            for (key, _), tokens in zip(buckets, levels):
+                self._buckets[key] = (tokens, now)
+                self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+class SQLiteRateLimiter(RateLimiter):
+    """Buckets in a SQLite file shared by every worker.
+
+    The file is separate from the subscriber database and checks run on
+    their own threads, so a flood of limiter writes never queues behind (or
+    locks out) real subscriptions.
+    """
+
+    SCHEMA_SQL = """
+    CREATE TABLE IF NOT EXISTS rate_limits (
+        key TEXT PRIMARY KEY,
+        tokens REAL NOT NULL,
+        updated_at REAL NOT NULL
+    ) WITHOUT ROWID
+    """
+    GET_SQL = "SELECT tokens, updated_at FROM rate_limits WHERE key = ?"
+    SET_SQL = "INSERT OR REPLACE INTO rate_limits (key, tokens, updated_at) VALUES (?, ?, ?)"
+    PURGE_SQL = "DELETE FROM rate_limits WHERE updated_at < ?"
+
+    # A bucket untouched for this long is full again, so its row can go
+    PURGE_AFTER = 3600
+    PURGE_EVERY = 1024
+
+    def __init__(self, path: str = RATE_LIMIT_PATH):
+        self.path = path
+        self._writes = 0
+        with transaction(self.path, database="rate_limits") as conn:
+            conn.execute(self.SCHEMA_SQL)
+
+    def take_all(self, buckets: Sequence[Tuple[str, Budget]], now: Optional[float] = None) -> float:
+        now = time.time() if now is None else now
+        budgets = [budget for _, budget in buckets]
+        with transaction(self.path, immediate=True, database="rate_limits") as conn:
+            levels = []
+            for key, budget in buckets:
+                row = conn.execute(self.GET_SQL, (key,)).fetchone()
+                levels.append(budget.capacity if row is None
+                              else _refill(row[0], row[1], budget, now))
+            levels, wait = _charge(levels, budgets)
+            conn.executemany(self.SET_SQL, [(key, tokens, now)
+                                            for (key, _), tokens in zip(buckets, levels)])
+
+            self._writes += 1
+            if self._writes % self.PURGE_EVERY == 0:
+                conn.execute(self.PURGE_SQL, (now - self.PURGE_AFTER,))
+        return wait
+
+    async def atake_all(self, buckets: Sequence[Tuple[str, Budget]]) -> float:
+        return await asyncio.to_thread(self.take_all, buckets)
+
+
+def create_rate_limiter(backend: str = RATE_LIMIT_BACKEND) -> RateLimiter:
+    """Build the limiter selected by ``RATE_LIMIT_BACKEND``."""
+    if backend == "sqlite":
+        try:
+            return SQLiteRateLimiter()
+        except (OSError, sqlite3.Error) as e:
+            logger.error("Cannot open SQLite rate limiter, using memory: %s", e)
+    elif backend != "memory":
+        logger.warning("Unknown RATE_LIMIT_BACKEND %r, using memory", backend)
+    return MemoryRateLimiter()
+
+
+_limiter: Optional[RateLimiter] = None
+
+
+def get_rate_limiter() -> RateLimiter:
+    """Return the process-wide limiter, creating it on first use."""
+    global _limiter
+    if _limiter is None:
+        _limiter = create_rate_limiter()
+    return _limiter
+
+
+def client_ip(peer: Optional[str], forwarded_for: Optional[str], hops: int = PROXY_HOPS) -> str:
+    """
+    Work out the client address behind ``hops`` trusted reverse proxies
+
+    Args:
+        peer: Address of the socket peer
+        forwarded_for: The ``X-Forwarded-For`` header, if any
+        hops: Number of trusted proxies that append to ``X-Forwarded-For``
+
+    Returns:
+        str: The client address (``"unknown"`` if there is none)
+    """
+    if hops > 0 and forwarded_for:
+        entries: List[str] = [part.strip() for part in forwarded_for.split(",") if part.strip()]
+        if entries:
+            return entries[-min(hops, len(entries))]
+    return peer or "unknown"
+
+
+async def check_rate_limit(route: str, ip: str, session_id: Optional[str] = None) -> float:
+    """
+    Charge one request to every bucket that applies to it, or to none if one is empty
+
+    Args:
+        route: Key of ``ROUTE_BUDGETS``
+        ip: Client address
+        session_id: Chat session, for routes with a per-session budget
+
+    Returns:
+        float: 0 if the request may proceed, otherwise seconds to wait
+    """
+    if not RATE_LIMIT_ENABLED:
+        return 0.0
+
+    budgets = ROUTE_BUDGETS[route]
+    buckets = [(f"{route}:ip:{ip}", budgets["ip"])]
+    if session_id and "session" in budgets:
+        buckets.append((f"{route}:session:{session_id}", budgets["session"]))
+    wait = await get_rate_limiter().atake_all(buckets)
+    if wait:
+        RATE_LIMITED.labels(route).inc()
+        logger.debug("Rate limited %s request from %s (retry in %.1fs)", route, ip, wait)
+    return wait
+
+
+def retry_after_header(wait: float) -> str:
+    """Format a wait in seconds as a ``Retry-After`` value (whole seconds, at least 1)."""
+    return str(max(1, math.ceil(wait)))
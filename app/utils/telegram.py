@@ -1,25 +1,251 @@
+"""Telegram notifications delivered by a background dispatcher.
+
+Callers only enqueue notifications; a single daemon thread delivers them over
+a pooled HTTP session, so a slow Telegram API never delays a request. The
+first notification after a quiet period goes out immediately; anything that
+arrives within ``TELEGRAM_DIGEST_WINDOW`` seconds of the previous message is
+coalesced into one digest ("12 new subscribers in the last minute").
+Deliveries are retried with exponential backoff and honour the
+``retry_after`` hint Telegram sends with 429 responses. Once shutdown has
+begun, each remaining message gets a single attempt with no backoff, so the
+flush fits in ``stop_dispatcher``'s join timeout; anything still unsent
+when it expires is counted in a warning.
+"""
+
+import atexit
 import os
 import logging
+import queue
+import threading
+import time
+from typing import List, Optional, Tuple
+
 import requests
+from requests.adapters import HTTPAdapter
+
+from app.utils.metrics import span
 
 logger = logging.getLogger(__name__)
 
 BOT_TOKEN = os.environ.get("TELEGRAM_BOT_TOKEN")
 CHAT_ID = os.environ.get("TELEGRAM_CHAT_ID")
 
+# Override to point at a local fake endpoint (see app.utils.fake_telegram)
+API_URL = os.environ.get("TELEGRAM_API_URL", "https://api.telegram.org")
+
+DIGEST_WINDOW = float(os.environ.get("TELEGRAM_DIGEST_WINDOW", "60"))
+QUEUE_SIZE = int(os.environ.get("TELEGRAM_QUEUE_SIZE", "1000"))
+MAX_RETRIES = int(os.environ.get("TELEGRAM_MAX_RETRIES", "5"))
+REQUEST_TIMEOUT = float(os.environ.get("TELEGRAM_TIMEOUT", "10"))
+
+# Cap on a single backoff sleep and on addresses listed in one digest
+MAX_BACKOFF = 30.0
+DIGEST_MAX_LISTED = 20
+
+SUBSCRIBER = "subscriber"
+TEXT = "text"
+
+Notification = Tuple[str, str]
+
+_queue: "queue.Queue[Optional[Notification]]" = queue.Queue(maxsize=QUEUE_SIZE)
+_thread: Optional[threading.Thread] = None
+_thread_lock = threading.Lock()
+_session: Optional[requests.Session] = None
+_stopping = threading.Event()
+_dropped = 0
+# Notifications taken off the queue by the dispatcher but not yet delivered
+_unsent = 0
+
+
+def _get_session() -> requests.Session:
+    """Return the pooled HTTP session used for every Telegram call."""
+    global _session
+    if _session is None:
+        session = requests.Session()
+        session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=2))
+        session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=2))
+        _session = session
+    return _session
+
+
+def _deliver(text: str) -> bool:
+    """
+    Send one message, retrying transient failures
+
+    Returns:
+        bool: True if Telegram accepted the message
+    """
+    url = f"{API_URL}/bot{BOT_TOKEN}/sendMessage"
+    data = {"chat_id": CHAT_ID, "text": text}
+    delay = 1.0
+
+    for attempt in range(1, MAX_RETRIES + 1):
+        try:
+            with span("telegram.send"):
+                response = _get_session().post(url, data=data, timeout=REQUEST_TIMEOUT)
+        except requests.RequestException as e:
+            logger.warning("Telegram request failed (attempt %d): %s", attempt, e)
+        else:
+            if response.ok:
+                logger.debug("Sent Telegram message successfully")
+                return True
+            if response.status_code == 429:
+                try:
+                    delay = float(response.json()["parameters"]["retry_after"])
+                except (ValueError, KeyError, TypeError):
+                    pass
+                logger.warning("Telegram rate limit hit, retrying in %.1fs", delay)
+            elif response.status_code < 500:
+                logger.error("Telegram rejected message: %s %s", response.status_code, response.text)
+                return False
+            else:
+                logger.warning("Telegram server error %s (attempt %d)", response.status_code, attempt)
+
+        # During shutdown there is no time to back off; give up instead
+        if attempt == MAX_RETRIES or _stopping.is_set():
+            break
+        if _stopping.wait(min(delay, MAX_BACKOFF)):
+            break
+        delay = min(delay * 2, MAX_BACKOFF)
+
+    logger.error("Giving up on Telegram message after %d attempts", attempt)
+    return False
+
+
+def format_digest(notifications: List[Notification], window: Optional[float] = None) -> List[str]:
+    """
+    Turn a burst of notifications into the messages to send
+
+    Subscriber notifications are merged into one digest; free-form texts are
+    sent as they are.
+    """
+    window = DIGEST_WINDOW if window is None else window
+    emails = [payload for kind, payload in notifications if kind == SUBSCRIBER]
+    messages = [payload for kind, payload in notifications if kind == TEXT]
+
+    if len(emails) == 1:
+        messages.append(f"New vibe subscriber: {emails[0]}")
+    elif emails:
+        period = "minute" if window == 60 else f"{window:g}s"
+        lines = [f"{len(emails)} new subscribers in the last {period}:"]
+        lines.extend(emails[:DIGEST_MAX_LISTED])
+        if len(emails) > DIGEST_MAX_LISTED:
+            lines.append(f"... and {len(emails) - DIGEST_MAX_LISTED} more")
+        messages.append("\n".join(lines))
+    return messages
+
+
+def _drain(batch: List[Notification]) -> bool:
+    """Move everything queued into ``batch``; return False on the stop sentinel."""
+    while True:
+        try:
+            item = _queue.get_nowait()
+        except queue.Empty:
+            return True
+        if item is None:
+            return False
+        batch.append(item)
+
+
+def _run_dispatcher() -> None:
+    """Deliver queued notifications until the stop sentinel arrives."""
+    global _unsent
+    last_sent = float("-inf")
+    running = True
+
+    while running:
+        item = _queue.get()
+        if item is None:
+            break
+        batch = [item]
+
+        # Coalesce everything that arrives before the window reopens
+        wait_until = last_sent + DIGEST_WINDOW
+        while running and time.monotonic() < wait_until:
+            try:
+                item = _queue.get(timeout=wait_until - time.monotonic())
+            except queue.Empty:
+                break
+            if item is None:
+                running = False
+            else:
+                batch.append(item)
+        running = _drain(batch) and running
+
+        _unsent = len(batch)
+        for text in format_digest(batch):
+            _deliver(text)
+        _unsent = 0
+        last_sent = time.monotonic()
+
+
+def start_dispatcher() -> None:
+    """Start the background dispatcher thread if it is not running."""
+    global _thread
+    with _thread_lock:
+        if _thread is None or not _thread.is_alive():
+            _stopping.clear()
+            _thread = threading.Thread(target=_run_dispatcher, name="telegram-dispatcher", daemon=True)
+            _thread.start()
+
+
+def stop_dispatcher(timeout: float = 15.0) -> None:
+    """
+    Flush queued notifications and stop the dispatcher thread
+
+    From here on each message gets one attempt without backoff, so a flush
+    of one digest fits in the default timeout even when Telegram is down
+    (a single attempt may take up to ``TELEGRAM_TIMEOUT`` seconds).
+
+    Args:
+        timeout: Seconds to wait for the flush before giving up on it
+    """
+    global _thread
+    with _thread_lock:
+        thread, _thread = _thread, None
+    if thread is None or not thread.is_alive():
+        return
+    _stopping.set()
+    _queue.put(None)
+    thread.join(timeout)
+    if thread.is_alive():
+        with _queue.mutex:
+            queued = sum(1 for item in _queue.queue if item is not None)
+        logger.warning("Telegram dispatcher did not finish within %.0fs; dropping %d undelivered "
+                       "notifications", timeout, _unsent + queued)
+
+
+def notify(text: str, kind: str = TEXT) -> None:
+    """Queue a notification for background delivery; never blocks."""
+    global _dropped
+
+    if not BOT_TOKEN or not CHAT_ID:
+        logger.debug("Telegram credentials not configured; skipping notification")
+        return
+
+    start_dispatcher()
+    try:
+        _queue.put_nowait((kind, text))
+    except queue.Full:
+        _dropped += 1
+        logger.warning("Telegram queue full, dropped notification (%d so far)", _dropped)
+
+
+def notify_new_subscriber(email: str) -> None:
+    """Queue a new-subscriber notification; bursts are sent as one digest."""
+    notify(email, kind=SUBSCRIBER)
+
 
 def send_telegram_message(text: str) -> None:
-    """Send a message to a Telegram chat using a bot."""
+    """Send a message to a Telegram chat using a bot, blocking until sent."""
     if not BOT_TOKEN or not CHAT_ID:
         logger.warning("Telegram credentials not configured; skipping notification")
         return
 
-    url = f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
-    data = {"chat_id": CHAT_ID, "text": text}
-
     try:
-        response = requests.post(url, data=data, timeout=10)
-        response.raise_for_status()
-        logger.debug("Sent Telegram message successfully")
+        _deliver(text)
     except Exception as e:
-        logger.error(f"Failed to send Telegram message: {e}")
+        logger.error("Failed to send Telegram message: %s", e)
+
+
+atexit.register(stop_dispatcher)
@@ -0,0 +1,29 @@
+from app.vibe.lexicon import INTENSIFIERS, LEXICON, NEGATORS, PHRASES
+from app.vibe.scorer import (
+    TokenMatrix,
+    VibeScorer,
+    VibeScores,
+    get_scorer,
+    score_texts,
+    score_texts_async,
+    shutdown_pool,
+)
+from app.vibe.store import VibeStore, get_vibe_index, get_vibe_store, normalize_symbol
+
+__all__ = [
+    "INTENSIFIERS",
+    "LEXICON",
+    "NEGATORS",
+    "PHRASES",
+    "TokenMatrix",
+    "VibeScorer",
+    "VibeScores",
+    "VibeStore",
+    "get_scorer",
+    "get_vibe_index",
+    "get_vibe_store",
+    "normalize_symbol",
+    "score_texts",
+    "score_texts_async",
+    "shutdown_pool",
+]
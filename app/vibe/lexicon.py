@@ -0,0 +1,77 @@
+"""Default market-sentiment lexicon for :class:`app.vibe.scorer.VibeScorer`.
+
+Weights use the usual -4..+4 valence scale: ``+2`` is clearly bullish,
+``-2`` clearly bearish. Entries are lowercase tokens as produced by the
+scorer's tokenizer (words, tickers without ``$``, and single emoji).
+"""
+
+from typing import Dict, Tuple
+
+LEXICON: Dict[str, float] = {
+    # Bullish
+    "bullish": 2.5, "bull": 1.5, "bulls": 1.5, "moon": 2.0, "mooning": 2.5, "rocket": 1.5,
+    "pump": 1.0, "pumping": 1.5, "rally": 2.0, "rallying": 2.0, "breakout": 2.0,
+    "surge": 2.0, "surging": 2.0, "soar": 2.2, "soaring": 2.2, "rip": 1.2, "ripping": 1.5,
+    "gain": 1.5, "gains": 1.5, "green": 1.0, "up": 0.5, "higher": 1.0, "high": 0.5,
+    "ath": 2.5, "record": 1.0, "strong": 1.5, "strength": 1.5, "buy": 1.0, "buying": 1.0,
+    "long": 0.8, "accumulate": 1.2, "accumulating": 1.2, "hodl": 1.2, "undervalued": 1.8,
+    "upgrade": 1.5, "beat": 1.5, "beats": 1.5, "profit": 1.8, "profits": 1.8,
+    "adoption": 1.5, "approval": 1.8, "approved": 1.8, "partnership": 1.2, "launch": 0.8,
+    "recovery": 1.5, "recovering": 1.5, "rebound": 1.5, "optimistic": 2.0, "confident": 1.8,
+    "good": 1.5, "great": 2.5, "amazing": 2.8, "love": 2.5, "win": 2.0, "winning": 2.2,
+    "lfg": 2.0, "wagmi": 1.8, "gm": 0.5, "based": 1.0,
+    "🚀": 2.0, "📈": 1.8, "🌙": 1.5, "💎": 1.0, "🔥": 1.2, "🐂": 1.5, "💰": 1.2, "✅": 0.8,
+
+    # Bearish
+    "bearish": -2.5, "bear": -1.5, "bears": -1.5, "dump": -1.5, "dumping": -2.0,
+    "crash": -3.0, "crashing": -3.0, "collapse": -3.0, "plunge": -2.5, "plunging": -2.5,
+    "tank": -2.0, "tanking": -2.2, "drop": -1.2, "dropping": -1.5, "fall": -1.0,
+    "falling": -1.2, "down": -0.5, "lower": -1.0, "low": -0.5, "red": -1.0, "loss": -1.8,
+    "losses": -1.8, "weak": -1.5, "weakness": -1.5, "sell": -1.0, "selling": -1.2,
+    "short": -0.8, "overvalued": -1.8, "bubble": -1.8, "downgrade": -1.5, "miss": -1.5,
+    "missed": -1.5, "liquidated": -2.5, "liquidation": -2.2, "rekt": -2.5, "rug": -3.0,
+    "scam": -3.0, "fraud": -3.2, "hack": -2.8, "hacked": -3.0, "exploit": -2.5,
+    "lawsuit": -2.0, "ban": -2.0, "banned": -2.2, "fud": -1.5, "fear": -2.0, "panic": -2.5,
+    "capitulation": -2.5, "selloff": -2.0, "bankrupt": -3.2, "bankruptcy": -3.2, "delisted": -2.5,
+    "bad": -2.0, "terrible": -2.8, "awful": -2.8, "hate": -2.5, "worried": -1.8,
+    "ngmi": -1.8, "dead": -2.0,
+    "📉": -1.8, "💀": -1.5, "🐻": -1.5, "🩸": -2.0, "😱": -1.8, "🚨": -1.0, "❌": -0.8,
+}
+
+# Two-token phrases whose meaning differs from their words: total weight of
+# the pair (the words' own weights are replaced, not added to)
+PHRASES: Dict[Tuple[str, str], float] = {
+    ("bull", "run"): 2.5,
+    ("bull", "market"): 2.2,
+    ("bear", "market"): -2.2,
+    ("short", "squeeze"): 2.0,
+    ("new", "high"): 2.2,
+    ("new", "highs"): 2.2,
+    ("new", "low"): -2.2,
+    ("new", "lows"): -2.2,
+    ("rug", "pull"): -3.2,
+    ("pump", "dump"): -2.5,
+    ("sell", "off"): -2.0,
+    ("buy", "dip"): 1.5,
+    ("dead", "cat"): -1.5,
+    ("higher", "lows"): 1.8,
+    ("lower", "highs"): -1.8,
+    ("to", "zero"): -2.5,
+    ("going", "up"): 1.2,
+    ("going", "down"): -1.2,
+}
+
+# Flip (and dampen) the sentiment of the next few tokens
+NEGATORS = (
+    "not", "no", "never", "nothing", "none", "neither", "nor", "without",
+    "dont", "don't", "doesnt", "doesn't", "isnt", "isn't", "arent", "aren't",
+    "wasnt", "wasn't", "wont", "won't", "cant", "can't", "cannot", "shouldnt", "shouldn't",
+)
+
+# Multiply the sentiment of the next token
+INTENSIFIERS: Dict[str, float] = {
+    "very": 1.3, "extremely": 1.5, "super": 1.3, "so": 1.2, "really": 1.25,
+    "absolutely": 1.4, "massive": 1.4, "massively": 1.4, "huge": 1.3, "insanely": 1.5,
+    "incredibly": 1.4, "totally": 1.3, "slightly": 0.6, "somewhat": 0.7, "barely": 0.5,
+    "kinda": 0.7,
+}
@@ -0,0 +1,396 @@
+"""Rolling per-symbol vibe index in memory-mapped ring buffers.
+
+Each symbol (ticker or topic) owns one row of ``SLOTS`` one-minute slots,
+two days' worth. A slot holds the post count and score sum of one minute,
+plus the minute it holds, so a slot left over from an older lap of the ring
+is recognised as stale. Beside the ring, each row keeps running totals of
+the last 1, 2, 5, 10, 60, 120, 1440 and 2880 minutes (``SPANS``):
+
+- Adding posts adds them to their slot and to every span they fall in.
+- Moving a row's clock (its head minute) forward subtracts the minutes
+  that leave each span and clears the slots that come round again.
+
+Reads never touch the ring: each window (1m, 5m, 1h, 1d) is one totals
+lookup, after expiring whatever has aged out since the last write. The
+span of twice the window gives the previous window, for momentum. So
+updates cost O(1) per post (amortised per minute of clock), and reads are
+O(1) however many posts a symbol has.
+
+Every array is a raw ``numpy.memmap`` file in ``VIBE_STORE_PATH``. The
+symbol list lives in ``index.json``. Opening the store maps the files, with
+no parsing or replay, so a restart takes milliseconds. One process (the
+ingestion pipeline) opens the store for writing, under a file lock. API
+workers open it read-only and see new posts through the shared page cache
+as soon as they are written. A read racing a write may see that batch half
+applied. If the writer stopped without :meth:`VibeStore.close`, the next
+writer recomputes the totals from the slots.
+"""
+
+import fcntl
+import json
+import os
+import re
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from app.db.database import DB_PATH
+from app.utils.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+VIBE_STORE_PATH = os.environ.get("VIBE_STORE_PATH") or os.path.join(
+    os.path.dirname(DB_PATH), "vibe"
+)
+
+# Query windows, in minutes
+WINDOWS = {"1m": 1, "5m": 5, "1h": 60, "1d": 1440}
+
+# Running totals kept per symbol: every window and twice every window
+SPANS = tuple(sorted(set(WINDOWS.values()) | {2 * length for length in WINDOWS.values()}))
+
+# Minute slots per symbol; the longest span fits exactly
+SLOTS = SPANS[-1]
+
+# Symbol rows allocated up front; the files double when they fill up
+INITIAL_CAPACITY = 256
+
+# Uppercase tickers and topics, as normalized by the ingestion pipeline
+SYMBOL_PATTERN = re.compile(r"^[A-Z0-9][A-Z0-9._-]{0,15}$")
+
+INDEX_FILE = "index.json"
+LOCK_FILE = "writer.lock"
+FORMAT_VERSION = 1
+
+# Per-row arrays: file name -> (dtype, shape of one row)
+_ARRAYS = {
+    "minutes": (np.int64, (SLOTS,)),
+    "counts": (np.int64, (SLOTS,)),
+    "sums": (np.float64, (SLOTS,)),
+    "heads": (np.int64, ()),
+    "totals": (np.float64, (len(SPANS), 2)),
+}
+
+# Bits of a (row, minute) grouping key used by the minute
+_MINUTE_BITS = 40
+
+
+def normalize_symbol(symbol: str) -> Optional[str]:
+    """Return ``symbol`` uppercased, without ``$`` and with dashes for spaces,
+    or None if it is not a valid symbol."""
+    symbol = "-".join(symbol.strip().lstrip("$").upper().split())
+    return symbol if SYMBOL_PATTERN.match(symbol) else None
+
+
+def _expire(minutes: np.ndarray, counts: np.ndarray, sums: np.ndarray,
+            totals: np.ndarray, head: int, target: int) -> None:
+    """Subtract from ``totals`` (in place) the minutes leaving each span
+    as the clock moves from ``head`` to ``target``."""
+    steps = target - head
+    for k, span in enumerate(SPANS):
+        if steps >= span:
+            totals[k] = 0.0
+            continue
+        gone = np.arange(head - span + 1, target - span + 1)
+        slots = gone % SLOTS
+        live = minutes[slots] == gone
+        totals[k, 0] -= counts[slots][live].sum()
+        totals[k, 1] -= sums[slots][live].sum()
+        if totals[k, 0] <= 0:
+            # Also drops rounding residue from the subtracted sums
+            totals[k] = 0.0
+
+
+class VibeStore:
+    """Per-symbol minute ring buffers with O(1) window aggregates."""
+
+    def __init__(self, path: str = VIBE_STORE_PATH, writable: bool = False):
+        """
+        Open (and for a writer, create) the store in directory ``path``
+
+        Args:
+            path: Store directory
+            writable: Open for writing; only one process may do so at a time
+
+        Raises:
+            RuntimeError: If another process has the store open for writing
+        """
+        self.path = path
+        self.writable = writable
+        self.capacity = 0
+        self.symbols: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._arrays: Dict[str, np.memmap] = {}
+        self._index_mtime = 0
+        self._symbols_added = False
+        self._lock = None
+
+        if writable:
+            os.makedirs(path, exist_ok=True)
+            self._lock = open(os.path.join(path, LOCK_FILE), "a+")
+            try:
+                fcntl.flock(self._lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                self._lock.close()
+                raise RuntimeError(f"Vibe store {path} is open for writing by another process")
+            clean = self._load_index()
+            if not self.capacity:
+                self._grow(INITIAL_CAPACITY)
+            elif not clean:
+                logger.warning("Vibe store %s was not closed cleanly; recomputing totals", path)
+                self._rebuild_totals()
+            self._save_index(clean=False)
+        else:
+            self._load_index()
+
+    # Files
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, f"{name}.bin")
+
+    def _map(self) -> None:
+        mode = "r+" if self.writable else "r"
+        self._arrays = {
+            name: np.memmap(self._file(name), dtype=dtype, mode=mode,
+                            shape=(self.capacity,) + shape)
+            for name, (dtype, shape) in _ARRAYS.items()
+        }
+
+    def _grow(self, capacity: int) -> None:
+        """Extend every file to ``capacity`` rows (new rows are zeros: empty)."""
+        self.flush()
+        for name, (dtype, shape) in _ARRAYS.items():
+            size = capacity * int(np.prod(shape, dtype=np.int64)) * np.dtype(dtype).itemsize
+            with open(self._file(name), "ab") as f:
+                f.truncate(size)
+        self.capacity = capacity
+        self._map()
+
+    def _load_index(self) -> bool:
+        """Read ``index.json`` and map the files; return its clean flag."""
+        index_path = os.path.join(self.path, INDEX_FILE)
+        try:
+            mtime = os.stat(index_path).st_mtime_ns
+            with open(index_path, encoding="utf-8") as f:
+                index = json.load(f)
+        except FileNotFoundError:
+            return True
+        if index.get("version") != FORMAT_VERSION or index.get("slots") != SLOTS:
+            raise ValueError(f"Vibe store {self.path} has an incompatible layout")
+        self._index_mtime = mtime
+        self.symbols = list(index["symbols"])
+        self._rows = {symbol: row for row, symbol in enumerate(self.symbols)}
+        if index["capacity"] != self.capacity:
+            self.capacity = index["capacity"]
+            self._map()
+        return bool(index.get("clean"))
+
+    def _save_index(self, clean: bool) -> None:
+        index = {"version": FORMAT_VERSION, "slots": SLOTS, "capacity": self.capacity,
+                 "symbols": self.symbols, "clean": clean}
+        index_path = os.path.join(self.path, INDEX_FILE)
+        temporary = f"{index_path}.tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        os.replace(temporary, index_path)
+
+    def _refresh(self) -> None:
+        """Pick up symbols added by the writer since the index was read."""
+        try:
+            mtime = os.stat(os.path.join(self.path, INDEX_FILE)).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime != self._index_mtime:
+            self._load_index()
+
+    def _rebuild_totals(self) -> None:
+        minutes, heads = self._arrays["minutes"], self._arrays["heads"][:, None]
+        counts, sums, totals = self._arrays["counts"], self._arrays["sums"], self._arrays["totals"]
+        for k, span in enumerate(SPANS):
+            live = (minutes > heads - span) & (minutes <= heads)
+            totals[:, k, 0] = np.where(live, counts, 0).sum(axis=1)
+            totals[:, k, 1] = np.where(live, sums, 0.0).sum(axis=1)
+
+    # Writes
+
+    def _row(self, symbol: str) -> int:
+        row = self._rows.get(symbol)
+        if row is None:
+            row = len(self.symbols)
+            if row >= self.capacity:
+                self._grow(self.capacity * 2)
+            self.symbols.append(symbol)
+            self._rows[symbol] = row
+            self._symbols_added = True
+        return row
+
+    def _advance(self, row: int, target: int) -> None:
+        """Move the clock of ``row`` forward to minute ``target``."""
+        head = int(self._arrays["heads"][row])
+        if target <= head:
+            return
+        minutes, counts, sums = (self._arrays[name][row] for name in ("minutes", "counts", "sums"))
+        _expire(minutes, counts, sums, self._arrays["totals"][row], head, target)
+        entering = np.arange(max(head + 1, target - SLOTS + 1), target + 1)
+        slots = entering % SLOTS
+        minutes[slots] = entering
+        counts[slots] = 0
+        sums[slots] = 0.0
+        self._arrays["heads"][row] = target
+
+    def add(self, symbols: Sequence[str], timestamps: Sequence[float],
+            scores: Sequence[float]) -> int:
+        """
+        Record scored posts
+
+        Args:
+            symbols: Normalized symbol of each post
+            timestamps: Unix time of each post
+            scores: Sentiment of each post, -1..+1
+
+        Returns:
+            int: Posts stored; posts older than the ring (two days before
+            the symbol's newest post) are dropped
+        """
+        if not self.writable:
+            raise RuntimeError("Vibe store is open read-only")
+        if not len(symbols):
+            return 0
+
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        valid = np.isfinite(timestamps) & (timestamps >= 0)
+        if not valid.all():
+            symbols = [symbol for symbol, ok in zip(symbols, valid.tolist()) if ok]
+            timestamps, scores = timestamps[valid], np.asarray(scores)[valid]
+            if not symbols:
+                return 0
+
+        self._symbols_added = False
+        rows = np.fromiter((self._row(symbol) for symbol in symbols), dtype=np.int64,
+                           count=len(symbols))
+        minutes = (timestamps // 60).astype(np.int64)
+        scores = np.asarray(scores, dtype=np.float64)
+
+        # One entry per (row, minute), sorted by row, then minute
+        keys, inverse = np.unique((rows << _MINUTE_BITS) | minutes, return_inverse=True)
+        group_counts = np.bincount(inverse, minlength=len(keys))
+        group_sums = np.bincount(inverse, weights=scores, minlength=len(keys))
+        group_rows = keys >> _MINUTE_BITS
+        group_minutes = keys & ((1 << _MINUTE_BITS) - 1)
+
+        # The last entry of each row has its newest minute
+        last = np.flatnonzero(np.append(group_rows[1:] != group_rows[:-1], True))
+        for row, minute in zip(group_rows[last].tolist(), group_minutes[last].tolist()):
+            self._advance(row, minute)
+
+        heads = self._arrays["heads"][group_rows]
+        kept = group_minutes > heads - SLOTS
+        group_rows, group_minutes = group_rows[kept], group_minutes[kept]
+        group_counts, group_sums, heads = group_counts[kept], group_sums[kept], heads[kept]
+
+        # (row, minute) pairs are unique, so plain fancy-index updates are safe
+        slots = group_minutes % SLOTS
+        self._arrays["counts"][group_rows, slots] += group_counts
+        self._arrays["sums"][group_rows, slots] += group_sums
+        totals = self._arrays["totals"]
+        for k, span in enumerate(SPANS):
+            inside = group_minutes > heads - span
+            np.add.at(totals[:, k, 0], group_rows[inside], group_counts[inside])
+            np.add.at(totals[:, k, 1], group_rows[inside], group_sums[inside])
+
+        if self._symbols_added:
+            self._save_index(clean=False)
+        return int(group_counts.sum())
+
+    def flush(self) -> None:
+        """Write the mapped pages to disk."""
+        if self.writable:
+            for array in self._arrays.values():
+                array.flush()
+
+    def close(self) -> None:
+        """Flush, mark the store cleanly closed and release the writer lock."""
+        if self._lock is None:
+            return
+        self.flush()
+        self._save_index(clean=True)
+        fcntl.flock(self._lock, fcntl.LOCK_UN)
+        self._lock.close()
+        self._lock = None
+
+    # Reads
+
+    def get(self, symbol: str, now: Optional[float] = None) -> Optional[Dict[str, object]]:
+        """
+        Return the current vibe of ``symbol`` over every window
+
+        Args:
+            symbol: Normalized symbol
+            now: Unix time the windows end at (default: the current time,
+                or the symbol's newest post if that is later)
+
+        Returns:
+            Optional[Dict[str, object]]: ``symbol``, ``as_of`` and per
+            window (``1m``, ``5m``, ``1h``, ``1d``) the ``posts`` count,
+            mean ``sentiment`` and ``momentum`` (mean minus the previous
+            window's mean; None without posts in both), or None for a
+            symbol the store has never seen
+        """
+        row = self._rows.get(symbol)
+        if row is None and not self.writable:
+            self._refresh()
+            row = self._rows.get(symbol)
+        if row is None:
+            return None
+
+        head = int(self._arrays["heads"][row])
+        target = max(head, int((time.time() if now is None else now) // 60))
+        totals = np.array(self._arrays["totals"][row])
+        if target > head:
+            _expire(self._arrays["minutes"][row], self._arrays["counts"][row],
+                    self._arrays["sums"][row], totals, head, target)
+
+        by_span = dict(zip(SPANS, totals.tolist()))
+        windows = {}
+        for name, length in WINDOWS.items():
+            posts, total = by_span[length]
+            earlier_posts = by_span[2 * length][0] - posts
+            earlier_total = by_span[2 * length][1] - total
+            mean = total / posts if posts > 0 else None
+            earlier = earlier_total / earlier_posts if earlier_posts > 0 else None
+            windows[name] = {
+                "posts": int(round(posts)),
+                "sentiment": None if mean is None else round(mean, 4),
+                "momentum": None if mean is None or earlier is None else round(mean - earlier, 4),
+            }
+        as_of = datetime.fromtimestamp((target + 1) * 60, timezone.utc)
+        return {"symbol": symbol, "as_of": as_of.isoformat(timespec="seconds"),
+                "windows": windows}
+
+
+_store: Optional[VibeStore] = None
+
+
+def get_vibe_store() -> VibeStore:
+    """Return this process's read-only view of the store at ``VIBE_STORE_PATH``."""
+    global _store
+    if _store is None:
+        _store = VibeStore(VIBE_STORE_PATH)
+    return _store
+
+
+def get_vibe_index(symbol: str) -> Optional[Dict[str, object]]:
+    """
+    Return the current vibe of a symbol from the shared store
+
+    Args:
+        symbol: Ticker or topic, with or without ``$``, any case
+
+    Returns:
+        Optional[Dict[str, object]]: See :meth:`VibeStore.get`; None for an
+        invalid or unknown symbol
+    """
+    normalized = normalize_symbol(symbol)
+    return get_vibe_store().get(normalized) if normalized else None
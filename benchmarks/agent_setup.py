@@ -0,0 +1,56 @@
+"""Per-request agent setup cost: rebuilding the agent vs. reusing it.
+
+Run from the project root::
+
+    python -m benchmarks.agent_setup [--iterations 2000]
+
+No request is sent to the model API; only the construction work that used to
+happen on every chat message is measured. Rebuilding the client also throws
+away its HTTP connection pool, so in production every rebuilt request pays an
+extra TCP/TLS handshake on top of the numbers printed here.
+"""
+
+import argparse
+import os
+import time
+
+# The client refuses to build without a key; nothing is sent anywhere
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from app.agent.vibe_agent import (  # noqa: E402
+    create_openai_client,
+    create_vibe_trading_agent,
+    get_vibe_trading_agent,
+)
+
+
+def _per_call_us(func, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def rebuild() -> None:
+    """What every chat message paid before the agent was shared."""
+    create_openai_client()
+    create_vibe_trading_agent()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    get_vibe_trading_agent()  # warm the shared instance
+
+    before = _per_call_us(rebuild, args.iterations)
+    after = _per_call_us(get_vibe_trading_agent, args.iterations)
+
+    print(f"rebuild per request: {before:10.1f} us")
+    print(f"shared agent:        {after:10.1f} us")
+    print(f"saved per request:   {before - after:10.1f} us")
+
+
+if __name__ == "__main__":
+    main()
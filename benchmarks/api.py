@@ -0,0 +1,210 @@
+"""Latency and throughput of the API endpoints, as comparable JSON.
+
+Run from the project root::
+
+    python -m benchmarks.api [--output results.json] [--baseline previous.json]
+                             [--only health,subscribe] [--export-rows 10000,100000,1000000]
+
+Everything runs in-process against ``app.main:app`` over ASGI, on a throwaway
+database. The chat agent answers through a stub model (``--model-latency``
+seconds per reply) and Telegram notifications go to a local fake server.
+The rate limiter is switched off so it does not dominate the numbers.
+
+Scenarios:
+
+* ``health`` - ``GET /health`` under concurrent load
+* ``subscribe_new`` / ``subscribe_duplicate`` - fresh and already stored addresses
+* ``chat`` / ``chat_cached`` - distinct messages (model call) and a repeated one
+* ``chat_stream`` - distinct messages over ``/api/chat/stream``, read to the
+  ``done`` event
+* ``export_<format>_<rows>`` - full admin exports at each ``--export-rows`` size
+* ``admin_stats_<rows>`` - ``/api/admin/stats`` at each of those sizes
+
+The client shares the event loop with the app, so absolute numbers are
+lower than against a real server; compare runs made on the same machine.
+Results are printed as JSON (p50/p95/p99 latency in ms and requests/sec per
+scenario); ``--baseline`` adds the change against an earlier run.
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+# Must come first: it points the app at a throwaway database
+from benchmarks.harness import Result, StubModel, drive, install_stub_agent, make_client
+
+from app.db import add_emails, count_emails
+from app.main import ADMIN_PASSWORD, ADMIN_USERNAME, app
+from app.utils import ratelimit, telegram
+from app.utils.fake_telegram import FakeTelegramServer
+
+SEED_CHUNK = 50000
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _seed(rows: int) -> None:
+    """Top the subscriber table up to ``rows`` rows."""
+    have = count_emails()
+    for start in range(have, rows, SEED_CHUNK):
+        end = min(start + SEED_CHUNK, rows)
+        add_emails([(f"seed{i}@example.com", "bench", None) for i in range(start, end)], notify=False)
+
+
+async def run_scenarios(args: argparse.Namespace) -> List[Result]:
+    results: List[Result] = []
+    selected = [name.strip() for name in args.only.split(",")] if args.only else None
+
+    def wanted(name: str) -> bool:
+        return selected is None or any(name.startswith(prefix) for prefix in selected)
+
+    def report(result: Result) -> None:
+        results.append(result)
+        print(f"{result.name:<28} {result.rps:>10.1f} req/s  p50 {result.p50_ms:>9.2f}  "
+              f"p95 {result.p95_ms:>9.2f}  p99 {result.p99_ms:>9.2f} ms  errors {result.errors}",
+              file=sys.stderr)
+
+    n, c = args.requests, args.concurrency
+    async with make_client(app) as client:
+        if wanted("health"):
+            report(await drive("health", client, lambda cl, i: cl.get("/health"), n, c))
+
+        if wanted("subscribe"):
+            async def subscribe(cl, i):
+                return await cl.post("/api/subscribe", json={"email": f"bench{i}@example.com"})
+
+            report(await drive("subscribe_new", client, subscribe, n, c))
+            report(await drive("subscribe_duplicate", client, subscribe, n, c))
+
+        if wanted("chat"):
+            chat_n = max(1, n // 4)
+            chat_c = args.chat_concurrency
+
+            async def chat(cl, i):
+                return await cl.post("/api/chat", json={"message": f"What is the vibe of coin {i}?"})
+
+            async def chat_cached(cl, i):
+                return await cl.post("/api/chat", json={"message": "What is the market vibe?"})
+
+            async def chat_stream(cl, i):
+                return await cl.post("/api/chat/stream", json={"message": f"Stream the vibe of coin {i}"})
+
+            def streamed(response):
+                # A stream always starts with 200; failures arrive as error events
+                return response.status_code == 200 and "event: done" in response.text
+
+            extra = {"model_latency_s": args.model_latency}
+            report(await drive("chat", client, chat, chat_n, chat_c, extra=extra))
+            report(await drive("chat_cached", client, chat_cached, chat_n, chat_c, extra=extra))
+            report(await drive("chat_stream", client, chat_stream, chat_n, chat_c, ok=streamed, extra=extra))
+
+        auth = (ADMIN_USERNAME, ADMIN_PASSWORD)
+        for rows in args.export_rows:
+            names = [f"export_{fmt}_{rows}" for fmt in args.export_formats]
+            if not any(wanted(name) for name in names + [f"admin_stats_{rows}"]):
+                continue
+            _seed(rows)
+
+            if wanted(f"admin_stats_{rows}"):
+                result = await drive(f"admin_stats_{rows}", client,
+                                     lambda cl, i: cl.get("/api/admin/stats", auth=auth),
+                                     max(1, n // 4), c)
+                result.extra = {"rows": count_emails()}
+                report(result)
+            for fmt, name in zip(args.export_formats, names):
+                if not wanted(name):
+                    continue
+                sizes: List[int] = []
+
+                async def export(cl, i, fmt=fmt, sizes=sizes):
+                    response = await cl.get(f"/api/admin/subscribers.{fmt}", auth=auth)
+                    sizes.append(len(response.content))
+                    return response
+
+                result = await drive(name, client, export, args.export_repeat, 1)
+                result.extra = {
+                    "rows": count_emails(),
+                    "bytes": sizes[-1] if sizes else 0,
+                    "rows_per_s": round(count_emails() / (result.mean_ms / 1000), 1),
+                }
+                report(result)
+
+    return results
+
+
+def compare(baseline: Dict[str, Any], results: List[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    """Percentage change of rps and p95 per scenario against ``baseline``."""
+    before = {result["name"]: result for result in baseline.get("results", [])}
+    changes = {}
+    for result in results:
+        old = before.get(result["name"])
+        if not old:
+            continue
+        changes[result["name"]] = {
+            "rps_change_pct": round((result["rps"] / old["rps"] - 1) * 100, 1) if old["rps"] else 0.0,
+            "p95_change_pct": round((result["p95_ms"] / old["p95_ms"] - 1) * 100, 1) if old["p95_ms"] else 0.0,
+        }
+    return changes
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--chat-concurrency", type=int, default=8)
+    parser.add_argument("--model-latency", type=float, default=0.05,
+                        help="seconds the stub model takes per reply")
+    parser.add_argument("--export-rows", type=lambda value: [int(v) for v in value.split(",")],
+                        default=[10000, 100000, 1000000])
+    parser.add_argument("--export-formats", type=lambda value: value.split(","),
+                        default=["csv", "ndjson"])
+    parser.add_argument("--export-repeat", type=int, default=3)
+    parser.add_argument("--only", help="comma-separated scenario name prefixes")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="earlier JSON report to compare against")
+    args = parser.parse_args()
+
+    ratelimit.RATE_LIMIT_ENABLED = False
+    with FakeTelegramServer() as fake:
+        telegram.API_URL, telegram.BOT_TOKEN, telegram.CHAT_ID = fake.url, "bench", "bench"
+        async with app.router.lifespan_context(app):
+            install_stub_agent(StubModel(latency=args.model_latency))
+            started = time.time()
+            results = await run_scenarios(args)
+
+    report: Dict[str, Any] = {
+        "meta": {
+            "started": started,
+            "revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": {key: value for key, value in vars(args).items()
+                     if key not in ("output", "baseline")},
+        },
+        "results": [result.as_dict() for result in results],
+    }
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            report["baseline_changes"] = compare(json.load(f), report["results"])
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
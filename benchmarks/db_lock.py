@@ -0,0 +1,89 @@
+"""Health checks stay fast while the database write lock is held elsewhere.
+
+Run from the project root::
+
+    python -m benchmarks.db_lock [--hold 2] [--requests 200] [--max-ms 50]
+
+Another connection takes ``BEGIN EXCLUSIVE`` on the app's throwaway
+database, as a long migration or a stuck writer would. ``/api/subscribe``
+is started against it and must still be waiting on the lock. Meanwhile
+``/health`` and ``/api/chat`` (answered by an instant stub model, with
+the default in-memory sessions and cache) are sent ``--requests`` times
+each. Neither touches the database, and their p99 latency must stay under
+``--max-ms``. Once the lock is released, the subscribe must succeed. The
+script exits non-zero if any of this fails. If the database call blocked
+the event loop, the health checks would wait out the lock instead.
+"""
+
+import argparse
+import asyncio
+import os
+import sqlite3
+import sys
+
+# Must come first: it points the app at a throwaway database
+from benchmarks.harness import StubModel, drive, install_stub_agent, make_client
+
+from app.main import app
+from app.utils import ratelimit
+
+
+async def check(hold: float, requests: int, max_ms: float) -> bool:
+    ok = True
+    async with make_client(app) as client:
+        blocker = sqlite3.connect(os.environ["DB_PATH"], isolation_level=None)
+        blocker.execute("BEGIN EXCLUSIVE")
+        try:
+            subscribe = asyncio.create_task(
+                client.post("/api/subscribe", json={"email": "locked@example.com"}))
+            await asyncio.sleep(min(0.2, hold / 2))
+            if subscribe.done():
+                print("subscribe finished while the database was locked", file=sys.stderr)
+                ok = False
+
+            routes = {
+                "/health": lambda cl, i: cl.get("/health"),
+                "/api/chat": lambda cl, i: cl.post("/api/chat", json={"message": f"Vibe of coin {i}?"}),
+            }
+            for path, request in routes.items():
+                result = await drive(path, client, request, requests, 10)
+                print(f"{path:<10} p50 {result.p50_ms:7.2f}  p99 {result.p99_ms:7.2f} ms  "
+                      f"errors {result.errors}  (subscribe pending: {not subscribe.done()})")
+                if result.errors or result.p99_ms > max_ms:
+                    print(f"{path} too slow or failing while the database was locked",
+                          file=sys.stderr)
+                    ok = False
+
+            if subscribe.done():
+                ok = False
+            else:
+                await asyncio.sleep(max(0.0, hold - 0.2))
+        finally:
+            blocker.execute("ROLLBACK")
+            blocker.close()
+
+        response = await subscribe
+        print(f"subscribe after release: {response.status_code}")
+        if response.status_code != 200:
+            ok = False
+    return ok
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--hold", type=float, default=2.0, help="seconds the lock is held")
+    parser.add_argument("--requests", type=int, default=200, help="requests per route")
+    parser.add_argument("--max-ms", type=float, default=50.0, help="p99 latency bound")
+    args = parser.parse_args()
+
+    ratelimit.RATE_LIMIT_ENABLED = False
+    async with app.router.lifespan_context(app):
+        install_stub_agent(StubModel(latency=0))
+        ok = await check(args.hold, args.requests, args.max_ms)
+    print("ok" if ok else "FAILED")
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,183 @@
+"""Shared pieces for the API benchmarks: stub model, ASGI client, load driver.
+
+Import this module before ``app.main``: it points the app at a throwaway
+database and disables OpenAI tracing, so nothing leaves the machine.
+"""
+
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+os.environ["DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="vibe-bench-"), "emails.db")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+import httpx  # noqa: E402
+from agents import Model, ModelResponse, Usage, set_tracing_disabled  # noqa: E402
+from openai.types.responses import (  # noqa: E402
+    Response,
+    ResponseCompletedEvent,
+    ResponseOutputMessage,
+    ResponseOutputText,
+    ResponseTextDeltaEvent,
+)
+
+set_tracing_disabled(True)
+
+
+class StubModel(Model):
+    """Model that answers after a fixed delay instead of calling OpenAI.
+
+    Args:
+        latency: Seconds each response takes, standing in for the API call
+        reply: Text of every answer
+    """
+
+    def __init__(self, latency: float = 0.05, reply: str = "The vibe is bullish today."):
+        self.latency = latency
+        self.reply = reply
+        self.calls = 0
+
+    def _message(self) -> ResponseOutputMessage:
+        self.calls += 1
+        return ResponseOutputMessage(
+            id=f"msg_{self.calls}",
+            type="message",
+            role="assistant",
+            status="completed",
+            content=[ResponseOutputText(type="output_text", text=self.reply, annotations=[])],
+        )
+
+    async def get_response(self, system_instructions, input, model_settings, tools,
+                           output_schema, handoffs, tracing, *, previous_response_id) -> ModelResponse:
+        await asyncio.sleep(self.latency)
+        return ModelResponse(output=[self._message()], usage=Usage(), response_id=None)
+
+    async def stream_response(self, system_instructions, input, model_settings, tools,
+                              output_schema, handoffs, tracing, *, previous_response_id) -> AsyncIterator[Any]:
+        """Send the reply word by word, spreading ``latency`` over the words."""
+        message = self._message()
+        words = self.reply.split(" ")
+        for index, word in enumerate(words):
+            await asyncio.sleep(self.latency / len(words))
+            yield ResponseTextDeltaEvent(
+                type="response.output_text.delta",
+                item_id=message.id,
+                output_index=0,
+                content_index=0,
+                delta=word if index == 0 else " " + word,
+            )
+        yield ResponseCompletedEvent(
+            type="response.completed",
+            response=Response(
+                id=f"resp_{self.calls}",
+                created_at=time.time(),
+                model="stub",
+                object="response",
+                output=[message],
+                parallel_tool_calls=False,
+                tool_choice="auto",
+                tools=[],
+            ),
+        )
+
+
+def install_stub_agent(model: StubModel) -> None:
+    """Swap the app's shared agent for one backed by ``model``."""
+    from app.agent import vibe_agent
+
+    vibe_agent._agent = vibe_agent.get_vibe_trading_agent().clone(model=model)
+
+
+@dataclass
+class Result:
+    """Latency and throughput of one scenario."""
+
+    name: str
+    requests: int
+    concurrency: int
+    errors: int
+    seconds: float
+    rps: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    mean_ms: float
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def percentile(ordered: List[float], q: float) -> float:
+    """Nearest-rank percentile of an ascending list (works for tiny samples)."""
+    if not ordered:
+        return 0.0
+    rank = max(1, min(len(ordered), round(q / 100 * len(ordered) + 0.5)))
+    return ordered[rank - 1]
+
+
+def make_client(app: Any, ip: str = "127.0.0.1") -> httpx.AsyncClient:
+    """Client that sends requests straight into ``app`` over ASGI."""
+    transport = httpx.ASGITransport(app=app, client=(ip, 40000))
+    return httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None)
+
+
+async def drive(name: str, client: httpx.AsyncClient,
+                request: Callable[[httpx.AsyncClient, int], Awaitable[httpx.Response]],
+                total: int, concurrency: int,
+                ok: Callable[[httpx.Response], bool] = lambda response: response.status_code == 200,
+                extra: Optional[Dict[str, Any]] = None) -> Result:
+    """
+    Send ``total`` requests from ``concurrency`` closed-loop workers
+
+    Args:
+        name: Scenario name for the report
+        client: Client to send with
+        request: Sends request number ``n`` and returns the response
+        total: Number of requests
+        concurrency: Requests in flight at once
+        ok: Whether a response counts as a success
+        extra: Additional fields for the report
+
+    Returns:
+        Result: Latency percentiles and throughput
+    """
+    latencies: List[float] = []
+    errors = 0
+    counter = iter(range(total))
+
+    async def worker() -> None:
+        nonlocal errors
+        for n in counter:
+            start = time.perf_counter()
+            try:
+                response = await request(client, n)
+                failed = not ok(response)
+            except Exception:
+                failed = True
+            latencies.append((time.perf_counter() - start) * 1000)
+            errors += failed
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    seconds = time.perf_counter() - started
+
+    latencies.sort()
+    return Result(
+        name=name,
+        requests=total,
+        concurrency=concurrency,
+        errors=errors,
+        seconds=round(seconds, 4),
+        rps=round(total / seconds, 1),
+        p50_ms=round(percentile(latencies, 50), 3),
+        p95_ms=round(percentile(latencies, 95), 3),
+        p99_ms=round(percentile(latencies, 99), 3),
+        mean_ms=round(statistics.fmean(latencies), 3),
+        extra=extra or {},
+    )
@@ -0,0 +1,114 @@
+"""Ingestion pipeline throughput, memory and resume.
+
+Run from the project root::
+
+    python -m benchmarks.pipeline [--posts 1000000] [--processes 1] [--score-workers 1]
+
+Writes a gzipped JSONL dump of synthetic posts (one in ten a repost) to a
+temporary directory and streams it through the pipeline into a sink that
+only counts. Peak RSS is printed after each run. Once the dedupe window
+(``--dedupe-capacity`` hashes) is full it should not grow with ``--posts``. A second pass stops the sink halfway, as a crash would, and
+resumes from the checkpoint; every post must end up written at least once.
+"""
+
+import argparse
+import asyncio
+import collections
+import gzip
+import json
+import os
+import random
+import resource
+import tempfile
+import time
+
+from app.pipeline import Pipeline, ScoredBatch, Sink
+from app.pipeline.pipeline import DEFAULT_DEDUPE_CAPACITY
+from app.vibe import shutdown_pool
+from benchmarks.vibe import make_texts
+
+
+class CountingSink(Sink):
+    """Counts posts; raises after ``fail_after`` batches if set."""
+
+    def __init__(self, fail_after: int = 0):
+        self.posts = 0
+        self.batches = 0
+        self.fail_after = fail_after
+
+    def write(self, batch: ScoredBatch) -> None:
+        if self.fail_after and self.batches >= self.fail_after:
+            raise RuntimeError("simulated crash")
+        self.posts += len(batch.posts)
+        self.batches += 1
+
+
+def write_dump(path: str, count: int, seed: int = 11) -> int:
+    """Write ``count`` posts; return how many distinct texts there are."""
+    rng = random.Random(seed)
+    pool = make_texts(20000, seed)
+    recent = collections.deque(maxlen=1000)
+    reposts = 0
+    with gzip.open(path, "wt", encoding="utf-8", compresslevel=1) as out:
+        for i in range(count):
+            # Unique texts carry a counter; reposts copy a recent one
+            if recent and rng.random() < 0.1:
+                text = rng.choice(recent)
+                reposts += 1
+            else:
+                text = f"{rng.choice(pool)} #{i}"
+                recent.append(text)
+            out.write(json.dumps({"text": text, "symbol": rng.choice(("BTC", "ETH", "SOL")),
+                                  "created_at": 1700000000 + i}) + "\n")
+    return count - reposts
+
+
+def _peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--posts", type=int, default=1000000)
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--score-workers", type=int, default=1)
+    parser.add_argument("--normalize-workers", type=int, default=1)
+    parser.add_argument("--dedupe-capacity", type=int, default=DEFAULT_DEDUPE_CAPACITY)
+    args = parser.parse_args()
+    options = dict(processes=args.processes, score_workers=args.score_workers,
+                   normalize_workers=args.normalize_workers, dedupe_capacity=args.dedupe_capacity)
+
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, "posts.jsonl.gz")
+        started = time.perf_counter()
+        distinct = write_dump(source, args.posts)
+        print(f"{args.posts} posts ({distinct} distinct), {os.path.getsize(source) / 2 ** 20:.0f} MiB "
+              f"gzipped, written in {time.perf_counter() - started:.1f}s; "
+              f"peak RSS {_peak_rss_mb():.0f} MiB")
+
+        sink = CountingSink()
+        started = time.perf_counter()
+        counts = asyncio.run(Pipeline(source, sink, **options).run())
+        elapsed = time.perf_counter() - started
+        print(f"full run: {counts['read'] / elapsed:,.0f} posts/s, {counts['scored']} scored, "
+              f"{counts['duplicate']} duplicates; peak RSS {_peak_rss_mb():.0f} MiB")
+        if counts["scored"] != distinct:
+            raise AssertionError(f"expected {distinct} scored posts, got {counts['scored']}")
+
+        checkpoint = os.path.join(directory, "checkpoint.json")
+        crashing = CountingSink(fail_after=max(1, sink.batches // 2))
+        try:
+            asyncio.run(Pipeline(source, crashing, checkpoint=checkpoint,
+                                 checkpoint_interval=0, **options).run())
+        except RuntimeError:
+            pass
+        resumed = CountingSink()
+        asyncio.run(Pipeline(source, resumed, checkpoint=checkpoint, **options).run())
+        print(f"crash after {crashing.posts} posts, resume wrote {resumed.posts} more")
+        if crashing.posts + resumed.posts < distinct:
+            raise AssertionError("posts were lost across the resume")
+    shutdown_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""Legitimate subscribe latency during a flood, with and without rate limiting.
+
+Run from the project root::
+
+    python -m benchmarks.ratelimit_flood [--duration 20] [--flood-rate 1500]
+                                         [--users 100] [--user-rate 4]
+
+The app is driven in-process over ASGI against a throwaway database. One
+client address floods ``/api/subscribe`` with fresh addresses at
+``--flood-rate`` requests per second. Meanwhile ``--users`` legitimate
+clients, each with a fixed address of its own, subscribe ``--user-rate``
+times a minute. That is below the default per-address budget of 5/60, as
+a person re-submitting a form would be. Both loads are open loop (fixed
+offered rate), so each mode faces the same flood. The legitimate
+requests' latency percentiles are printed for each mode.
+
+With rate limiting on, the script checks that the flooding address is
+throttled (it gets 429s) while no legitimate request is; it exits
+non-zero otherwise.
+"""
+
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+# Isolated database, no notifications, quiet logs; set before importing the app
+os.environ["DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="vibe-bench-"), "emails.db")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ["TELEGRAM_BOT_TOKEN"] = ""
+
+import httpx  # noqa: E402
+
+from app.main import app  # noqa: E402
+from app.utils import ratelimit  # noqa: E402
+
+_ids = itertools.count()
+
+
+async def _subscribe(ip: str, email: str) -> httpx.Response:
+    transport = httpx.ASGITransport(app=app, client=(ip, 40000))
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        return await client.post("/api/subscribe", json={"email": email})
+
+
+async def _open_loop(stop: asyncio.Event, rate: float, request) -> None:
+    """Start ``request(n)`` ``rate`` times per second until ``stop`` is set."""
+    tasks = []
+    started = time.perf_counter()
+    for n in itertools.count():
+        if stop.is_set():
+            break
+        tasks.append(asyncio.create_task(request(n)))
+        await asyncio.sleep(max(0.0, started + (n + 1) / rate - time.perf_counter()))
+    await asyncio.gather(*tasks)
+
+
+async def run(enabled: bool, duration: float, flood_rate: float, users: int,
+              user_rate: float) -> bool:
+    ratelimit.RATE_LIMIT_ENABLED = enabled
+    ratelimit._limiter = None
+    stop = asyncio.Event()
+    counts: dict = {}
+    legit_counts: dict = {}
+    latencies: list = []
+    interval = 60.0 / user_rate
+
+    async def flood(n: int) -> None:
+        response = await _subscribe("198.51.100.66", f"junk{next(_ids)}@flood.example.com")
+        counts[response.status_code] = counts.get(response.status_code, 0) + 1
+
+    async def user(ip: str) -> None:
+        # Users start at random points of their interval, then keep to it
+        next_at = time.perf_counter() + random.uniform(0, interval)
+        while True:
+            await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+            if stop.is_set():
+                return
+            start = time.perf_counter()
+            response = await _subscribe(ip, f"user{next(_ids)}@example.com")
+            latencies.append((time.perf_counter() - start) * 1000)
+            legit_counts[response.status_code] = legit_counts.get(response.status_code, 0) + 1
+            next_at += interval
+
+    tasks = [asyncio.create_task(_open_loop(stop, flood_rate, flood))]
+    tasks += [asyncio.create_task(user(f"10.0.{n // 256}.{n % 256}")) for n in range(users)]
+    await asyncio.sleep(duration)
+    stop.set()
+    await asyncio.gather(*tasks)
+
+    cuts = statistics.quantiles(latencies, n=100)
+    print(f"rate limiting {'on ' if enabled else 'off'}: "
+          f"legit p50 {cuts[49]:7.2f} ms  p95 {cuts[94]:7.2f} ms  p99 {cuts[98]:7.2f} ms "
+          f"statuses {dict(sorted(legit_counts.items()))} | "
+          f"flood statuses {dict(sorted(counts.items()))}")
+
+    ok = set(legit_counts) == {200}
+    if not ok:
+        print("legitimate users got errors", file=sys.stderr)
+    if enabled and not counts.get(429):
+        print("the flooding address was not throttled", file=sys.stderr)
+        ok = False
+    return ok
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--flood-rate", type=float, default=1500.0, help="flood requests per second")
+    parser.add_argument("--users", type=int, default=100, help="legitimate client addresses")
+    parser.add_argument("--user-rate", type=float, default=4.0,
+                        help="subscribes per minute from each legitimate address")
+    args = parser.parse_args()
+
+    ok = True
+    async with app.router.lifespan_context(app):
+        for enabled in (False, True):
+            ok &= await run(enabled, args.duration, args.flood_rate, args.users, args.user_rate)
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,86 @@
+"""Subscribe write throughput for the single-file and sharded backends.
+
+Run from the project root::
+
+    python -m benchmarks.shards [--writers 8] [--shards 1,2,4,8] [--duration 5]
+
+Each writer is a separate process (like a uvicorn worker) storing one
+address per transaction, which is what ``/api/subscribe`` does without
+write-behind. With one file, every commit queues on the same SQLite write
+lock; with N shards, up to N commits proceed at once. Scaling needs at least
+as many CPU cores as writers, so run it on the target hardware.
+"""
+
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+from app.db.database import create_repository
+from app.db.repository import SubscriberRepository
+
+
+def _repository(directory: str, shards: int) -> SubscriberRepository:
+    path = os.path.join(directory, "emails.db")
+    if shards == 1:
+        return create_repository(path, backend="sqlite")
+    return create_repository(path, backend="sharded", shards=shards)
+
+
+def _writer(directory: str, shards: int, writer: int, duration: float, start, counts) -> None:
+    repository = _repository(directory, shards)
+    # Every writer starts the clock together, after its process is up
+    start.wait()
+    deadline = time.perf_counter() + duration
+    written = 0
+    while time.perf_counter() < deadline:
+        key = f"w{writer}-{written}@example.com"
+        repository.add_emails([(key, key, "bench", None)])
+        written += 1
+    counts[writer] = written
+
+
+def run(shards: int, writers: int, duration: float) -> float:
+    """Return subscriber inserts per second with ``writers`` processes."""
+    with tempfile.TemporaryDirectory(prefix="vibe-shards-") as directory:
+        # Create and migrate the files once, before the writers race for them
+        _repository(directory, shards)
+
+        counts = multiprocessing.Array("q", writers)
+        start = multiprocessing.Barrier(writers)
+        processes = [
+            multiprocessing.Process(target=_writer,
+                                    args=(directory, shards, writer, duration, start, counts))
+            for writer in range(writers)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+
+        total = sum(counts)
+        if total != _repository(directory, shards).count_emails():
+            raise RuntimeError("row count does not match the inserts made")
+    return total / duration
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--writers", type=int, default=max(2, os.cpu_count() or 1))
+    parser.add_argument("--shards", type=lambda value: [int(v) for v in value.split(",")],
+                        default=[1, 2, 4, 8])
+    parser.add_argument("--duration", type=float, default=5.0)
+    args = parser.parse_args()
+
+    print(f"{args.writers} writer processes, {os.cpu_count()} CPU cores")
+    baseline = None
+    for shards in args.shards:
+        rate = run(shards, args.writers, args.duration)
+        baseline = baseline or rate
+        backend = "single file" if shards == 1 else f"{shards} shards"
+        print(f"{backend:<12} {rate:>10,.0f} inserts/s  ({rate / baseline:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
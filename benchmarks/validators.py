@@ -0,0 +1,88 @@
+"""Email validation cost: per-call pattern, email-validator, fast path, batch.
+
+Run from the project root::
+
+    python -m benchmarks.validators [--count 100000]
+
+The deliverability check is measured against a :class:`StaticResolver`, so
+the numbers show the cost of the cached path, not of DNS itself.
+"""
+
+import argparse
+import re
+import time
+
+import email_validator
+
+from app.utils.validators import (
+    StaticResolver,
+    set_resolver,
+    validate_email,
+    validate_emails,
+)
+
+# What validate_email did before the pattern was compiled once
+OLD_PATTERN = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
+
+
+def old_validate_email(email: str):
+    if not email:
+        return False, "Email cannot be empty"
+    if re.match(OLD_PATTERN, email):
+        return True, ""
+    return False, "Invalid email format"
+
+
+def library_validate_email(email: str):
+    """email-validator alone, without the precompiled fast path."""
+    try:
+        email_validator.validate_email(email, check_deliverability=False)
+        return True, ""
+    except email_validator.EmailNotValidError:
+        return False, "Invalid email format"
+
+
+def make_addresses(count: int):
+    """Mostly valid addresses spread over 50 domains, with some junk."""
+    addresses = []
+    for i in range(count):
+        if i % 10 == 0:
+            addresses.append(f"not-an-address-{i}")
+        else:
+            addresses.append(f"user.{i}@example{i % 50}.com")
+    return addresses
+
+
+def _per_call_us(func, addresses) -> float:
+    start = time.perf_counter()
+    for email in addresses:
+        func(email)
+    return (time.perf_counter() - start) / len(addresses) * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=100000)
+    args = parser.parse_args()
+
+    addresses = make_addresses(args.count)
+    set_resolver(StaticResolver(f"example{i}.com" for i in range(50)))
+
+    old = _per_call_us(old_validate_email, addresses)
+    library = _per_call_us(library_validate_email, addresses)
+    new = _per_call_us(validate_email, addresses)
+    mx = _per_call_us(lambda email: validate_email(email, check_mx=True), addresses)
+
+    start = time.perf_counter()
+    validate_emails(addresses)
+    batch = (time.perf_counter() - start) / len(addresses) * 1e6
+
+    print(f"re.match per call:   {old:8.2f} us")
+    print(f"email-validator:     {library:8.2f} us")
+    print(f"fast path + library: {new:8.2f} us")
+    print(f"  + MX:              {mx:8.2f} us (cached, stub resolver)")
+    print(f"validate_emails:     {batch:8.2f} us per address")
+
+
+if __name__ == "__main__":
+    main()
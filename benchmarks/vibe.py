@@ -0,0 +1,127 @@
+"""Vibe scoring throughput: per-string loop vs. vectorized batch vs. process pool.
+
+Run from the project root::
+
+    python -m benchmarks.vibe [--count 200000] [--processes 4]
+
+Texts are synthetic posts mixing lexicon words, negations, phrases, emoji
+and filler. The per-string scorer shares the tokenizer but applies the
+rules with plain Python loops; its scores are checked against the
+vectorized ones.
+"""
+
+import argparse
+import os
+import random
+import time
+
+import numpy as np
+
+from app.vibe import get_scorer, score_texts, shutdown_pool
+from app.vibe.scorer import ALPHA, NEGATION_FACTOR, NEGATION_WINDOW, PARALLEL_MIN_BATCH, SEPARATOR
+
+FILLER = ("the", "btc", "eth", "sol", "price", "today", "market", "is", "looking", "chart",
+          "anyone", "else", "think", "this", "week", "after", "news", "fed", "lol", "ok")
+
+
+def make_texts(count: int, seed: int = 7):
+    """Posts of 5-40 tokens, about a fifth of them sentiment-bearing."""
+    scorer = get_scorer()
+    rng = random.Random(seed)
+    lexicon = list(scorer.lexicon)
+    phrases = [" ".join(pair) for pair in scorer.phrases]
+    modifiers = list(scorer.negators[:6]) + list(scorer.intensifiers)[:6]
+    texts = []
+    for _ in range(count):
+        words = []
+        for _ in range(rng.randint(5, 40)):
+            roll = rng.random()
+            if roll < 0.15:
+                words.append(rng.choice(lexicon))
+            elif roll < 0.2:
+                words.append(rng.choice(modifiers))
+            elif roll < 0.22:
+                words.append(rng.choice(phrases))
+            else:
+                words.append(rng.choice(FILLER))
+        texts.append(" ".join(words).capitalize() + rng.choice(("", "!", "?", " 🚀", " 📉")))
+    return texts
+
+
+class NaiveScorer:
+    """The scorer's rules applied one text and one token at a time."""
+
+    def __init__(self):
+        self.scorer = get_scorer()
+        key = lambda word: self.scorer.tokenize(word)[0]
+        self.lexicon = {key(word): weight for word, weight in self.scorer.lexicon.items()}
+        self.negators = {key(word) for word in self.scorer.negators}
+        self.intensifiers = {key(word): factor for word, factor in self.scorer.intensifiers.items()}
+        self.phrases = {(key(first), key(second)): weight
+                        for (first, second), weight in self.scorer.phrases.items()}
+
+    def score(self, text: str) -> float:
+        tokens = self.scorer.tokenize(text.replace(SEPARATOR, " "))
+        weights = [self.lexicon.get(token, 0.0) for token in tokens]
+        for i, token in enumerate(tokens):
+            if token in self.negators:
+                for j in range(i + 1, min(i + 1 + NEGATION_WINDOW, len(tokens))):
+                    weights[j] *= NEGATION_FACTOR
+        for i, token in enumerate(tokens[:-1]):
+            if token in self.intensifiers:
+                weights[i + 1] *= self.intensifiers[token]
+        for i in range(len(tokens) - 1):
+            pair = (tokens[i], tokens[i + 1])
+            if pair in self.phrases:
+                weights[i] += (self.phrases[pair] - self.lexicon.get(pair[0], 0.0)
+                               - self.lexicon.get(pair[1], 0.0))
+        raw = sum(weights)
+        return raw / (raw * raw + ALPHA) ** 0.5
+
+
+def _rate(label: str, count: int, seconds: float, baseline: float = 0.0) -> float:
+    rate = count / seconds
+    speedup = f"  ({rate / baseline:.1f}x)" if baseline else ""
+    print(f"{label:<28} {rate:>12,.0f} texts/s{speedup}")
+    return rate
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=200000)
+    parser.add_argument("--batch", type=int, default=10000, help="texts per vectorized call")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    texts = make_texts(args.count)
+    scorer = get_scorer()
+    print(f"{args.count} texts, {sum(map(len, texts)) / len(texts):.0f} chars on average, "
+          f"{os.cpu_count()} CPU cores")
+
+    sample = texts[: min(len(texts), 20000)]
+    started = time.perf_counter()
+    naive = NaiveScorer()
+    expected = np.array([naive.score(text) for text in sample])
+    baseline = _rate("per-string loop", len(sample), time.perf_counter() - started)
+
+    started = time.perf_counter()
+    parts = [scorer.score_batch(texts[i:i + args.batch]).scores
+             for i in range(0, len(texts), args.batch)]
+    _rate(f"vectorized, batch {args.batch}", len(texts), time.perf_counter() - started, baseline)
+    scores = np.concatenate(parts)
+    if not np.allclose(scores[: len(sample)], expected, atol=1e-4):
+        raise AssertionError("vectorized scores differ from the per-string scorer")
+
+    if args.processes > 1:
+        # Start the pool outside the timed run (smaller batches stay in-process)
+        score_texts(texts[:PARALLEL_MIN_BATCH], processes=args.processes)
+        started = time.perf_counter()
+        pooled = score_texts(texts, processes=args.processes).scores
+        _rate(f"process pool x{args.processes}", len(texts), time.perf_counter() - started, baseline)
+        shutdown_pool()
+        if not np.allclose(pooled, scores):
+            raise AssertionError("pooled scores differ from in-process scores")
+
+
+if __name__ == "__main__":
+    main()
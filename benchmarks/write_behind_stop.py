@@ -0,0 +1,71 @@
+"""Stopping write-behind with a full queue writes every pending subscription.
+
+Run from the project root::
+
+    python -m benchmarks.write_behind_stop [--inserts 100] [--stop-points 40]
+
+With ``DB_WRITE_BEHIND`` on and a queue far smaller than the burst
+(``DB_QUEUE_SIZE``, 5 unless set), most inserts are blocked waiting for
+room when the writer is stopped. The stop is issued at many different
+points of the flush, against a throwaway database. Every insert must then finish within ``--timeout`` seconds, and
+every address must be stored. The script exits non-zero if any insert
+hangs or a row is missing, which is how a lost sentinel race shows up.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+
+# Isolated database with a tiny write-behind queue; set before importing the app
+os.environ["DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="vibe-bench-"), "emails.db")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ["DB_WRITE_BEHIND"] = "1"
+os.environ.setdefault("DB_QUEUE_SIZE", "5")
+
+from app.db import aio, count_emails, init_db  # noqa: E402
+
+
+async def check(inserts: int, stop_points: int, timeout: float) -> bool:
+    ok = True
+    for turns in range(stop_points):
+        await aio.start_write_behind()
+        before = count_emails()
+        tasks = [asyncio.create_task(aio.insert_email_async(f"stop{turns}-{i}@example.com"))
+                 for i in range(inserts)]
+        # Stop after a different number of event loop turns each round
+        for _ in range(turns):
+            await asyncio.sleep(0)
+        await aio.stop_write_behind()
+
+        done, pending = await asyncio.wait(tasks, timeout=timeout)
+        failed = sum(1 for task in done if task.exception() is not None)
+        written = count_emails() - before
+        if pending or failed or written != inserts:
+            print(f"stop after {turns} turns: {len(pending)} inserts hung, {failed} failed, "
+                  f"{written}/{inserts} rows written", file=sys.stderr)
+            ok = False
+        for task in pending:
+            task.cancel()
+    return ok
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--inserts", type=int, default=100, help="concurrent inserts per round")
+    parser.add_argument("--stop-points", type=int, default=40,
+                        help="rounds, each stopping one event loop turn later")
+    parser.add_argument("--timeout", type=float, default=5.0)
+    args = parser.parse_args()
+
+    init_db()
+    ok = await check(args.inserts, args.stop_points, args.timeout)
+    aio.shutdown_executors()
+    print("ok" if ok else "FAILED")
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
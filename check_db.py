@@ -1,22 +1,465 @@
-"""Utility script for inspecting the subscriber database."""
+"""Command-line tool for bulk work on the subscriber database.
 
-import sqlite3
-from app.db.database import DB_PATH
+Usage::
+
+    python check_db.py stats [--json]
+    python check_db.py import partners.csv [--source expo-2025] [--batch-size 10000]
+    python check_db.py export subscribers.csv.gz
+    python check_db.py dedupe [--dry-run]
+    python check_db.py rebuild-stats
+
+``import`` and ``export`` stream their files (``.csv``, ``.ndjson``/``.jsonl``
+or ``.txt``, optionally ``.gz``; ``-`` is stdin/stdout), so memory use does
+not depend on the size of the list. Imported addresses are validated in
+batches and written with one ``executemany`` transaction per batch; no
+Telegram notification is sent for them.
+"""
+
+import argparse
+import csv
+import gzip
+import io
+import itertools
+import json
+import os
+import sys
+import time
+from collections import Counter
+from typing import IO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from app.db import membership
+from app.db.connection import get_connection, transaction
+from app.db.database import add_emails, get_db_path, get_emails_page, get_repository
+from app.db.export import EXPORT_FORMATS
+from app.db.migrations import V2_DUPLICATES_SQL, get_schema_version
+from app.db.repository import record_signups, shard_of
+from app.db.stats import rebuild_stats
+from app.utils.validators import normalize_email, validate_emails
+
+# Rows validated and inserted per transaction
+DEFAULT_BATCH_SIZE = 10000
+
+# Seconds between progress lines
+PROGRESS_INTERVAL = 1.0
+
+FORMATS = ("csv", "ndjson", "txt")
+
+# An address read from an import file, with its optional attribution
+Row = Tuple[str, Optional[str], Optional[str]]
+
+
+class Progress:
+    """Periodic ``counter=value`` progress lines with throughput, on stderr."""
+
+    def __init__(self, label: str, quiet: bool = False):
+        self.label = label
+        self.quiet = quiet
+        self.counts: Dict[str, int] = {}
+        self.started = time.perf_counter()
+        self._last = self.started
+
+    def add(self, **counts: int) -> None:
+        for name, value in counts.items():
+            self.counts[name] = self.counts.get(name, 0) + value
+        now = time.perf_counter()
+        if now - self._last >= PROGRESS_INTERVAL:
+            self._last = now
+            self._print()
+
+    def rate(self, name: str) -> float:
+        elapsed = time.perf_counter() - self.started
+        return self.counts.get(name, 0) / elapsed if elapsed > 0 else 0.0
+
+    def _print(self) -> None:
+        if self.quiet:
+            return
+        summary = ", ".join(f"{name} {value}" for name, value in self.counts.items())
+        first = next(iter(self.counts), "rows")
+        print(f"{self.label}: {summary} ({self.rate(first):,.0f} {first}/s)", file=sys.stderr)
+
+    def finish(self) -> Dict[str, int]:
+        self._print()
+        return self.counts
+
+
+def detect_format(path: str, fmt: Optional[str] = None) -> str:
+    """Return ``fmt`` or the format implied by the file extension."""
+    if fmt:
+        return fmt
+    name = path[:-3] if path.endswith(".gz") else path
+    extension = os.path.splitext(name)[1].lower().lstrip(".")
+    if extension == "jsonl":
+        return "ndjson"
+    return extension if extension in FORMATS else "txt"
+
+
+def open_text(path: str, mode: str) -> IO[str]:
+    """Open ``path`` for text I/O, transparently (de)compressing ``.gz``."""
+    if path == "-":
+        stream = sys.stdin if mode == "r" else sys.stdout
+        return io.TextIOWrapper(stream.buffer, encoding="utf-8", newline="")
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8", newline="")
+    return open(path, mode, encoding="utf-8", newline="")
+
+
+def read_csv(lines: IO[str]) -> Iterator[Row]:
+    """Yield rows from CSV; uses ``email``/``source``/``referrer`` columns if
+    there is a header, otherwise the first column."""
+    reader = csv.reader(lines)
+    first = next(reader, None)
+    if first is None:
+        return
+
+    header = [cell.strip().lower() for cell in first]
+    if "email" in header:
+        columns = [header.index(name) if name in header else None
+                   for name in ("email", "source", "referrer")]
+        rows: Iterable[List[str]] = reader
+    else:
+        columns = [0, None, None]
+        rows = itertools.chain([first], reader)
+
+    for cells in rows:
+        values = [cells[i].strip() if i is not None and i < len(cells) else "" for i in columns]
+        yield values[0], values[1] or None, values[2] or None
+
+
+def read_ndjson(lines: IO[str]) -> Iterator[Row]:
+    """Yield rows from NDJSON objects (or bare JSON strings); bad lines yield ""."""
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield "", None, None
+            continue
+        if isinstance(record, str):
+            yield record.strip(), None, None
+        elif isinstance(record, dict):
+            yield (str(record.get("email") or "").strip(),
+                   record.get("source"), record.get("referrer"))
+        else:
+            yield "", None, None
+
+
+def read_txt(lines: IO[str]) -> Iterator[Row]:
+    """Yield one address per non-empty, non-comment line."""
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith("#"):
+            yield line, None, None
+
+
+READERS = {"csv": read_csv, "ndjson": read_ndjson, "txt": read_txt}
+
+
+def _batches(rows: Iterable[Row], size: int) -> Iterator[List[Row]]:
+    iterator = iter(rows)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def import_subscribers(path: str, fmt: Optional[str] = None, source: str = "import",
+                       batch_size: int = DEFAULT_BATCH_SIZE, check_mx: Optional[bool] = None,
+                       quiet: bool = False) -> Dict[str, int]:
+    """
+    Stream subscribers from a file into the database
+
+    Args:
+        path: File to read (``-`` for stdin)
+        fmt: ``csv``, ``ndjson`` or ``txt`` (default: from the extension)
+        source: Attribution for rows that do not carry their own
+        batch_size: Rows validated and inserted per transaction
+        check_mx: Also check each domain accepts mail (default: EMAIL_CHECK_MX)
+        quiet: Suppress progress output
+
+    Returns:
+        Dict[str, int]: Counts of rows ``read``, ``added``, ``duplicate``
+        and ``invalid``
+    """
+    progress = Progress("import", quiet)
+    progress.add(read=0, added=0, duplicate=0, invalid=0)
+    reader = READERS[detect_format(path, fmt)]
+
+    with open_text(path, "r") as lines:
+        for batch in _batches(reader(lines), batch_size):
+            results = validate_emails([email for email, _, _ in batch], check_mx=check_mx)
+            valid = [(email, row_source or source, referrer)
+                     for (email, row_source, referrer), (ok, _) in zip(batch, results) if ok]
+            inserted = add_emails(valid, notify=False) if valid else []
+            added = sum(inserted)
+            progress.add(read=len(batch), added=added, duplicate=len(inserted) - added,
+                         invalid=len(batch) - len(valid))
+
+    return progress.finish()
+
+
+def export_subscribers(path: str, fmt: Optional[str] = None,
+                       page_size: int = DEFAULT_BATCH_SIZE, quiet: bool = False) -> int:
+    """
+    Stream every subscriber, newest first, to a file
+
+    Args:
+        path: File to write (``-`` for stdout)
+        fmt: ``csv``, ``ndjson`` or ``txt`` (default: from the extension)
+        page_size: Rows read per query
+        quiet: Suppress progress output
+
+    Returns:
+        int: Number of rows written
+    """
+    _, header, format_page = EXPORT_FORMATS[detect_format(path, fmt)]
+    progress = Progress("export", quiet)
+    progress.add(rows=0)
+
+    with open_text(path, "w") as out:
+        out.write(header)
+        after_id = None
+        while True:
+            page = get_emails_page(after_id, page_size)
+            if not page:
+                break
+            out.write(format_page(page))
+            after_id = page[-1]["id"]
+            progress.add(rows=len(page))
+        out.flush()
+
+    return progress.finish()["rows"]
+
+
+def _dedupe_file(path: str, paths: List[str], dry_run: bool, chunk_size: int,
+                 progress: Progress) -> None:
+    """Run :func:`dedupe` over one subscriber file of ``paths``."""
+    conn = get_connection(path)
+    after_id = 0
+
+    while True:
+        rows = conn.execute(
+            "SELECT id, email, email_normalized FROM emails WHERE id > ? ORDER BY id LIMIT ?",
+            (after_id, chunk_size),
+        ).fetchall()
+        if not rows:
+            break
+        after_id = rows[-1]["id"]
+
+        stale = [(normalize_email(row["email"]), row["id"]) for row in rows
+                 if normalize_email(row["email"]) != row["email_normalized"]]
+        updated = moved = relocated = 0
+        if not stale:
+            progress.add(scanned=len(rows), updated=0, moved=0, relocated=0)
+            continue
+
+        with transaction(path, immediate=True) as conn:
+            for key, row_id in stale:
+                # With shards, the new key may belong in another file
+                home = paths[shard_of(key, len(paths))]
+                keeper = get_connection(home).execute(
+                    "SELECT id FROM emails WHERE email_normalized = ? AND id != ?",
+                    (key, row_id if home == path else 0),
+                ).fetchone()
+                if keeper is None and home == path:
+                    updated += 1
+                    if not dry_run:
+                        conn.execute("UPDATE emails SET email_normalized = ? WHERE id = ?",
+                                     (key, row_id))
+                    continue
+
+                if keeper is None:
+                    relocated += 1
+                    if not dry_run:
+                        row = conn.execute(
+                            "SELECT email, created_at, source, referrer FROM emails WHERE id = ?",
+                            (row_id,),
+                        ).fetchone()
+                        with transaction(home, immediate=True) as target:
+                            target.execute(
+                                "INSERT INTO emails "
+                                "(email, email_normalized, created_at, source, referrer) "
+                                "VALUES (?, ?, ?, ?, ?)",
+                                (row["email"], key, row["created_at"], row["source"],
+                                 row["referrer"]),
+                            )
+                            record_signups(
+                                target, [(row["email"], key, row["source"], row["referrer"])],
+                                day=row["created_at"][:10] if row["created_at"] else None,
+                            )
+                        conn.execute("DELETE FROM emails WHERE id = ?", (row_id,))
+                    continue
+
+                moved += 1
+                if not dry_run:
+                    # duplicate_of is the keeper's id as the API lists it
+                    keeper_id = keeper["id"] * len(paths) + paths.index(home)
+                    conn.execute(V2_DUPLICATES_SQL)
+                    conn.execute(
+                        "INSERT INTO emails_duplicates "
+                        "(id, email, email_normalized, created_at, source, referrer, duplicate_of) "
+                        "SELECT id, email, ?, created_at, source, referrer, ? "
+                        "FROM emails WHERE id = ?",
+                        (key, keeper_id, row_id),
+                    )
+                    conn.execute("DELETE FROM emails WHERE id = ?", (row_id,))
+        progress.add(scanned=len(rows), updated=updated, moved=moved, relocated=relocated)
+
+
+def dedupe(dry_run: bool = False, chunk_size: int = DEFAULT_BATCH_SIZE,
+           quiet: bool = False) -> Dict[str, int]:
+    """
+    Re-normalize stored addresses and set aside the duplicates this exposes
+
+    Needed after the normalization rules change (e.g. IDNA domains): rows
+    whose stored key is stale get the current one, and a row whose new key
+    already belongs to another row is moved to ``emails_duplicates``. With
+    the sharded backend, rows whose new key hashes to another shard are
+    moved to that shard's file.
+
+    Args:
+        dry_run: Only count what would change
+        chunk_size: Rows examined per transaction
+        quiet: Suppress progress output
+
+    Returns:
+        Dict[str, int]: Counts of rows ``scanned``, ``updated``, ``moved``
+        and ``relocated``
+    """
+    paths = get_repository().paths
+    progress = Progress("dedupe", quiet)
+    progress.add(scanned=0, updated=0, moved=0, relocated=0)
+    for path in paths:
+        _dedupe_file(path, paths, dry_run, chunk_size, progress)
+    return progress.finish()
+
+
+def _file_stats(path: str) -> Dict[str, object]:
+    """Return the raw numbers :func:`collect_stats` combines, for one file."""
+    conn = get_connection(path)
+
+    total, first, last = conn.execute(
+        "SELECT COUNT(*), MIN(created_at), MAX(created_at) FROM emails"
+    ).fetchone()
+    recent = {
+        period: conn.execute(
+            "SELECT COUNT(*) FROM emails WHERE created_at >= datetime('now', ?)", (modifier,)
+        ).fetchone()[0]
+        for period, modifier in (("24h", "-1 day"), ("7d", "-7 days"), ("30d", "-30 days"))
+    }
+    sources = {
+        row[0]: row[1] for row in conn.execute(
+            "SELECT COALESCE(source, '(none)'), COUNT(*) FROM emails GROUP BY 1"
+        )
+    }
+    has_duplicates = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'emails_duplicates'"
+    ).fetchone()
+    duplicates = (conn.execute("SELECT COUNT(*) FROM emails_duplicates").fetchone()[0]
+                  if has_duplicates else 0)
+
+    return {"subscribers": total, "first_signup": first, "last_signup": last,
+            "recent": recent, "sources": sources, "duplicates_set_aside": duplicates}
+
+
+def collect_stats() -> Dict[str, object]:
+    """Return headline numbers about the subscriber database (all shards)."""
+    path = get_db_path()
+    paths = get_repository().paths
+    files = [_file_stats(shard) for shard in paths]
+
+    firsts = [stats["first_signup"] for stats in files if stats["first_signup"]]
+    lasts = [stats["last_signup"] for stats in files if stats["last_signup"]]
+    sources: Counter = Counter()
+    for stats in files:
+        sources.update(stats["sources"])
+
+    return {
+        "path": path,
+        "files": paths,
+        "size_bytes": sum(os.path.getsize(shard) for shard in paths),
+        "schema_version": get_schema_version(paths[0]),
+        "subscribers": sum(stats["subscribers"] for stats in files),
+        "first_signup": min(firsts) if firsts else None,
+        "last_signup": max(lasts) if lasts else None,
+        "recent": {period: sum(stats["recent"][period] for stats in files)
+                   for period in files[0]["recent"]},
+        "sources": dict(sources.most_common(10)),
+        "duplicates_set_aside": sum(stats["duplicates_set_aside"] for stats in files),
+    }
+
+
+def _print_stats(stats: Dict[str, object]) -> None:
+    print(f"Database:        {stats['path']} ({stats['size_bytes'] / 1e6:.1f} MB, "
+          f"schema v{stats['schema_version']})")
+    if len(stats["files"]) > 1:
+        print(f"Shards:          {len(stats['files'])} files")
+    print(f"Subscribers:     {stats['subscribers']}")
+    print(f"First / last:    {stats['first_signup']} / {stats['last_signup']}")
+    print("New:             " + ", ".join(f"{count} in {period}"
+                                          for period, count in stats["recent"].items()))
+    print(f"Set aside dupes: {stats['duplicates_set_aside']}")
+    print("Top sources:")
+    for source, count in stats["sources"].items():
+        print(f"  {source:<24} {count}")
 
 
 def main() -> None:
-    """Print all stored email addresses."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    """Run the subscriber database CLI."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-q", "--quiet", action="store_true", help="no progress output")
+    commands = parser.add_subparsers(dest="command")
+
+    stats_parser = commands.add_parser("stats", help="print database statistics (default)")
+    stats_parser.add_argument("--json", action="store_true", help="print JSON")
+
+    import_parser = commands.add_parser("import", help="add subscribers from a file")
+    import_parser.add_argument("path", help="csv, ndjson or txt file, optionally .gz; - for stdin")
+    import_parser.add_argument("--format", choices=FORMATS)
+    import_parser.add_argument("--source", default="import",
+                               help="attribution for rows without their own (default: import)")
+    import_parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    import_parser.add_argument("--check-mx", action="store_true", default=None,
+                               help="reject domains that do not accept mail")
+
+    export_parser = commands.add_parser("export", help="write every subscriber to a file")
+    export_parser.add_argument("path", help="csv, ndjson or txt file, optionally .gz; - for stdout")
+    export_parser.add_argument("--format", choices=FORMATS)
+
+    dedupe_parser = commands.add_parser("dedupe", help="re-normalize addresses, set aside duplicates")
+    dedupe_parser.add_argument("--dry-run", action="store_true", help="only report counts")
+
+    commands.add_parser("rebuild-stats",
+                        help="recompute the /api/admin/stats summary tables (recovery only)")
 
-    cursor.execute("SELECT id, email, created_at FROM emails")
-    rows = cursor.fetchall()
+    args = parser.parse_args()
 
-    print(f"Emails in database ({DB_PATH}):")
-    for row in rows:
-        print(row)
+    # A one-shot process gains nothing from loading the membership index
+    membership.MEMBERSHIP_INDEX = False
 
-    conn.close()
+    if args.command == "import":
+        counts = import_subscribers(args.path, args.format, args.source,
+                                    args.batch_size, args.check_mx, args.quiet)
+        print(f"{counts['added']} added, {counts['duplicate']} already subscribed, "
+              f"{counts['invalid']} invalid (of {counts['read']} rows)")
+    elif args.command == "export":
+        written = export_subscribers(args.path, args.format, quiet=args.quiet)
+        print(f"{written} subscribers exported", file=sys.stderr)
+    elif args.command == "dedupe":
+        counts = dedupe(args.dry_run, quiet=args.quiet)
+        relocated = f", {counts['relocated']} moved to another shard" if counts["relocated"] else ""
+        print(f"{counts['updated']} keys updated, {counts['moved']} duplicates set aside{relocated}"
+              f"{' (dry run)' if args.dry_run else ''}")
+    elif args.command == "rebuild-stats":
+        for path in get_repository().paths:
+            print(f"{path}: {rebuild_stats(path)} subscribers counted")
+    else:
+        stats = collect_stats()
+        if getattr(args, "json", False):
+            print(json.dumps(stats, indent=2))
+        else:
+            _print_stats(stats)
 
 
 if __name__ == "__main__":